@@ -0,0 +1,151 @@
+# cli.py
+"""
+Headless batch runner: loads every input file, replays a recorded pipeline
+(saved from "Save & Export" → "Pipeline (.json)") and exports the result,
+one file per worker process, without Streamlit.
+
+    python cli.py pipeline.json datasets/ output/ --format parquet --workers 4 --memory-limit-mb 2048
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from modules import loader, pipeline, exporter
+
+# Same copy-on-write mode as the Streamlit app (see main.py)
+pd.set_option("mode.copy_on_write", True)
+
+def _init_worker(memory_limit_mb):
+    """
+    Caps the worker's address space so one oversized file fails with a
+    MemoryError in its own process instead of exhausting the machine.
+    """
+    pd.set_option("mode.copy_on_write", True)
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+    except ImportError:  # Windows: no per-process limits
+        return
+    limit = memory_limit_mb * 1024 ** 2
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def process_file(path, name, output_name, steps, output_dir, fmt, source_paths=None, optimize=False, chunksize=None):
+    """
+    Worker: load → (optimize) → pipeline → export for one file.
+    Returns a report row with the time spent in each stage.
+    """
+    row = {"File": name}
+    try:
+        start = time.perf_counter()
+        df = loader.load_path(path, chunksize)
+        row["Load s"] = time.perf_counter() - start
+
+        if optimize:
+            start = time.perf_counter()
+            df, _ = loader.optimize_dtypes(df)
+            row["Optimize s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sources = {source: loader.load_path(source_path) for source, source_path in (source_paths or {}).items()}
+        df = pipeline.run_pipeline(df, steps, sources)
+        row["Pipeline s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        output = os.path.join(output_dir, f"{output_name}.{exporter.FILE_FORMATS[fmt]}")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        exporter.export_frame(df, output, fmt)
+        row["Export s"] = time.perf_counter() - start
+
+        row.update({"Rows": len(df), "Columns": df.shape[1], "Output": output})
+    except MemoryError:
+        row["Error"] = "memory limit exceeded"
+    except Exception as e:
+        row["Error"] = f"{type(e).__name__}: {e}"
+    return row
+
+def find_inputs(inputs, pattern="*"):
+    """
+    Expands directories (matching pattern) and glob patterns into supported input files.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, pattern)))
+        else:
+            paths.extend(glob.glob(item))
+    return sorted(p for p in set(map(os.path.normpath, paths)) if os.path.isfile(p) and p.endswith(loader.SUPPORTED_EXTENSIONS))
+
+def output_names(paths):
+    """
+    (name, output name) per input: the path relative to the inputs' common
+    directory, so partitions sharing a file name get their own outputs.
+    The output drops the extension unless that would collide (a.csv, a.json).
+    """
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    names = [os.path.relpath(os.path.abspath(p), root) for p in paths]
+    stems = [os.path.splitext(name)[0] for name in names]
+    counts = Counter(stems)
+    return [(name, name if counts[stem] > 1 else stem) for name, stem in zip(names, stems)]
+
+def _parse_sources(parser, values):
+    sources = {}
+    for value in values or []:
+        name, sep, path = value.partition("=")
+        if not sep:
+            parser.error(f"--source expects NAME=PATH, got '{value}'")
+        sources[name] = path
+    return sources
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a recorded pipeline over many files in parallel.")
+    parser.add_argument("pipeline", help="pipeline JSON saved from the app")
+    parser.add_argument("inputs", nargs="+", help="input files, directories or glob patterns")
+    parser.add_argument("output_dir", help="directory for the exported results")
+    parser.add_argument("--format", default="csv", choices=sorted(exporter.FILE_FORMATS), help="output format")
+    parser.add_argument("--pattern", default="*", help="file pattern inside input directories")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--memory-limit-mb", type=int, default=None, help="address-space limit per worker")
+    parser.add_argument("--source", action="append", metavar="NAME=PATH",
+                        help="file for a merge step's source name (repeatable)")
+    parser.add_argument("--optimize", action="store_true", help="optimize dtypes after loading")
+    parser.add_argument("--chunksize", type=int, default=None, help="read inputs in chunks of this many rows")
+    args = parser.parse_args(argv)
+
+    with open(args.pipeline, encoding="utf-8") as f:
+        steps = pipeline.loads(f.read())
+    source_paths = _parse_sources(parser, args.source)
+    paths = find_inputs(args.inputs, args.pattern)
+    if not paths:
+        print("No input files found.", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.memory_limit_mb,)) as pool:
+        futures = [pool.submit(process_file, path, name, output_name, steps, args.output_dir, args.format,
+                               source_paths, args.optimize, args.chunksize)
+                   for path, (name, output_name) in zip(paths, output_names(paths))]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            print(f"{'✗' if 'Error' in row else '✓'} {row['File']}" + (f": {row['Error']}" if "Error" in row else ""))
+
+    report = pd.DataFrame(rows).sort_values("File", ignore_index=True)
+    with pd.option_context("display.float_format", "{:.3f}".format, "display.width", 200):
+        print(report.drop(columns=["Output"], errors="ignore").to_string(index=False))
+    stage_totals = report.filter(like=" s").sum()
+    if not stage_totals.empty:
+        print("Total per stage (s): " + ", ".join(f"{col[:-2]} {total:.3f}" for col, total in stage_totals.items()))
+    print(f"Wall time: {time.perf_counter() - start:.3f} s, {len(paths)} file(s)")
+    return 1 if "Error" in report else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import streamlit as st
+import pandas as pd
 from modules import (
     loader,
     cleaner,
@@ -16,6 +17,10 @@ from modules import (
     time_series
 )
 
+# Copy-on-write: shallow copies of the session DataFrame only copy the columns
+# an operation modifies (the session store keeps the data memory-mapped)
+pd.set_option("mode.copy_on_write", True)
+
 def main():
     st.set_page_config(page_title="🔍 Data Manipulation", layout="wide")
     st.title("🔍 Data Manipulation Application")
@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from sklearn.impute import KNNImputer
+from modules import session_store, staging, history, pipeline, missing_profile, encoding
 
 def run():
     st.subheader("🧼 Data Cleaning")
@@ -9,16 +9,25 @@ def run():
         st.warning("Please load data first.")
         return
 
-    df = st.session_state["data"].copy()
+    df = session_store.get_data()
 
     st.write("### 📊 Overview of Missing Values")
-    null_counts = df.isnull().sum()
+    # Cached per data version: reruns don't rescan the data (see missing_profile.py)
+    profile = missing_profile.for_data()
+    null_counts = profile.null_counts()
     null_df = pd.DataFrame({
         "Column": null_counts.index,
         "Missing Values Count": null_counts.values
     })
     st.dataframe(null_df)
 
+    if null_counts.any():
+        with st.expander("🧩 Missing Value Patterns"):
+            st.write("Most frequent combinations of missing columns:")
+            st.dataframe(profile.patterns())
+            st.write("Rows missing in both columns:")
+            st.dataframe(profile.co_missing())
+
     st.write("## 🧹 Cleaning Operations")
     tab1, tab2 = st.tabs(["🗑️ Drop Missing Data", "✏️ Fill Missing Data"])
 
@@ -30,16 +39,16 @@ def run():
         eksik_kolonlar = null_counts[null_counts > 0].index.tolist()
         secilen_kolon = st.multiselect("Select specific columns to drop from", eksik_kolonlar)
 
-        if "temp_tab1" not in st.session_state:
-            st.session_state["temp_tab1"] = df.copy()
-            st.session_state["undo_tab1"] = []
+        stage = staging.get_stage("stage_tab1")
+        history_tab1 = history.get_history("stage_tab1", stage)
+        stage_profile = missing_profile.profile_for("stage_tab1", stage)
 
         # --- Work only with existing columns ---
-        valid_cols = [col for col in secilen_kolon if col in st.session_state["temp_tab1"].columns]
+        valid_cols = [col for col in secilen_kolon if col in stage.columns]
 
         disable_btn = False
         if valid_cols:
-            has_missing = any(st.session_state["temp_tab1"][col].isnull().any() for col in valid_cols)
+            has_missing = any(stage_profile.count(col) > 0 for col in valid_cols)
             if not has_missing:
                 disable_btn = True
                 st.warning("No missing data in selected columns, operation cannot be performed.")
@@ -47,30 +56,21 @@ def run():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Drop", key="btn_sil_tab1", disabled=disable_btn):
-                st.session_state["undo_tab1"].append(st.session_state["temp_tab1"].copy())
-
-                if silme_yontemi == "Drop rows":
-                    if valid_cols:
-                        st.session_state["temp_tab1"] = st.session_state["temp_tab1"].dropna(subset=valid_cols)
-                    else:
-                        st.session_state["temp_tab1"] = st.session_state["temp_tab1"].dropna()
-                else: # Drop columns
-                    if valid_cols:
-                        st.session_state["temp_tab1"] = st.session_state["temp_tab1"].drop(columns=valid_cols)
-                    else:
-                        st.session_state["temp_tab1"] = st.session_state["temp_tab1"].dropna(axis=1)
+                with history_tab1.step(silme_yontemi):
+                    if silme_yontemi == "Drop rows":
+                        pipeline.apply(stage, "drop_missing_rows", columns=valid_cols)
+                    else: # Drop columns (all columns with missing data if none selected)
+                        pipeline.apply(stage, "drop_missing_columns", columns=valid_cols)
 
                 st.success("Missing data dropped ✅")
-                st.dataframe(st.session_state["temp_tab1"])
+                st.dataframe(encoding.to_dense(stage.frame()))
 
         with col2:
-            if st.button("Undo", key="btn_undo_tab1") and st.session_state["undo_tab1"]:
-                st.session_state["temp_tab1"] = st.session_state["undo_tab1"].pop()
-                st.success("Last action undone ✅")
-                st.dataframe(st.session_state["temp_tab1"])
+            if history.history_controls("stage_tab1", history_tab1):
+                st.dataframe(encoding.to_dense(stage.frame()))
 
         if st.button("Save to Main DF", key="save_tab1"):
-            st.session_state["data"] = st.session_state["temp_tab1"]
+            staging.commit_stage("stage_tab1")
             st.success("Changes in Tab 1 saved to main DF ✅")
 
     # --- Tab 2: Fill Missing Data ---
@@ -80,65 +80,67 @@ def run():
         # English options mapping
         doldurma_yontemi = st.selectbox(
             "Filling Method",
-            ["ffill", "bfill", "Mean", "Median", "Mode", "Constant Value", "AI (KNNImputer)"],
+            pipeline.FILL_METHODS,
             key="doldurma_tab2"
         )
 
         sayisal_kolonlar = df.select_dtypes(include="number").columns
-        eksik_sayisal = [col for col in sayisal_kolonlar if df[col].isnull().any()]
+        eksik_sayisal = [col for col in sayisal_kolonlar if profile.count(col) > 0]
         secilen_kolon = st.multiselect("Select specific columns to fill", eksik_sayisal)
 
-        if "temp_tab2" not in st.session_state:
-            st.session_state["temp_tab2"] = df.copy()
-            st.session_state["undo_tab2"] = []
+        stage = staging.get_stage("stage_tab2")
+        history_tab2 = history.get_history("stage_tab2", stage)
+        stage_profile = missing_profile.profile_for("stage_tab2", stage)
 
         # --- Work only with existing numeric columns ---
-        valid_cols = [col for col in secilen_kolon if col in st.session_state["temp_tab2"].columns]
+        valid_cols = [col for col in secilen_kolon if col in stage.columns]
 
         disable_btn = False
         if valid_cols:
-            has_missing = any(st.session_state["temp_tab2"][col].isnull().any() for col in valid_cols)
+            has_missing = any(stage_profile.count(col) > 0 for col in valid_cols)
             if not has_missing:
                 disable_btn = True
                 st.warning("No missing data in selected columns, operation cannot be performed.")
 
+        if doldurma_yontemi == "Constant Value":
+            sabit_deger = st.text_input("Enter constant value", key="txt_sabit_tab2")
+        # Group fills: statistic per group (e.g. per store and month); interpolation along the index
+        fill_options = {}
+        has_dt_index = isinstance(stage.index, pd.DatetimeIndex)
+        if doldurma_yontemi in pipeline.GROUP_METHODS:
+            fill_options["group_by"] = st.multiselect(
+                "Group by column(s)", [col for col in stage.columns if col not in valid_cols], key="grup_tab2"
+            )
+            if has_dt_index:
+                donem = st.selectbox("Also group by time period", ["None", *pipeline.PERIODS], key="donem_tab2")
+                fill_options["period"] = None if donem == "None" else donem
+            if not fill_options["group_by"] and not fill_options.get("period"):
+                disable_btn = True
+                st.info("Select a group column or time period.")
+        elif doldurma_yontemi == "Interpolate":
+            fill_options["interpolation"] = st.selectbox(
+                "Interpolation", ["linear", "time", "spline"] if has_dt_index else ["linear", "spline"], key="interp_tab2"
+            )
+            if fill_options["interpolation"] == "spline":
+                fill_options["order"] = st.number_input("Spline order", 1, 5, 3, key="order_tab2")
+
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("Fill", key="btn_fill_tab2", disabled=disable_btn):
-                st.session_state["undo_tab2"].append(st.session_state["temp_tab2"].copy())
-                df_filled = st.session_state["temp_tab2"].copy()
-
-                if doldurma_yontemi in ["ffill", "bfill"]:
-                    df_filled[valid_cols] = df_filled[valid_cols].fillna(method=doldurma_yontemi)
-                elif doldurma_yontemi == "Mean":
-                    for col in valid_cols:
-                        df_filled[col].fillna(df_filled[col].mean(), inplace=True)
-                elif doldurma_yontemi == "Median":
-                    for col in valid_cols:
-                        df_filled[col].fillna(df_filled[col].median(), inplace=True)
-                elif doldurma_yontemi == "Mode":
-                    for col in valid_cols:
-                        df_filled[col].fillna(df_filled[col].mode()[0], inplace=True)
-                elif doldurma_yontemi == "Constant Value":
-                    sabit_deger = st.text_input("Enter constant value", key="txt_sabit_tab2")
+                with history_tab2.step(f"Fill {doldurma_yontemi}"):
+                    # Only the selected columns are materialized and replaced
                     # Note: You might need to cast 'sabit_deger' to float/int if columns are numeric
-                    df_filled[valid_cols] = df_filled[valid_cols].fillna(sabit_deger)
-                elif doldurma_yontemi == "AI (KNNImputer)":
-                    imputer = KNNImputer(n_neighbors=3)
-                    df_filled[valid_cols] = imputer.fit_transform(df_filled[valid_cols])
-
-                st.session_state["temp_tab2"] = df_filled
+                    pipeline.apply(stage, "fill_missing", columns=valid_cols, method=doldurma_yontemi,
+                                   value=sabit_deger if doldurma_yontemi == "Constant Value" else None,
+                                   **fill_options)
                 st.success("Missing data filled ✅")
-                st.dataframe(df_filled)
+                st.dataframe(encoding.to_dense(stage.frame()))
 
         with col2:
-            # Fixed variable name here: changed 'undo_tab2_stack' to 'undo_tab2'
-            if st.button("Undo", key="btn_undo_tab2") and st.session_state.get("undo_tab2", []):
-                st.session_state["temp_tab2"] = st.session_state["undo_tab2"].pop()
-                st.success("Last action undone ✅")
-                st.dataframe(st.session_state["temp_tab2"])
+            if history.history_controls("stage_tab2", history_tab2):
+                st.dataframe(encoding.to_dense(stage.frame()))
 
         with col3:
             if st.button("Save to Main DF", key="save_tab2"):
-                st.session_state["data"] = st.session_state["temp_tab2"]
+                staging.commit_stage("stage_tab2")
                 st.success("Changes in Tab 2 saved to main DF ✅")
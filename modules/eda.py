@@ -4,6 +4,7 @@ import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
 import pandas as pd
+from modules import encoding
 
 # Function to detect data type based on content
 def detect_dataset_content(df: pd.DataFrame) -> str:
@@ -20,12 +21,12 @@ def detect_dataset_content(df: pd.DataFrame) -> str:
         return "🔢 Numerical Dataset"
 
     # 3. Categorical dataset
-    cat_cols = df.select_dtypes(include="object").shape[1]
+    cat_cols = df.select_dtypes(include=["object", "category", "string"]).shape[1]
     if cat_cols / df.shape[1] > 0.5:
         return "🗂️ Categorical Dataset"
 
     # 4. Text data
-    for col in df.select_dtypes(include="object"):
+    for col in df.select_dtypes(include=["object", "category", "string"]):
         if df[col].astype(str).str.len().mean() > 30:  # average string length
             return "📄 Text-Based Dataset"
 
@@ -53,7 +54,7 @@ def run():
     # General Data Information
     st.write("### 🔍 General Data Information")
     st.write(f"**Rows:** {df.shape[0]}  \n**Columns:** {df.shape[1]}")
-    st.dataframe(df.head())
+    st.dataframe(encoding.to_dense(df.head()))
 
     # Data Types
     st.write("### 📌 Data Types")
@@ -64,7 +65,7 @@ def run():
     st.write(sayisal_sutunlar.tolist())
 
     st.write("### 📋 Categorical Variables")
-    kategorik_sutunlar = df.select_dtypes(include="object").columns
+    kategorik_sutunlar = df.select_dtypes(include=["object", "category", "string"]).columns
     st.write(kategorik_sutunlar.tolist())
 
     # Basic Statistics
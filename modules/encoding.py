@@ -0,0 +1,146 @@
+# modules/encoding.py
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# --- Categorical encoding ---
+# Encoders working from integer category codes (pd.factorize), so a column is
+# never expanded into a dense float matrix:
+# - one-hot indicators as uint8 columns or pandas sparse columns (only the
+#   ones are stored), with rare levels merged into an "other" column;
+# - hashing into a fixed number of indicator columns, for columns whose
+#   levels are unknown in advance or too many to list;
+# - target encoding, one float32 column with the smoothed target mean per level.
+# Every encoder takes a Series and returns columns aligned to its index. The
+# fitted state (level names, target means) can be passed back in to encode new
+# data the same way without refitting (see modules/model_registry.py).
+
+OUTPUTS = ["uint8", "sparse"]
+OTHER = "other"
+
+def _levels(s, max_categories=None, min_frequency=None):
+    """
+    Sorted category codes of s (NaN is its own level, as in OneHotEncoder)
+    and the level names. Levels seen fewer than min_frequency times (a share
+    of the rows if < 1) or beyond the max_categories most frequent ones share
+    the code of a trailing OTHER level.
+    """
+    codes, uniques = pd.factorize(s, sort=True, use_na_sentinel=False)
+    names = [str(u) for u in uniques]
+    if not max_categories and not min_frequency:
+        return codes, names
+    counts = np.bincount(codes, minlength=len(uniques))
+    frequent = np.ones(len(uniques), dtype=bool)
+    if min_frequency:
+        frequent &= counts >= (min_frequency * len(s) if min_frequency < 1 else min_frequency)
+    if max_categories and frequent.sum() > max_categories:
+        ranked = np.flatnonzero(frequent)[np.argsort(-counts[frequent], kind="stable")]
+        frequent[:] = False
+        frequent[ranked[:max_categories]] = True
+    if frequent.all():
+        return codes, names
+    mapping = np.where(frequent, np.cumsum(frequent) - 1, frequent.sum())
+    return mapping[codes], [name for name, keep in zip(names, frequent) if keep] + [OTHER]
+
+def _fitted_codes(s, names):
+    """
+    Codes of s in fitted level names. Unseen levels get the code of the
+    OTHER level if there is one, else -1 (no indicator set).
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    lookup = {name: i for i, name in enumerate(names)}
+    unseen = lookup.get(OTHER, -1)
+    mapping = np.array([lookup.get(str(u), unseen) for u in uniques], dtype=np.int64)
+    return mapping[codes] if len(mapping) else np.zeros(0, dtype=np.int64)
+
+def _indicators(codes, columns, index, output="uint8", skip_first=False):
+    """
+    One indicator column per code. "sparse" stores only the positions of the
+    ones (Sparse[uint8, 0]); "uint8" is one byte per cell.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown encoding output: {output}")
+    start = 1 if skip_first else 0
+    rows = np.flatnonzero(codes >= start)
+    cols = codes[rows] - start
+    shape = (len(codes), len(columns) - start)
+    if output == "sparse":
+        matrix = sparse.csc_matrix((np.ones(rows.size, dtype=np.uint8), (rows, cols)), shape=shape)
+        return pd.DataFrame.sparse.from_spmatrix(matrix, index=index, columns=columns[start:])
+    dense = np.zeros(shape, dtype=np.uint8)
+    dense[rows, cols] = 1
+    return pd.DataFrame(dense, index=index, columns=columns[start:])
+
+def one_hot_levels(s, max_categories=None, min_frequency=None):
+    """
+    Level names one_hot would create columns for.
+    """
+    return _levels(s, max_categories, min_frequency)[1]
+
+def one_hot(s, drop_first=True, output="uint8", max_categories=None, min_frequency=None, levels=None):
+    """
+    Indicator columns named "<column>_<level>"; drop_first drops the first
+    level's column. The OTHER level is never the one dropped. With fitted
+    levels, the columns are the same whatever values s holds.
+    """
+    if levels is None:
+        codes, names = _levels(s, max_categories, min_frequency)
+    else:
+        codes, names = _fitted_codes(s, levels), list(levels)
+    skip_first = drop_first and len(names) > 1 and names[0] != OTHER
+    return _indicators(codes, [f"{s.name}_{name}" for name in names], s.index, output, skip_first)
+
+def hash_encode(s, n_features=32, output="uint8"):
+    """
+    Indicator columns "<column>_hash<i>" of the level's hash modulo
+    n_features. The hash doesn't depend on the data, so replaying on new
+    data yields the same columns.
+    """
+    buckets = pd.util.hash_pandas_object(s.astype("object"), index=False).to_numpy() % np.uint64(n_features)
+    return _indicators(buckets.astype(np.int64), [f"{s.name}_hash{i}" for i in range(n_features)], s.index, output)
+
+def target_means(s, target, smoothing=10.0):
+    """
+    Mean of the (numeric) target per level, shrunk towards the global mean:
+    (sum + smoothing * prior) / (count + smoothing). Rows with a missing
+    target don't contribute. Returns {level: mean} and the prior.
+    """
+    y = pd.to_numeric(target, errors="raise").to_numpy(dtype="float64", na_value=np.nan)
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    known = ~np.isnan(y)
+    if not known.any():
+        raise ValueError("Target column has no values.")
+    sums = np.bincount(codes[known], weights=y[known], minlength=len(uniques))
+    counts = np.bincount(codes[known], minlength=len(uniques))
+    prior = y[known].mean()
+    encoded = (sums + smoothing * prior) / (counts + smoothing)
+    return {str(u): float(value) for u, value in zip(uniques, encoded)}, float(prior)
+
+def target_encode(s, means, prior):
+    """
+    Fitted target means of the levels of s (see target_means); unseen levels get the prior.
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    mapping = np.array([means.get(str(u), prior) for u in uniques], dtype=np.float32)
+    encoded = mapping[codes] if len(mapping) else np.zeros(0, dtype=np.float32)
+    return pd.Series(encoded, index=s.index, name=s.name)
+
+def dense_size(s, max_categories=None, min_frequency=None):
+    """
+    Bytes a uint8 one-hot encoding of s would take (levels x rows).
+    """
+    _, names = _levels(s, max_categories, min_frequency)
+    return len(names) * len(s)
+
+def to_dense(df):
+    """
+    Converts sparse columns back to their dense dtype (Arrow/Parquet have no sparse type).
+    """
+    sparse_cols = [col for col in df.columns if isinstance(df[col].dtype, pd.SparseDtype)]
+    if not sparse_cols:
+        return df
+    df = df.copy(deep=False)
+    for col in sparse_cols:
+        df[col] = df[col].sparse.to_dense()
+    return df
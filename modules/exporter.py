@@ -1,10 +1,81 @@
+import os
 import streamlit as st
 import pandas as pd
 import sqlite3
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pymongo
 from sqlalchemy import create_engine
 import urllib
 from urllib import parse
+from modules import session_store, pipeline, encoding
+
+# --- File export (no Streamlit; shared with cli.py) ---
+FILE_FORMATS = {"csv": "csv", "excel": "xlsx", "json": "json", "parquet": "parquet", "sqlite": "db"}
+
+def export_frame(df, path, fmt, table_name=None):
+    """
+    Writes df to path in one of FILE_FORMATS and returns the path.
+    """
+    match fmt:
+        case "csv":
+            df.to_csv(path, index=False)
+        case "excel":
+            df.to_excel(path, index=False)
+        case "json":
+            df.to_json(path, orient="records", lines=True)
+        case "parquet":
+            encoding.to_dense(df).to_parquet(path)
+        case "sqlite":
+            conn = sqlite3.connect(path)
+            try:
+                df.to_sql(table_name or os.path.splitext(os.path.basename(path))[0], conn, if_exists="replace", index=False)
+            finally:
+                conn.close()
+        case _:
+            raise ValueError(f"Unsupported export format: {fmt}")
+    return path
+
+# Formats that can be written chunk by chunk
+CHUNK_FORMATS = ["csv", "json", "parquet", "sqlite"]
+
+def export_chunks(chunks, path, fmt, table_name=None):
+    """
+    Writes an iterable of DataFrames to one file, one chunk at a time, and
+    returns the path and the number of rows written.
+    """
+    if fmt not in CHUNK_FORMATS:
+        raise ValueError(f"Chunked export supports {', '.join(CHUNK_FORMATS)}, not {fmt}.")
+    rows, writer, conn = 0, None, None
+    try:
+        for i, chunk in enumerate(chunks):
+            match fmt:
+                case "csv":
+                    chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+                case "json":
+                    with open(path, "w" if i == 0 else "a", encoding="utf-8") as f:
+                        chunk.to_json(f, orient="records", lines=True)
+                case "parquet":
+                    chunk = encoding.to_dense(chunk)
+                    if writer is None:
+                        table = pa.Table.from_pandas(chunk, preserve_index=False)
+                        writer = pq.ParquetWriter(path, table.schema)
+                    else:
+                        # Later chunks follow the first chunk's schema (e.g. int columns that got NaNs)
+                        table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                    writer.write_table(table)
+                case "sqlite":
+                    if conn is None:
+                        conn = sqlite3.connect(path)
+                    chunk.to_sql(table_name or os.path.splitext(os.path.basename(path))[0], conn,
+                                 if_exists="replace" if i == 0 else "append", index=False)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+        if conn is not None:
+            conn.close()
+    return path, rows
 
 def run():
     st.subheader("📊 Data Export & Database Save")
@@ -17,7 +88,7 @@ def run():
 
     export_type = st.selectbox(
         "Select Output Type",
-        ["CSV", "Excel", "JSON", "Parquet", "SQLite (.db)", "PostgreSQL", "MSSQL", "MongoDB"]
+        ["CSV", "Excel", "JSON", "Parquet", "SQLite (.db)", "PostgreSQL", "MSSQL", "MongoDB", "Pipeline (.json)"]
     )
 
     file_name = st.text_input("File/Table/Collection Name", "output")
@@ -25,38 +96,31 @@ def run():
     # ------------------ FILE FORMATS ------------------
     if export_type == "CSV":
         if st.button("📥 Save as CSV"):
-            file_path = f"{file_name}.csv"
-            df.to_csv(file_path, index=False)
+            file_path = export_frame(df, f"{file_name}.csv", "csv")
             st.success(f"✅ Data saved as {file_path}.")
             st.download_button("💾 Download", open(file_path, "rb").read(), file_name=file_path)
 
     elif export_type == "Excel":
         if st.button("📥 Save as Excel"):
-            file_path = f"{file_name}.xlsx"
-            df.to_excel(file_path, index=False)
+            file_path = export_frame(df, f"{file_name}.xlsx", "excel")
             st.success(f"✅ Data saved as {file_path}.")
             st.download_button("💾 Download", open(file_path, "rb").read(), file_name=file_path)
 
     elif export_type == "JSON":
         if st.button("📥 Save as JSON"):
-            file_path = f"{file_name}.json"
-            df.to_json(file_path, orient="records", lines=True)
+            file_path = export_frame(df, f"{file_name}.json", "json")
             st.success(f"✅ Data saved as {file_path}.")
             st.download_button("💾 Download", open(file_path, "rb").read(), file_name=file_path)
 
     elif export_type == "Parquet":
         if st.button("📥 Save as Parquet"):
-            file_path = f"{file_name}.parquet"
-            df.to_parquet(file_path)
+            file_path = export_frame(df, f"{file_name}.parquet", "parquet")
             st.success(f"✅ Data saved as {file_path}.")
             st.download_button("💾 Download", open(file_path, "rb").read(), file_name=file_path)
 
     elif export_type == "SQLite (.db)":
         if st.button("📥 Save as SQLite Database (.db)"):
-            file_path = f"{file_name}.db"
-            conn = sqlite3.connect(file_path)
-            df.to_sql(file_name, conn, if_exists="replace", index=False)
-            conn.close()
+            file_path = export_frame(df, f"{file_name}.db", "sqlite", table_name=file_name)
             st.success(f"✅ Data saved to SQLite database file ({file_path}).")
             st.download_button("💾 Download", open(file_path, "rb").read(), file_name=file_path)
 
@@ -117,3 +181,25 @@ def run():
                 st.success(f"✅ Data exported to MongoDB collection '{file_name}'.")
             except Exception as e:
                 st.error(f"Error: {e}")
+
+    # ------------------ PIPELINE ------------------
+    elif export_type == "Pipeline (.json)":
+        steps = session_store.pipeline_steps()
+        st.write(f"🧾 {len(steps)} recorded step(s) since the data was loaded:")
+        st.dataframe(pd.DataFrame(
+            [{"Step": i + 1, "Operation": step["op"], "Parameters": str(step["params"])} for i, step in enumerate(steps)]
+        ))
+        st.download_button("💾 Download Pipeline", pipeline.dumps(steps), file_name=f"{file_name}.json",
+                           mime="application/json", disabled=not steps)
+
+        st.write("### ▶️ Replay a Saved Pipeline on the Current Data")
+        pipeline_file = st.file_uploader("Choose a pipeline file", type=["json"])
+        if pipeline_file and st.button("Run Pipeline"):
+            try:
+                saved_steps = pipeline.loads(pipeline_file.getvalue())
+                result = pipeline.run_pipeline(df, saved_steps, sources=pipeline.session_sources())
+                session_store.set_data(result, steps=saved_steps)
+                st.success(f"✅ {len(saved_steps)} step(s) applied.")
+                st.dataframe(encoding.to_dense(result.head()))
+            except Exception as e:
+                st.error(f"Error: {e}")
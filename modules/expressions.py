@@ -0,0 +1,360 @@
+# modules/expressions.py
+
+import ast
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:   # in requirements.txt; without it NumPy evaluates the same expressions, single-threaded
+    numexpr = None
+
+# --- Feature expressions ---
+# A restricted expression language for new columns, one assignment per line:
+#     ratio = Fare / (SibSp + Parch + 1)
+#     df["log fare"] = log1p(Fare)
+# Only arithmetic, comparisons, boolean logic, `a if cond else b` and the
+# FUNCTIONS below on columns, earlier assignments and number constants are
+# allowed; anything else (attributes, imports, loops, other calls) is
+# rejected when parsing, so no user code is ever executed.
+# All the lines are compiled into one program over a graph of unique nodes:
+# earlier assignments are inlined, a sub-expression used in several places
+# (in any line) is computed once into a temporary, and every step runs as a
+# single vectorized numexpr call (multi-threaded) or, without numexpr, as
+# NumPy ufuncs.
+
+# name -> (NumPy function, number of arguments)
+FUNCTIONS = {
+    **{name: (getattr(np, name), 1) for name in [
+        "log", "log10", "log1p", "exp", "expm1", "sqrt", "abs", "floor", "ceil",
+        "sin", "cos", "tan", "arcsin", "arccos", "arctan", "sinh", "cosh", "tanh"
+    ]},
+    "arctan2": (np.arctan2, 2),
+    "minimum": (np.minimum, 2),
+    "maximum": (np.maximum, 2),
+    "where": (np.where, 3),
+}
+# Functions numexpr evaluates itself; expressions using the others run on NumPy
+NUMEXPR_FUNCTIONS = {
+    "log", "log10", "log1p", "exp", "expm1", "sqrt", "abs",
+    "sin", "cos", "tan", "arcsin", "arccos", "arctan", "sinh", "cosh", "tanh", "arctan2", "where"
+}
+CONSTANTS = {"pi": np.pi, "e": np.e}
+# Longer chains of single-use operations are split into several steps
+MAX_STEP_DEPTH = 32
+
+# AST operator -> (numexpr symbol or None, NumPy function); numexpr's integer
+# % by zero gives 0, so % runs on NumPy like // (see _promote_zero_division)
+BINARY_OPS = {
+    ast.Add: ("+", np.add), ast.Sub: ("-", np.subtract), ast.Mult: ("*", np.multiply),
+    ast.Div: ("/", np.true_divide), ast.FloorDiv: (None, np.floor_divide), ast.Mod: (None, np.mod),
+    ast.Pow: ("**", np.power), ast.BitAnd: ("&", np.bitwise_and), ast.BitOr: ("|", np.bitwise_or),
+    ast.And: ("and", np.logical_and), ast.Or: ("or", np.logical_or),
+    ast.Lt: ("<", np.less), ast.LtE: ("<=", np.less_equal), ast.Gt: (">", np.greater),
+    ast.GtE: (">=", np.greater_equal), ast.Eq: ("==", np.equal), ast.NotEq: ("!=", np.not_equal),
+}
+UNARY_OPS = {
+    ast.USub: ("-", np.negative), ast.UAdd: ("+", np.positive),
+    ast.Not: ("not", np.logical_not), ast.Invert: ("~", np.invert),
+}
+
+class Graph:
+    """
+    Unique expression nodes; a node refers to its operands by id, so equal
+    sub-expressions get the same id. Nodes: ("column", name),
+    ("const", value, type), ("op", operator, a, b), ("unary", operator, a),
+    ("call", function, *args). Operands always have lower ids.
+    """
+    def __init__(self):
+        self.nodes = []
+        self.ids = {}
+
+    def add(self, node, line):
+        if node[0] in ("op", "unary", "call") and all(self.nodes[i][0] == "const" for i in _children(node)):
+            node = self._fold(node, line)
+        if node not in self.ids:
+            self.ids[node] = len(self.nodes)
+            self.nodes.append(node)
+        return self.ids[node]
+
+    def _fold(self, node, line):
+        # Operations on constants are computed here with NumPy's fixed-width
+        # numbers (numexpr would fold them with Python integers, e.g. 10 ** 10 ** 9)
+        expression = (*node[:_first_child(node)], *(self.nodes[i] for i in _children(node)))
+        try:
+            value = np.asarray(_numpy(expression, {})).item()
+            if type(value) is int:
+                _check_integer_fold(expression, value)
+            return _constant(value)
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ValueError(f"Line {line}: {e}") from None
+
+class Program:
+    """
+    Compiled expressions: steps (variable, expression) in evaluation order,
+    where every expression is a nested tuple over ("var", name) operands.
+    """
+    def __init__(self, steps, outputs, inputs, shared):
+        self.steps = steps        # [(variable, expression)]
+        self.outputs = outputs    # new column -> variable holding its values
+        self.inputs = inputs      # columns read, in variable order c0, c1, ...
+        self.shared = shared      # sub-expressions computed once for several uses
+
+    def evaluate(self, columns, length):
+        """
+        Runs the program on {column: Series} and returns {new column: array}.
+        """
+        env = {f"c{i}": _array(columns[name]) for i, name in enumerate(self.inputs)}
+        for variable, expression in self.steps:
+            env[variable] = _evaluate(expression, env)
+        return {name: _full(env[variable], length) for name, variable in self.outputs.items()}
+
+def parse(text, columns):
+    """
+    Parses and validates the assignments of text against the available
+    columns; raises ValueError with the line of the first problem. Returns
+    the node graph and the (target, node id) of every line.
+    """
+    try:
+        tree = ast.parse(text, mode="exec")
+    except SyntaxError as e:
+        raise ValueError(f"Line {e.lineno}: invalid syntax.") from None
+    except (RecursionError, MemoryError):
+        raise ValueError("Expressions are nested too deeply.") from None
+    graph, columns = Graph(), set(columns)
+    defined = {}   # assigned name -> node id (inlined into later lines)
+    assignments = []
+    for statement in tree.body:
+        if not isinstance(statement, ast.Assign) or len(statement.targets) != 1:
+            raise ValueError(f"Line {statement.lineno}: expected one assignment such as new_col = col1 * col2.")
+        target = _target(statement.targets[0])
+        if target is None:
+            raise ValueError(f"Line {statement.lineno}: the target must be a name or df['column'].")
+        try:
+            node = _convert(statement.value, graph, columns, defined, statement.lineno)
+        except RecursionError:
+            raise ValueError(f"Line {statement.lineno}: expression is nested too deeply.") from None
+        defined[target] = node
+        assignments.append((target, node))
+    if not assignments:
+        raise ValueError("No expressions given.")
+    return graph, assignments
+
+def compile(text, columns):
+    """
+    Parses text (see parse) into a Program computing every sub-expression
+    used more than once a single time.
+    """
+    graph, assignments = parse(text, columns)
+    nodes = graph.nodes
+    # Uses of each node by distinct parent nodes and by the assignments
+    reachable = np.zeros(len(nodes), dtype=bool)
+    uses = np.zeros(len(nodes), dtype=np.int64)
+    for _, node in assignments:
+        reachable[node] = True
+        uses[node] += 1
+    for i in range(len(nodes) - 1, -1, -1):
+        if reachable[i]:
+            for child in _children(nodes[i]):
+                reachable[child] = True
+                uses[child] += 1
+
+    # Operands have lower ids, so one pass in id order builds every expression
+    outputs_of = {node for _, node in assignments}
+    inputs, steps, expressions, depth = [], [], {}, {}
+    shared = 0
+    for i in np.flatnonzero(reachable).tolist():
+        node = nodes[i]
+        if node[0] in ("column", "const"):
+            if node[0] == "column":
+                inputs.append(node[1])
+                node = ("var", f"c{len(inputs) - 1}")
+            expressions[i], depth[i] = node, 0
+            continue
+        children = _children(node)
+        expression = (*node[:_first_child(node)], *(expressions[c] for c in children))
+        depth[i] = 1 + max(depth[c] for c in children)
+        if uses[i] > 1 or i in outputs_of or depth[i] >= MAX_STEP_DEPTH:
+            shared += int(uses[i] > 1)
+            steps.append((f"t{i}", expression))
+            expressions[i], depth[i] = ("var", f"t{i}"), 0
+        else:
+            expressions[i] = expression
+    outputs = {}
+    for target, node in assignments:
+        if expressions[node][0] != "var":
+            # A constant (folded) expression
+            steps.append((f"t{node}", expressions[node]))
+            expressions[node] = ("var", f"t{node}")
+        outputs[target] = expressions[node][1]
+    return Program(steps, outputs, inputs, shared)
+
+def evaluate(text, df):
+    """
+    New columns {name: array} of the expressions in text on df.
+    """
+    program = compile(text, df.columns)
+    return program.evaluate({name: df[name] for name in program.inputs}, len(df))
+
+# --- Parsing ---
+def _target(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    return _column_key(node)
+
+def _column_key(node):
+    # df["column"] (the form of the old exec-based expressions)
+    if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "df" \
+            and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+        return node.slice.value
+    return None
+
+def _convert(node, graph, columns, defined, line):
+    """
+    Validates an AST expression and adds it to the graph; returns its node id.
+    """
+    def convert(n):
+        return _convert(n, graph, columns, defined, line)
+    def add(*n):
+        return graph.add(n, line)
+    def reference(name):
+        if name in defined:
+            return defined[name]
+        if name in columns:
+            return add("column", name)
+        if name in CONSTANTS:
+            return add(*_constant(CONSTANTS[name]))
+        raise ValueError(f"Line {line}: unknown column or name '{name}'.")
+
+    if isinstance(node, ast.Name):
+        return reference(node.id)
+    if isinstance(node, ast.Subscript) and _column_key(node) is not None:
+        return reference(_column_key(node))
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float)):
+        return add(*_constant(node.value))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+        return add("op", type(node.op), convert(node.left), convert(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+        return add("unary", type(node.op), convert(node.operand))
+    if isinstance(node, ast.BoolOp):
+        values = [convert(value) for value in node.values]
+        result = values[0]
+        for value in values[1:]:
+            result = add("op", type(node.op), result, value)
+        return result
+    if isinstance(node, ast.Compare) and all(type(o) in BINARY_OPS for o in node.ops):
+        # a < b < c -> (a < b) & (b < c)
+        operands = [convert(node.left), *(convert(c) for c in node.comparators)]
+        result = None
+        for o, left, right in zip(node.ops, operands, operands[1:]):
+            comparison = add("op", type(o), left, right)
+            result = comparison if result is None else add("op", ast.BitAnd, result, comparison)
+        return result
+    if isinstance(node, ast.IfExp):
+        return add("call", "where", convert(node.test), convert(node.body), convert(node.orelse))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+        arity = FUNCTIONS[node.func.id][1]
+        if node.keywords or len(node.args) != arity:
+            raise ValueError(f"Line {line}: {node.func.id}() takes {arity} argument(s).")
+        return add("call", node.func.id, *(convert(arg) for arg in node.args))
+    if isinstance(node, ast.Call):
+        raise ValueError(f"Line {line}: unknown function. Available: {', '.join(FUNCTIONS)}.")
+    raise ValueError(f"Line {line}: '{ast.unparse(node)}' is not allowed in an expression.")
+
+def _check_integer_fold(expression, value):
+    """
+    NumPy integers wrap around silently: redoes the folded operation with
+    Python integers and raises OverflowError if the int64 result differs.
+    """
+    operands = [child[1] for child in _children(expression)]
+    if expression[0] == "op" and expression[1] is ast.Pow and abs(operands[0]) > 1 and operands[1] >= 64:
+        raise OverflowError("Integer overflow in a constant power.")
+    exact = (*expression[:_first_child(expression)],
+             *(_constant(np.asarray(v, dtype=object)) for v in operands))
+    if _numpy(exact, {}) != value:
+        raise OverflowError("Integer overflow in a constant expression.")
+
+def _constant(value):
+    # The type keeps 1, 1.0 and True apart when sub-expressions are compared
+    return ("const", value, type(value).__name__)
+
+def _first_child(node):
+    return 2 if node[0] in ("op", "unary", "call") else len(node)
+
+def _children(node):
+    return node[_first_child(node):]
+
+# --- Evaluation ---
+def _array(s):
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s.to_numpy(dtype=bool, na_value=False)
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        if isinstance(s.dtype, pd.SparseDtype) or pd.api.types.is_extension_array_dtype(s.dtype):
+            return s.to_numpy(dtype="float64", na_value=np.nan)
+        values = s.to_numpy()
+        # Downcast int8 / int16 / int32 columns (see loader.downcast_chunk) would wrap around
+        if values.dtype.kind in "iu" and values.dtype.itemsize < 8:
+            return values.astype("int64")
+        return values
+    raise ValueError(f"Column '{s.name}' is not numeric.")
+
+def _full(values, length):
+    # Constant expressions become a whole column
+    return np.full(length, values) if np.ndim(values) == 0 else values
+
+def _evaluate(expression, env):
+    if numexpr is not None and expression[0] != "const":
+        text = _numexpr_text(expression)
+        if text is not None:
+            try:
+                return numexpr.evaluate(text, local_dict=env)
+            except (TypeError, ValueError, KeyError, NotImplementedError, ArithmeticError):
+                pass   # e.g. a dtype numexpr doesn't support: NumPy below
+    return _numpy(expression, env)
+
+def _numexpr_text(expression):
+    """
+    numexpr source of an expression, or None if it uses something numexpr lacks.
+    """
+    kind = expression[0]
+    if kind == "var":
+        return expression[1]
+    if kind == "const":
+        return repr(expression[1])
+    parts = [_numexpr_text(child) for child in _children(expression)]
+    if any(part is None for part in parts):
+        return None
+    if kind == "op":
+        symbol = BINARY_OPS[expression[1]][0]
+        if symbol in ("and", "or"):
+            # Logical, for numbers too (& and | are bitwise on integers)
+            return f"(({parts[0]} != 0) {'&' if symbol == 'and' else '|'} ({parts[1]} != 0))"
+        return None if symbol is None else f"({parts[0]} {symbol} {parts[1]})"
+    if kind == "unary":
+        symbol = UNARY_OPS[expression[1]][0]
+        return f"({parts[0]} == 0)" if symbol == "not" else f"({symbol}{parts[0]})"
+    return f"{expression[1]}({', '.join(parts)})" if expression[1] in NUMEXPR_FUNCTIONS else None
+
+def _numpy(expression, env):
+    kind = expression[0]
+    if kind == "var":
+        return env[expression[1]]
+    if kind == "const":
+        return expression[1]
+    args = [_numpy(child, env) for child in _children(expression)]
+    with np.errstate(all="ignore"):
+        if kind == "op":
+            fn = BINARY_OPS[expression[1]][1]
+            if fn in (np.floor_divide, np.mod):
+                args = _promote_zero_division(*args)
+            return fn(*args)
+        if kind == "unary":
+            return UNARY_OPS[expression[1]][1](*args)
+        return FUNCTIONS[expression[1]][0](*args)
+
+def _promote_zero_division(a, b):
+    # Integer // 0 and % 0 give 0 in NumPy; like pandas, they are done in floats (inf / nan) instead
+    a, b = np.asarray(a), np.asarray(b)
+    if a.dtype.kind in "biu" and b.dtype.kind in "biu" and np.any(b == 0):
+        return a.astype("float64"), b.astype("float64")
+    return a, b
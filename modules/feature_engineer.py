@@ -1,8 +1,8 @@
 # modules/feature_engineer.py
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import OneHotEncoder, MinMaxScaler
 import streamlit as st
+from modules import staging, pipeline, encoding, scaling, expressions
 
 def run():
     """
@@ -17,21 +17,35 @@ def run():
         st.warning("Please load data first.")
         return
 
-    df = st.session_state["data"].copy()
+    # Pending features are staged on top of the main data and recorded as pipeline steps
+    stage = staging.get_stage("features_stage")
+    df = stage.frame()
 
     # --- 1) Categorical (One-Hot) ---
     st.write("### 🗂 Categorical Columns (One-Hot Encoding)")
     categorical_columns = st.multiselect(
         "Select categorical columns for One-Hot Encoding",
-        df.select_dtypes(include="object").columns.tolist()
+        df.select_dtypes(include=["object", "category", "string"]).columns.tolist()
     )
+    col_out, col_max = st.columns(2)
+    with col_out:
+        # sparse keeps high-cardinality columns small; rare levels can go to an "other" column
+        encoding_output = st.selectbox("Encoding output", encoding.OUTPUTS, key="features_onehot_output")
+    with col_max:
+        max_categories = st.number_input("Max categories (0 = no limit)", 0, 100000, 0, key="features_onehot_max")
 
     # --- 2) Numerical (Scaling) ---
-    st.write("### 🔢 Numerical Columns (Min-Max Scaling)")
+    st.write("### 🔢 Numerical Columns (Scaling)")
     scale_columns = st.multiselect(
         "Select numerical columns to scale",
         df.select_dtypes(include=np.number).columns.tolist()
     )
+    col_mode, col_dtype = st.columns(2)
+    with col_mode:
+        scale_mode = st.selectbox("Scaling", scaling.MODES, index=scaling.MODES.index("minmax"), key="features_scale_mode")
+    with col_dtype:
+        # float32 halves the memory of the scaled columns
+        scale_dtype = st.selectbox("Output dtype", scaling.DTYPES, key="features_scale_dtype")
 
     # --- 3) Date (Button instead of automatic) ---
     st.write("### 📅 Date Features")
@@ -41,69 +55,42 @@ def run():
         st.caption("✅ DatetimeIndex detected; you can extract year/month/day/weekday features.")
         if st.button("📌 Extract Date Columns"):
             try:
-                ts = df.index
-                df["Year"] = ts.year
-                df["Month"] = ts.month
-                df["Day"] = ts.day
-                df["Weekday"] = df.index.weekday + 1   # Monday=1, Sunday=7
-
-                days = {
-                    1: "Monday",
-                    2: "Tuesday",
-                    3: "Wednesday",
-                    4: "Thursday",
-                    5: "Friday",
-                    6: "Saturday",
-                    7: "Sunday"
-                }
-                df["WeekdayName"] = df["Weekday"].map(days)
+                # Year, Month, Day, Weekday (Monday=1, Sunday=7) and WeekdayName
+                pipeline.apply(stage, "extract_date_fields", weekday_column="Weekday")
+                df = stage.frame()
                 st.success("Year, Month, Day, Weekday features created from Index (DatetimeIndex).")
-                
-                if st.button("Save to Session State", key="save_date_features"):
-                    st.session_state["data"] = df
-                    st.success("Updated data saved to session_state.")
             except Exception as e:
                 st.error(f"Error processing DatetimeIndex: {e}")
     else:
         st.info("ℹ️ No date column found (DatetimeIndex not detected).")
 
     st.write("### 📊 Feature Engineering Result Data")
-    st.dataframe(df)
+    st.dataframe(encoding.to_dense(df))
 
     # --- 4) New Feature Expressions ---
     st.write("### ✨ New Features (Optional)")
-    new_features_input = st.text_area("Enter new feature expressions (e.g., df['new_col'] = df['col1'] + df['col2'])")
+    new_features_input = st.text_area(
+        "Enter new feature expressions, one per line (e.g., new_col = col1 * log(col2))",
+        help="Column names (or df['col'] for names with spaces), numbers, + - * / // % **, comparisons, "
+             "& | ~ and / or / not, and the functions: " + ", ".join(expressions.FUNCTIONS)
+             + ". Names defined on earlier lines can be reused; shared sub-expressions are computed once."
+    )
+    if new_features_input.strip():
+        try:
+            program = expressions.compile(new_features_input, stage.columns)
+            st.caption(f"✅ {len(program.outputs)} new column(s), {program.shared} shared sub-expression(s), "
+                       f"evaluated with {'numexpr' if expressions.numexpr else 'NumPy (single-threaded; install numexpr)'}.")
+        except ValueError as e:
+            st.warning(f"⚠️ {e}")
 
     if st.button("Apply Feature Engineering"):
         # 1. Categorical
         if categorical_columns:
             for column in categorical_columns:
                 try:
-                    encoder = OneHotEncoder(drop='first', sparse_output=False)  # scikit-learn >=1.2
-                    one_hot_encoded = encoder.fit_transform(df[[column]])
-                    one_hot_df = pd.DataFrame(
-                        one_hot_encoded,
-                        columns=encoder.get_feature_names_out([column]),
-                        index=df.index
-                    )
-                    df = pd.concat([df, one_hot_df], axis=1)
-                    df.drop(columns=[column], inplace=True)
+                    pipeline.apply(stage, "one_hot", columns=[column], drop_first=True, output=encoding_output,
+                                   max_categories=max_categories or None)
                     st.success(f"Column '{column}' transformed with one-hot encoding.")
-                except TypeError:
-                    # Fallback for older scikit-learn versions
-                    try:
-                        encoder = OneHotEncoder(drop='first', sparse=False)
-                        one_hot_encoded = encoder.fit_transform(df[[column]])
-                        one_hot_df = pd.DataFrame(
-                            one_hot_encoded,
-                            columns=encoder.get_feature_names_out([column]),
-                            index=df.index
-                        )
-                        df = pd.concat([df, one_hot_df], axis=1)
-                        df.drop(columns=[column], inplace=True)
-                        st.success(f"Column '{column}' transformed with one-hot encoding. (compat mode)")
-                    except Exception as e:
-                        st.error(f"Error transforming column '{column}': {e}")
                 except Exception as e:
                     st.error(f"Error transforming column '{column}': {e}")
         else:
@@ -112,8 +99,7 @@ def run():
         # 2. Numerical
         if scale_columns:
             try:
-                scaler = MinMaxScaler()
-                df[scale_columns] = scaler.fit_transform(df[scale_columns])
+                pipeline.apply(stage, f"{scale_mode}_scale", columns=scale_columns, dtype=scale_dtype)
                 st.success(f"Numerical columns scaled: {', '.join(scale_columns)}")
             except Exception as e:
                 st.error(f"Error scaling numerical columns: {e}")
@@ -123,17 +109,16 @@ def run():
         # 3. New Features
         if new_features_input.strip():
             try:
-                # Expose df/np/pd objects explicitly to the user
-                exec(new_features_input, {"df": df, "np": np, "pd": pd})
+                pipeline.apply(stage, "feature_expressions", code=new_features_input)
                 st.success("New feature expressions applied successfully.")
             except Exception as e:
                 st.error(f"Error applying new feature: {e}")
 
         # Show Results
         st.write("### 📊 Feature Engineering Result Data")
-        st.dataframe(df)
+        st.dataframe(encoding.to_dense(stage.frame()))
 
-        # Optional Save
-        if st.button("Save to Session State", key="save_final_features"):
-            st.session_state["data"] = df
-            st.success("Updated data saved to session_state.")
+    # Optional Save
+    if st.button("Save to Session State", key="save_final_features"):
+        staging.commit_stage("features_stage")
+        st.success("Updated data saved to session_state.")
@@ -2,6 +2,7 @@
 
 import streamlit as st
 import pandas as pd
+from modules import session_store, pipeline, encoding
 
 def run():
     st.subheader("🔎 Filtering and Sorting")
@@ -10,16 +11,17 @@ def run():
         st.warning("Please load data first.")
         return
 
-    df = st.session_state["data"]
-    df_temp = df.copy()  # Temporary copy, operations are performed here
+    df_temp = session_store.get_data()  # Copy-on-write view, operations are performed here
 
     st.write("📊 Current Data (Temporary):")
-    st.dataframe(df_temp.head())
+    st.dataframe(encoding.to_dense(df_temp.head()))
 
     st.markdown("---")
     st.write("### 🔹 Filtering")
 
     filtre_sutun = st.selectbox("Select column to filter", df_temp.columns)
+    # The widgets below build pipeline steps; they are replayed lazily in one pass
+    steps = []
 
     if pd.api.types.is_numeric_dtype(df_temp[filtre_sutun]):
         min_val = float(df_temp[filtre_sutun].min())
@@ -30,17 +32,16 @@ def run():
             st.info(f"All values in this column are {min_val}. No range to filter.")
         else:
             val = st.slider("Select value range", min_val, max_val, (min_val, max_val))
-            df_temp = df_temp[df_temp[filtre_sutun].between(val[0], val[1])]
+            steps.append(pipeline.make_step("filter_range", column=filtre_sutun, low=val[0], high=val[1]))
             
     elif pd.api.types.is_datetime64_any_dtype(df_temp[filtre_sutun]):
         start_date = st.date_input("Start date", df_temp[filtre_sutun].min().date())
         end_date = st.date_input("End date", df_temp[filtre_sutun].max().date())
-        df_temp = df_temp[(df_temp[filtre_sutun] >= pd.to_datetime(start_date)) &
-                          (df_temp[filtre_sutun] <= pd.to_datetime(end_date))]
+        steps.append(pipeline.make_step("filter_dates", column=filtre_sutun, start=str(start_date), end=str(end_date)))
     else:
         unique_vals = df_temp[filtre_sutun].dropna().unique().tolist()
         selected_vals = st.multiselect("Select values to filter", unique_vals, default=unique_vals)
-        df_temp = df_temp[df_temp[filtre_sutun].isin(selected_vals)]
+        steps.append(pipeline.make_step("filter_values", column=filtre_sutun, values=selected_vals))
 
     st.markdown("---")
     st.write("### 🔸 Sorting")
@@ -48,12 +49,13 @@ def run():
     sort_column = st.selectbox("Select column to sort", df_temp.columns)
     # Changed "Artan" to "Ascending" to match English UI
     ascending = st.radio("Sort order", ["Ascending", "Descending"]) == "Ascending"
-    df_temp = df_temp.sort_values(by=sort_column, ascending=ascending)
+    steps.append(pipeline.make_step("sort", column=sort_column, ascending=ascending))
+    df_temp = pipeline.run_pipeline(df_temp, steps)
 
     st.write("### 📊 Filtering and Sorting Result (Temporary)")
-    st.dataframe(df_temp)
+    st.dataframe(encoding.to_dense(df_temp))
 
     # ------------------- Save Session State -------------------
     if st.button("✅ Save to Session State"):
-        st.session_state["data"] = df_temp
+        session_store.set_data(df_temp, steps=steps)
         st.success("Updated data saved to session_state.")
@@ -2,6 +2,7 @@
 
 import streamlit as st
 import pandas as pd
+from modules import session_store, pipeline, encoding
 
 def run():
     st.subheader("📊 Data Grouping (Grouper)")
@@ -13,7 +14,7 @@ def run():
     df = st.session_state["data"]
     
     st.write("📊 Current Data (Temporary):")
-    st.dataframe(df.head())
+    st.dataframe(encoding.to_dense(df.head()))
 
     st.write("### ➕ Select Column to Group By")
     group_column = st.selectbox("Select column to group by", df.columns)
@@ -24,21 +25,14 @@ def run():
     # 1. Step: Perform Grouping
     if st.button("Group and Summarize"):
         try:
-            # Get numerical columns, exclude the grouping column
-            num_cols = [col for col in df.select_dtypes(include="number").columns if col != group_column]
-
-            if not num_cols:
-                st.warning("No numerical data found other than the selected column. Grouping requires numerical columns.")
-            else:
-                # Grouping and aggregation
-                grouped_df = df.groupby(group_column)[num_cols].agg(aggregation_func).reset_index()
-
-                # Rename columns
-                grouped_df.columns = [group_column] + [f"{col}_{aggregation_func}" for col in num_cols]
-                
-                # Save to temporary state to allow viewing and saving in the next step
-                st.session_state["grouped_temp"] = grouped_df
-
+            step = pipeline.make_step("group_aggregate", column=group_column, func=aggregation_func)
+            # Grouping, aggregation and renaming to <column>_<func>
+            # Save to temporary state to allow viewing and saving in the next step
+            st.session_state["grouped_temp"] = pipeline.run_pipeline(df, [step])
+            st.session_state["grouped_steps"] = [step]
+
+        except ValueError as e:
+            st.warning(str(e))
         except Exception as e:
             st.error(f"Error occurred: {e}")
 
@@ -50,7 +44,7 @@ def run():
         col1, col2 = st.columns([1, 4])
         with col1:
             if st.button("✅ Save to Session State"):
-                st.session_state["data"] = st.session_state["grouped_temp"]
+                session_store.set_data(st.session_state["grouped_temp"], steps=st.session_state.pop("grouped_steps", []))
                 # Optional: Clear temp after save
                 del st.session_state["grouped_temp"]
                 st.success("Updated data saved to session_state.")
@@ -0,0 +1,129 @@
+# modules/history.py
+
+import contextlib
+import streamlit as st
+
+# --- Undo / redo history ---
+# Works on a staging.StagedFrame. Each step stores the reversible deltas the
+# stage's edits log (replaced column Series, removed row positions and values,
+# dropped column names) instead of a copy of the frame. The bytes held only by
+# the history are tracked, and the oldest steps are evicted once they exceed
+# the memory budget.
+
+DEFAULT_BUDGET_MB = 512
+
+def _series_bytes(columns):
+    return sum(int(s.memory_usage(index=False, deep=False)) for s in columns if s is not None)
+
+def delta_bytes(delta, side):
+    """
+    Bytes a delta keeps alive. Undo steps hold the "before" side, redo steps
+    the "after" side; the other side is the live stage.
+    """
+    if delta["kind"] == "rows":
+        return delta["removed"].nbytes + delta["removed_rows"].nbytes + _series_bytes(delta["slices"].values())
+    if delta["kind"] == "columns":
+        return _series_bytes(delta[side].values())
+    if delta["kind"] == "steps":
+        return 0
+    base, rows, changed, _ = delta[side]
+    total = int(base.memory_usage(index=False, deep=False).sum()) + _series_bytes(changed.values())
+    return total + (rows.nbytes if rows is not None else 0)
+
+class UndoHistory:
+    def __init__(self, stage, budget_bytes=DEFAULT_BUDGET_MB * 1024 ** 2):
+        self.stage = stage
+        self.budget_bytes = budget_bytes
+        self.undo_steps = []   # oldest first; each {"label", "deltas", "nbytes"}
+        self.redo_steps = []
+
+    @property
+    def nbytes(self):
+        return sum(step["nbytes"] for step in self.undo_steps + self.redo_steps)
+
+    @contextlib.contextmanager
+    def step(self, label):
+        """
+        Records every edit made to the stage inside the block as one undo step.
+        """
+        self.stage.journal = []
+        try:
+            yield self.stage
+        finally:
+            deltas, self.stage.journal = self.stage.journal, None
+            if deltas:
+                nbytes = sum(delta_bytes(d, "before") for d in deltas)
+                self.undo_steps.append({"label": label, "deltas": deltas, "nbytes": nbytes})
+                self.redo_steps = []
+                self.evict()
+
+    def undo(self):
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        for delta in reversed(step["deltas"]):
+            self.stage.apply_delta(delta, undo=True)
+        step["nbytes"] = sum(delta_bytes(d, "after") for d in step["deltas"])
+        self.redo_steps.append(step)
+        return step["label"]
+
+    def redo(self):
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        for delta in step["deltas"]:
+            self.stage.apply_delta(delta, undo=False)
+        step["nbytes"] = sum(delta_bytes(d, "before") for d in step["deltas"])
+        self.undo_steps.append(step)
+        self.evict()
+        return step["label"]
+
+    def evict(self):
+        """
+        Drops the oldest undo steps, then the farthest redo steps, until the
+        history fits in the budget. The most recent undo step is always kept.
+        """
+        while self.nbytes > self.budget_bytes and len(self.undo_steps) > 1:
+            self.undo_steps.pop(0)
+        while self.nbytes > self.budget_bytes and self.redo_steps:
+            self.redo_steps.pop(0)
+
+# --- Session helpers ---
+def get_history(key, stage):
+    """
+    Returns the history of the stage stored under key (see staging.get_stage);
+    a new stage (after save, reset or rebase) starts with an empty history.
+    """
+    history_key = f"{key}_history"
+    history = st.session_state.get(history_key)
+    if history is None or history.stage is not stage:
+        history = UndoHistory(stage)
+        st.session_state[history_key] = history
+    history.budget_bytes = st.session_state.get(f"{key}_budget_mb", DEFAULT_BUDGET_MB) * 1024 ** 2
+    history.evict()
+    return history
+
+def history_controls(key, history):
+    """
+    Renders Undo / Redo buttons and the history's memory use.
+    Returns "undo", "redo" or None.
+    """
+    action = None
+    if st.button("↩️ Undo", key=f"{key}_undo", disabled=not history.undo_steps):
+        label = history.undo()
+        st.success(f"Undone: {label} ✅")
+        action = "undo"
+    if st.button("↪️ Redo", key=f"{key}_redo", disabled=not history.redo_steps):
+        label = history.redo()
+        st.success(f"Redone: {label} ✅")
+        action = "redo"
+
+    with st.expander("🕘 History"):
+        st.number_input("Memory budget (MB)", min_value=1, value=DEFAULT_BUDGET_MB, step=64, key=f"{key}_budget_mb")
+        st.caption(
+            f"{len(history.undo_steps)} undo / {len(history.redo_steps)} redo steps, "
+            f"{history.nbytes / 1024 ** 2:.1f} MB of {history.budget_bytes / 1024 ** 2:.0f} MB"
+        )
+        for step in reversed(history.undo_steps):
+            st.write(f"- {step['label']}")
+    return action
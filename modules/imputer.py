@@ -0,0 +1,182 @@
+# modules/imputer.py
+
+import warnings
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+from sklearn.experimental import enable_iterative_imputer  # noqa: F401 (enables IterativeImputer)
+from sklearn.impute import IterativeImputer
+
+# --- Scalable imputation ---
+# Drop-in replacements for sklearn's KNNImputer, whose brute-force distance
+# matrix is quadratic in the number of rows, plus group-aware and time-aware
+# fills. Every function takes a numeric DataFrame and returns a filled copy
+# with the same columns and index.
+
+DEFAULT_MAX_MEMORY_MB = 256
+DEFAULT_MAX_PATTERNS = 16
+
+def _block_rows(n_neighbors, n_features, max_memory_mb):
+    """
+    Rows per query block so one block's neighbour arrays stay under the cap.
+    """
+    per_row = 8 * (n_features + 2 * n_neighbors + n_neighbors * n_features)
+    return max(1, int(max_memory_mb * 1024 ** 2 // per_row))
+
+def knn_impute(frame, n_neighbors=3, max_memory_mb=DEFAULT_MAX_MEMORY_MB, n_jobs=-1,
+               max_patterns=DEFAULT_MAX_PATTERNS):
+    """
+    KNN imputation with tree indexes instead of a full distance matrix.
+    Incomplete rows are grouped by missingness pattern. The max_patterns most
+    frequent patterns each get a KD/ball tree on the donors complete in the
+    pattern's observed columns (exact neighbours). The rows of all the rarer
+    patterns share one tree on the fully complete rows, queried with their
+    missing coordinates first estimated from the observed ones (see
+    _conditional_means), so the number of trees does not grow with the
+    number of patterns. Trees are queried in row blocks on all cores; missing
+    values get the mean of the k nearest donors (uniform weights, as
+    KNNImputer); values without any donor get the column mean.
+    """
+    X = frame.to_numpy(dtype="float64", na_value=np.nan, copy=True)
+    missing = np.isnan(X)
+    incomplete = np.flatnonzero(missing.any(axis=1))
+    if incomplete.size == 0:
+        return frame.astype("float64")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        means = np.nanmean(X, axis=0)
+    empty = np.isnan(means)
+    if empty.any():
+        # All-NaN columns stay NaN and would leave no complete row: impute without them
+        out = X
+        if not empty.all():
+            kept = np.flatnonzero(~empty)
+            out[:, kept] = knn_impute(frame.iloc[:, kept], n_neighbors, max_memory_mb, n_jobs,
+                                      max_patterns).to_numpy()
+        return pd.DataFrame(out, columns=frame.columns, index=frame.index)
+    out = X.copy()  # donors are always looked up in the original values
+
+    patterns, inverse, counts = np.unique(missing[incomplete], axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    complete = np.flatnonzero(~missing.any(axis=1))
+    if complete.size >= max(n_neighbors, 2):
+        exact = np.zeros(len(patterns), dtype=bool)
+        exact[np.argsort(-counts, kind="stable")[:max_patterns]] = True
+        exact |= patterns.all(axis=1)   # nothing to query with: column means below
+    else:
+        exact = np.ones(len(patterns), dtype=bool)
+
+    for p in np.flatnonzero(exact):
+        pattern = patterns[p]
+        rows = incomplete[inverse == p]
+        miss_cols = np.flatnonzero(pattern)
+        obs_cols = np.flatnonzero(~pattern)
+        if obs_cols.size == 0:
+            out[np.ix_(rows, miss_cols)] = means[miss_cols]
+            continue
+
+        complete_obs = ~missing[:, obs_cols].any(axis=1)
+        pool = complete_obs & ~missing[:, miss_cols].any(axis=1)
+        if pool.sum() >= n_neighbors:
+            groups = [(miss_cols, pool)]
+        else:
+            # Too few rows complete in every missing column: one donor pool per column
+            groups = [(np.array([j]), complete_obs & ~missing[:, j]) for j in miss_cols]
+
+        for cols, pool in groups:
+            donors = np.flatnonzero(pool)
+            if donors.size == 0:
+                out[np.ix_(rows, cols)] = means[cols]
+                continue
+            k = min(n_neighbors, donors.size)
+            index = NearestNeighbors(n_neighbors=k, n_jobs=n_jobs).fit(X[np.ix_(donors, obs_cols)])
+            donor_values = X[np.ix_(donors, cols)]
+            step = _block_rows(k, obs_cols.size + cols.size, max_memory_mb)
+            for start in range(0, rows.size, step):
+                block = rows[start:start + step]
+                neighbours = index.kneighbors(X[np.ix_(block, obs_cols)], return_distance=False)
+                out[np.ix_(block, cols)] = donor_values[neighbours].mean(axis=1)
+
+    rare = np.flatnonzero(~exact[inverse])
+    if rare.size:
+        donor_values = X[complete]
+        query = _conditional_means(X, donor_values, incomplete[rare], patterns, inverse[rare])
+        index = NearestNeighbors(n_neighbors=n_neighbors, n_jobs=n_jobs).fit(donor_values)
+        rare = incomplete[rare]
+        step = _block_rows(n_neighbors, X.shape[1], max_memory_mb)
+        for start in range(0, rare.size, step):
+            block = rare[start:start + step]
+            neighbours = index.kneighbors(query[start:start + step], return_distance=False)
+            out[block] = np.where(missing[block], donor_values[neighbours].mean(axis=1), X[block])
+
+    return pd.DataFrame(out, columns=frame.columns, index=frame.index)
+
+def _conditional_means(X, donor_values, rows, patterns, pattern_of_row):
+    """
+    Query points for rows with rare patterns: the missing coordinates are the
+    linear (Gaussian conditional) estimate from the observed ones, using the
+    mean and covariance of the complete rows; one small solve per pattern.
+    """
+    mean = donor_values.mean(axis=0)
+    cov = np.cov(donor_values, rowvar=False).reshape(X.shape[1], X.shape[1])
+    query = X[rows]
+    order = np.argsort(pattern_of_row, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(pattern_of_row[order]) != 0])
+    for group in np.split(order, starts[1:]):
+        pattern = patterns[pattern_of_row[group[0]]]
+        miss, obs = np.flatnonzero(pattern), np.flatnonzero(~pattern)
+        coef = np.linalg.lstsq(cov[np.ix_(obs, obs)], cov[np.ix_(obs, miss)], rcond=None)[0]
+        query[np.ix_(group, miss)] = mean[miss] + (query[np.ix_(group, obs)] - mean[obs]) @ coef
+    return query
+
+def iterative_impute(frame, max_iter=10, random_state=0):
+    """
+    Models each column with missing values as a regression on the others
+    (BayesianRidge, linear in the number of rows), round-robin until stable.
+    """
+    imputer = IterativeImputer(max_iter=max_iter, random_state=random_state, keep_empty_features=True)
+    # Writable copy: session columns can be read-only memory-mapped buffers
+    X = frame.to_numpy(dtype="float64", na_value=np.nan, copy=True)
+    return pd.DataFrame(imputer.fit_transform(X), columns=frame.columns, index=frame.index)
+
+def _group_mode(frame, keys):
+    """
+    Most frequent value of every column per group, aligned to the rows:
+    one size() over (keys, value) per column, ties to the smallest value
+    as Series.mode().
+    """
+    key_frame = pd.DataFrame({f"_key{i}": key for i, key in enumerate(keys)}, index=frame.index)
+    names = list(key_frame.columns)
+    modes = {}
+    for col in frame.columns:
+        counts = pd.concat([key_frame, frame[col]], axis=1).groupby(names + [col], observed=True).size()
+        best = counts.sort_values(ascending=False, kind="stable").reset_index().drop_duplicates(names)
+        modes[col] = key_frame.merge(best[names + [col]], on=names, how="left")[col].to_numpy()
+    return pd.DataFrame(modes, index=frame.index)
+
+def group_fill(frame, keys, stat="median"):
+    """
+    Fills every column with its mean, median or mode within groups, computed in
+    a single groupby().transform pass over all columns (mode: see _group_mode).
+    keys is a list of arrays with one key per row (columns, time periods).
+    Values still missing (group without any value) get the global statistic.
+    """
+    if stat == "mode":
+        filled = frame.fillna(_group_mode(frame, keys))
+        global_mode = frame.mode()
+        return filled.fillna(global_mode.iloc[0]) if len(global_mode) else filled
+    stats = frame.groupby(keys, observed=True, dropna=False).transform(stat)
+    return frame.fillna(stats).fillna(getattr(frame, stat)())
+
+def interpolate_fill(frame, method="linear", order=3):
+    """
+    Interpolates along the index: "linear" by position, "time" by the
+    DatetimeIndex distance, "spline" (scipy) of the given order. Leading and
+    trailing gaps are filled too.
+    """
+    if method == "time" and not isinstance(frame.index, pd.DatetimeIndex):
+        raise ValueError("Time interpolation needs a DatetimeIndex.")
+    if method == "spline":
+        return frame.interpolate(method="spline", order=order, limit_direction="both")
+    return frame.interpolate(method=method, limit_direction="both")
@@ -0,0 +1,126 @@
+# modules/load_cache.py
+
+import os
+import json
+import hashlib
+import tempfile
+import pyarrow as pa
+import pyarrow.feather as feather
+from modules import session_store
+
+# --- Load cache ---
+# Parsed DataFrames are kept as uncompressed Arrow IPC files in a directory shared
+# by every session on this machine, keyed by the file's content hash plus the
+# loader options. A hit is read back memory-mapped and skips parsing, sniffing
+# and datetime detection entirely. The least recently used entries are evicted
+# once the directory grows past MAX_CACHE_BYTES.
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "data_manipulation_cache")
+MAX_CACHE_BYTES = 4 * 1024 ** 3
+HASH_BLOCK_BYTES = 4 * 1024 * 1024
+
+def content_hash(file):
+    """
+    Hashes the full content of a file-like object in blocks.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    file.seek(0)
+    while True:
+        block = file.read(HASH_BLOCK_BYTES)
+        if not block:
+            break
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+def cache_key(file, options, digest=None):
+    """
+    Combines the content hash (digest, if the caller already has it) with the
+    loader options that shape the result.
+    """
+    encoded = json.dumps(options, sort_keys=True, default=str).encode()
+    return f"{digest or content_hash(file)}_{hashlib.blake2b(encoded, digest_size=8).hexdigest()}"
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.arrow")
+
+def get(key):
+    path = _entry_path(key)
+    try:
+        df = session_store.to_frame(feather.read_table(path, memory_map=True))
+    except (OSError, pa.ArrowInvalid):
+        return None
+    try:
+        os.utime(path)  # mark as recently used
+    except OSError:
+        pass
+    return df
+
+def put(key, df):
+    """
+    Stores a parsed frame. Written to a temp name and renamed, so concurrent
+    sessions never read a half-written entry. Frames Arrow cannot represent
+    are simply not cached.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        session_store.write_mapped(df, tmp_path)
+        os.replace(tmp_path, _entry_path(key))
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, ValueError, OSError) as e:
+        print(f"Load cache skipped: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict()
+
+def _entries():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".arrow"):
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+    return entries
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """
+    Deletes the least recently used entries until the cache fits in max_bytes.
+    """
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def stats():
+    entries = _entries()
+    return len(entries), sum(size for _, size, _ in entries)
+
+def clear():
+    evict(max_bytes=0)
+
+def cached_load(file, options, load_fn, digest=None):
+    """
+    Returns (DataFrame, hit). On a miss, load_fn() parses the file and the
+    result is stored under the file's content hash and options.
+    """
+    key = cache_key(file, options, digest)
+    df = get(key)
+    if df is not None:
+        return df, True
+    file.seek(0)
+    df = load_fn()
+    put(key, df)
+    return df, False
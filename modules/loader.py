@@ -3,124 +3,1186 @@ import pandas as pd
 import io
 import sqlite3
 import os
+import re
+import csv
+import json
+import codecs
+import glob
+import hashlib
+import importlib.util
+import shutil
+import tempfile
+import time
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from urllib.request import pathname2url
+from pandas.api.types import union_categoricals
+from pandas.tseries.api import guess_datetime_format
+import pyarrow as pa
+import pyarrow.parquet as pq
+from modules import session_store, load_cache, encoding
+
+DEFAULT_CHUNKSIZE = 200_000
+CATEGORY_RATIO = 0.5
+SNIFF_BYTES = 64 * 1024
+JSON_BLOCK_BYTES = 1024 * 1024
+JSON_LINE_SNIFF_BYTES = 16 * 1024 * 1024
+DIALECT_CACHE_SIZE = 256
+# One entry per (file, column) checked for dates, so more than one per file
+DATETIME_FORMAT_CACHE_SIZE = 16 * DIALECT_CACHE_SIZE
+# The only server directory whose files can be named from the UI (see data_path)
+DATA_DIR = "datasets"
+
+# Sniffed CSV dialects keyed by file fingerprint, shared by all sessions of this process
+_DIALECT_CACHE = {}
+# Column dtypes of finished CSV parses, keyed by the full content hash (see load_cache):
+# they pin categories and narrow int widths, so they must never reach a different file
+_DTYPE_CACHE = {}
 
 # --- Loader functions --- 
 def detect_delimiter(sample_text):
-    delimiters = [",", ";", "\t", ":"]
-    delimiter_counts = {d: sample_text.count(d) for d in delimiters}
-    return max(delimiter_counts, key=delimiter_counts.get)
+    """
+    Picks the delimiter that splits the sample lines into the most consistent
+    number of fields. Lines are parsed with the csv module, so delimiters inside
+    quoted fields are ignored. Ties go to the wider split, then to list order.
+    """
+    delimiters = [",", ";", "\t", "|", ":"]
+    lines = [line for line in sample_text.splitlines() if line.strip()]
+    if not lines:
+        return ","
+    best, best_score = ",", (0.0, 0)
+    for d in delimiters:
+        counts = [len(row) for row in csv.reader(lines, delimiter=d, quotechar='"')]
+        fields = max(set(counts), key=counts.count)
+        if fields < 2:
+            continue
+        score = (counts.count(fields) / len(counts), fields)
+        if score > best_score:
+            best, best_score = d, score
+    return best
 
 def parse_excel_with_delimiter(df):
+    """
+    A sheet holding delimited text in a single column (CSV pasted into Excel) is
+    re-parsed in one pass by the C CSV parser, which also infers proper dtypes.
+    The DataFrame must be read with header=0, so the column name is the header line.
+    """
     if df.shape[1] == 1:
-        col_data = df.iloc[:, 0].astype(str)
-        sample_text = "\n".join(col_data.head(5))
-        delimiter = detect_delimiter(sample_text)
-        df_split = col_data.str.split(delimiter, expand=True)
-        df_split.columns = df_split.iloc[0]  # First row is column header
-        df_split = df_split[1:].reset_index(drop=True)
-        return df_split
+        header = str(df.columns[0])
+        col_data = df.iloc[:, 0].dropna().astype(str)
+        delimiter = detect_delimiter("\n".join([header, *col_data.head(5)]))
+        if delimiter in header:
+            text = "\n".join([header, *col_data])
+            return pd.read_csv(io.StringIO(text), sep=delimiter)
     return df
 
-def detect_datetime_column(df, threshold=0.8, sample_size=100):
-    for col in df.columns:
-        try:
-            sample = df[col].dropna().astype(str).head(sample_size)
-            if len(sample) == 0:
-                continue
-            parsed = pd.to_datetime(sample, errors="coerce")
-            ratio = parsed.notna().sum() / len(sample)
-            if ratio >= threshold:
-                return col
-        except Exception:
-            continue
+# --- Excel source ---
+def excel_engines():
+    """
+    Available engines, fastest first. calamine (Rust, pip install python-calamine)
+    is optional; pandas opens openpyxl workbooks in read-only mode.
+    """
+    engines = ["openpyxl"]
+    if importlib.util.find_spec("python_calamine") is not None:
+        engines.insert(0, "calamine")
+    return engines
+
+def excel_sheet_names(file, engine=None):
+    file.seek(0)
+    with pd.ExcelFile(file, engine=engine or excel_engines()[0]) as xls:
+        return xls.sheet_names
+
+def read_excel_sheets(file, sheet_name=0, engine=None):
+    """
+    Reads one sheet (name or position) or, with sheet_name=None, every sheet
+    concatenated with a "Sheet" column naming its source.
+    """
+    file.seek(0)
+    engine = engine or excel_engines()[0]
+    if sheet_name is not None:
+        return parse_excel_with_delimiter(pd.read_excel(file, sheet_name=sheet_name, engine=engine))
+    sheets = pd.read_excel(file, sheet_name=None, engine=engine)
+    frames = []
+    for name, sheet in sheets.items():
+        sheet = parse_excel_with_delimiter(sheet)
+        sheet.insert(0, "Sheet", name)
+        frames.append(sheet)
+    sheets.clear()
+    return pd.concat(frames, ignore_index=True)
+
+# --- Dialect sniffing ---
+def _sample_ranges(file):
+    """
+    Reads byte samples from the head, middle and tail of the file.
+    """
+    size = _file_size(file)
+    offsets = [0]
+    if size > 4 * SNIFF_BYTES:
+        offsets += [size // 2, size - SNIFF_BYTES // 4]
+    samples = []
+    for offset in offsets:
+        file.seek(offset)
+        samples.append(file.read(SNIFF_BYTES if offset == 0 else SNIFF_BYTES // 4))
+    file.seek(0)
+    return size, samples
+
+def file_fingerprint(file):
+    """
+    Cheap content fingerprint: file size plus the sampled head/middle/tail bytes.
+    It identifies the sniffing samples, not the content; use
+    load_cache.content_hash for anything derived from the whole file.
+    """
+    size, samples = _sample_ranges(file)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    for sample in samples:
+        digest.update(sample)
+    return digest.hexdigest()
+
+def _decodes(sample, encoding, mid_file):
+    if mid_file:
+        # A sample taken mid-file may start inside a multibyte character: skip its continuation bytes
+        start = 0
+        while start < min(3, len(sample)) and 0x80 <= sample[start] < 0xC0:
+            start += 1
+        sample = sample[start:]
+    try:
+        # final=False: a multibyte character cut at the sample edge is not an error
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def _detect_encoding(samples):
+    """
+    Encoding from the BOM of the head sample, else the first of utf-8 /
+    latin-1 that decodes every sampled byte range.
+    """
+    head = samples[0]
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    if all(_decodes(sample, "utf-8", i > 0) for i, sample in enumerate(samples)):
+        return "utf-8"
+    return "latin-1"
+
+def _sample_lines(samples, encoding):
+    lines = []
+    for i, sample in enumerate(samples):
+        text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample, final=False)
+        part = text.splitlines()
+        if i > 0:
+            part = part[1:]  # starts mid-line
+        if len(part) > 1:
+            part = part[:-1]  # may end mid-line
+        lines.extend(part)
+    return lines
+
+def _is_number(field):
+    try:
+        float(field)
+        return True
+    except ValueError:
+        return False
+
+def _has_header(rows):
+    """
+    The first row is data (no header) if every column that is numeric in the
+    rest of the sample is numeric in the first row too.
+    """
+    if len(rows) < 2:
+        return True
+    first, rest = rows[0], rows[1:]
+    numeric_cols = [
+        i for i in range(len(first))
+        if all(i < len(r) and r[i] != "" and _is_number(r[i]) for r in rest)
+    ]
+    if not numeric_cols:
+        return True
+    return not all(_is_number(first[i]) for i in numeric_cols)
+
+def sniff_dialect(file, fingerprint=None):
+    """
+    Detects encoding, delimiter, quote character and header from several byte
+    ranges of the file. Results are cached per file fingerprint (the dialect only
+    depends on the sampled bytes), so re-reading the same file skips sniffing.
+    Returns a dict of pd.read_csv keyword arguments.
+    """
+    fingerprint = fingerprint or file_fingerprint(file)
+    if fingerprint in _DIALECT_CACHE:
+        return _DIALECT_CACHE[fingerprint]
+
+    _, samples = _sample_ranges(file)
+    encoding = _detect_encoding(samples)
+    lines = _sample_lines(samples, "utf-8" if encoding == "utf-8-sig" else encoding)
+    if encoding == "utf-8-sig" and lines:
+        lines[0] = lines[0].lstrip("\ufeff")
+    text = "\n".join(lines)
+    delimiter = detect_delimiter(text)
+    quotechar = "'" if text.count(delimiter + "'") > text.count(delimiter + '"') else '"'
+    rows = list(csv.reader(lines[:200], delimiter=delimiter, quotechar=quotechar))
+
+    dialect = {
+        "fingerprint": fingerprint,
+        "read_options": {
+            "sep": delimiter,
+            "quotechar": quotechar,
+            "encoding": encoding,
+            "header": 0 if _has_header(rows) else None,
+            "engine": "c",
+        },
+    }
+    if len(_DIALECT_CACHE) >= DIALECT_CACHE_SIZE:
+        _DIALECT_CACHE.pop(next(iter(_DIALECT_CACHE)))
+    _DIALECT_CACHE[fingerprint] = dialect
+    return dialect
+
+def remember_dtypes(content_key, df):
+    """
+    Stores the column dtypes of a finished parse under the file's content hash,
+    so the next parse of the identical file skips type inference.
+    """
+    if len(_DTYPE_CACHE) >= DIALECT_CACHE_SIZE:
+        _DTYPE_CACHE.pop(next(iter(_DTYPE_CACHE)))
+    _DTYPE_CACHE[content_key] = {
+        col: dtype for col, dtype in df.dtypes.items()
+        if pd.api.types.is_numeric_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype)
+    }
+
+def remembered_dtypes(content_key):
+    return _DTYPE_CACHE.get(content_key)
+
+# --- Datetime detection ---
+# Cheap shape checks: numeric dates with -, /, . separators (optionally with a
+# time part) and dates with month names
+_DATETIME_PATTERN = re.compile(
+    r"^(\d{1,4}[-/.]\d{1,2}([-/.]\d{1,4})?([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?"
+    r"|\d{1,2}[ -/]?[A-Za-z]{3,9}[ -/,]+\d{2,4}.*"
+    r"|[A-Za-z]{3,9}[ -/]\d{1,2}(st|nd|rd|th)?,?[ -/]\d{2,4}.*)$"
+)
+
+# Explicit formats keyed by (file content hash, column); None marks "not a date column"
+_DATETIME_FORMAT_CACHE = {}
+
+def _remember_format(key, fmt):
+    if key not in _DATETIME_FORMAT_CACHE and len(_DATETIME_FORMAT_CACHE) >= DATETIME_FORMAT_CACHE_SIZE:
+        _DATETIME_FORMAT_CACHE.pop(next(iter(_DATETIME_FORMAT_CACHE)))
+    _DATETIME_FORMAT_CACHE[key] = fmt
+
+def _candidate_formats(sample):
+    formats = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for value in sample.head(3):
+            for dayfirst in (False, True):
+                fmt = guess_datetime_format(value, dayfirst=dayfirst)
+                if fmt and fmt not in formats:
+                    formats.append(fmt)
+    return formats
+
+def infer_datetime_format(series, threshold=0.8, sample_size=100):
+    """
+    Returns one explicit format string that parses the column, or None.
+    Non-text dtypes and values that don't look like dates are ruled out
+    before any parsing is attempted.
+    """
+    if not (series.dtype == object or isinstance(series.dtype, (pd.CategoricalDtype, pd.StringDtype))):
+        return None
+    sample = series.dropna().head(sample_size).astype(str).str.strip()
+    if len(sample) == 0:
+        return None
+    if sample.str.match(_DATETIME_PATTERN).mean() < threshold:
+        return None
+    for fmt in _candidate_formats(sample):
+        parsed = pd.to_datetime(sample, format=fmt, errors="coerce")
+        if parsed.notna().mean() >= threshold:
+            return fmt
     return None
 
-def set_datetime_index(df):
+def detect_datetime_column(df, threshold=0.8, sample_size=100, fingerprint=None):
+    """
+    Returns (column, format) of the first datetime-like column, or (None, None).
+    A column that is already datetime64 is returned with format None.
+    With a fingerprint (the file's content hash), the decision per column is
+    cached for the next load.
+    """
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col, None
+        key = (fingerprint, col)
+        if fingerprint is not None and key in _DATETIME_FORMAT_CACHE:
+            fmt = _DATETIME_FORMAT_CACHE[key]
+        else:
+            fmt = infer_datetime_format(df[col], threshold, sample_size)
+            if fingerprint is not None:
+                _remember_format(key, fmt)
+        if fmt:
+            return col, fmt
+    return None, None
+
+def set_datetime_index(df, fingerprint=None):
     try:
-        datetime_col = detect_datetime_column(df)
+        datetime_col, fmt = detect_datetime_column(df, fingerprint=fingerprint)
         if datetime_col:
+            values = df[datetime_col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # to_datetime keeps the categorical wrapper, parse the plain values instead
+                values = values.astype(object)
+            if fmt:
+                parsed = pd.to_datetime(values.astype(str).str.strip(), format=fmt, errors="coerce")
+                # The format was guessed from a sample: never drop values it doesn't fit
+                lost = int((parsed.isna() & values.notna()).sum())
+                if lost:
+                    print(f"Datetime index skipped: {lost} value(s) of '{datetime_col}' don't match {fmt}")
+                    if fingerprint is not None:
+                        _remember_format((fingerprint, datetime_col), None)
+                    return df
+            else:
+                parsed = pd.to_datetime(values)
             df = df.copy()
-            df[datetime_col] = pd.to_datetime(df[datetime_col])
+            df[datetime_col] = parsed
             df.set_index(datetime_col, inplace=True)
         return df
     except Exception as e:
         print(f"Datetime index setting error: {e}")
         return df
 
-def load_file(uploaded_file):
+# --- Chunked (streaming) ingestion ---
+def infer_schema(chunk):
+    """
+    Infers a target kind per column from the first chunk:
+    "integer", "float", "category" or None (left as is).
+    """
+    schema = {}
+    for col in chunk.columns:
+        s = chunk[col]
+        if pd.api.types.is_bool_dtype(s):
+            schema[col] = None
+        elif pd.api.types.is_integer_dtype(s):
+            schema[col] = "integer"
+        elif pd.api.types.is_float_dtype(s):
+            schema[col] = "float"
+        elif (s.dtype == object and len(s) > 0 and pd.api.types.infer_dtype(s, skipna=True) == "string"
+              and s.nunique(dropna=True) / len(s) <= CATEGORY_RATIO):
+            schema[col] = "category"
+        else:
+            schema[col] = None
+    return schema
+
+def downcast_chunk(chunk, schema):
+    """
+    Downcasts a chunk's columns to the smallest dtype that holds their values.
+    Floats are only narrowed to float32 when the values survive the round trip.
+    """
+    for col, kind in schema.items():
+        if col not in chunk.columns:
+            continue
+        s = chunk[col]
+        if kind == "integer" or (kind == "float" and pd.api.types.is_integer_dtype(s)):
+            if pd.api.types.is_integer_dtype(s):
+                chunk[col] = pd.to_numeric(s, downcast="integer")
+            elif pd.api.types.is_float_dtype(s):
+                chunk[col] = _downcast_float(s)
+        elif kind == "float" and pd.api.types.is_float_dtype(s):
+            chunk[col] = _downcast_float(s)
+        elif kind == "category" and s.dtype == object:
+            chunk[col] = s.astype("category")
+    return chunk
+
+def _downcast_float(s):
+    narrowed = s.astype("float32")
+    if np.array_equal(narrowed.to_numpy(dtype="float64"), s.to_numpy(dtype="float64"), equal_nan=True):
+        return narrowed
+    return s
+
+def _concat_chunks(chunks, ignore_index=True):
+    """
+    Concatenates downcast chunks in a single pd.concat. Categorical columns get
+    a shared category set first, otherwise pandas would fall back to object dtype.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            parts = [c[col] for c in chunks if col in c.columns and isinstance(c[col].dtype, pd.CategoricalDtype)]
+            if len(parts) == len(chunks):
+                categories = union_categoricals(parts).categories
+                for c in chunks:
+                    c[col] = c[col].cat.set_categories(categories)
+    df = pd.concat(chunks, ignore_index=ignore_index)
+    chunks.clear()
+    return df
+
+def _file_size(file):
+    size = getattr(file, "size", None)
+    if size is None:
+        pos = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(pos)
+    return size
+
+def read_csv_chunked(file, read_options, chunksize=DEFAULT_CHUNKSIZE, progress_callback=None):
+    """
+    Reads a CSV in chunks, infers the dtype schema from the first chunk and
+    downcasts every chunk before keeping it, so the raw text is never
+    materialized as a whole.
+    """
+    total = _file_size(file)
+    schema = None
+    chunks = []
+    rows = 0
+    for chunk in pd.read_csv(file, chunksize=chunksize, low_memory=False, **read_options):
+        if schema is None:
+            schema = infer_schema(chunk)
+        chunks.append(downcast_chunk(chunk, schema))
+        rows += len(chunk)
+        if progress_callback is not None and total:
+            progress_callback(min(file.tell() / total, 1.0), rows)
+    if not chunks:
+        file.seek(0)
+        return pd.read_csv(file, **read_options)
+    return _concat_chunks(chunks)
+
+# --- Streaming JSON source ---
+def _is_frame_document(obj):
+    """
+    True for the one-line objects DataFrame.to_json writes for a whole frame:
+    "columns" / "index" orient (every value an object) and "split" / "table"
+    orient (a "data" array next to "columns" or "schema").
+    """
+    if "data" in obj and ("columns" in obj or "schema" in obj):
+        return True
+    return bool(obj) and all(isinstance(value, dict) for value in obj.values())
+
+def detect_json_layout(file):
+    """
+    Returns "ndjson" (one JSON object per line, as the exporter writes),
+    "records" (a top-level array of objects) or "document" (anything else,
+    read by pd.read_json). A file with a single object line is NDJSON (a
+    one-row export) unless the object is a whole to_json frame.
+    """
+    file.seek(0)
+    head = file.read(SNIFF_BYTES)
+    file.seek(0)
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(head, final=False)
+    text = text.lstrip("\ufeff \t\r\n")
+    if text.startswith("["):
+        # Only arrays of objects are streamed; [[1, 2], [3, 4]] etc. go to pd.read_json
+        return "records" if text[1:].lstrip(" \t\r\n").startswith("{") else "document"
+    lines = []
+    while len(lines) < 2:
+        line = file.readline(JSON_LINE_SNIFF_BYTES)
+        if not line:
+            break
+        if line.strip():
+            lines.append(line)
+    file.seek(0)
+    try:
+        objects = [json.loads(line) for line in lines]
+    except ValueError:
+        return "document"
+    if not objects or not all(isinstance(obj, dict) for obj in objects):
+        return "document"
+    if len(objects) == 1 and _is_frame_document(objects[0]):
+        return "document"
+    return "ndjson"
+
+def _iter_blocks(file):
+    file.seek(0)
+    while True:
+        block = file.read(JSON_BLOCK_BYTES)
+        if not block:
+            return
+        yield block
+
+def _iter_ndjson_records(file):
+    """
+    Yields one object per line; json.loads takes the raw bytes, so the file
+    is never decoded into one big string.
+    """
+    rest = b""
+    for block in _iter_blocks(file):
+        lines = (rest + block).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if rest.strip():
+        yield json.loads(rest)
+
+def _iter_array_records(file):
+    """
+    Incrementally decodes the elements of a top-level JSON array, holding at
+    most one block of text plus one partial element in memory.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, started = "", 0, False
+    for block in _iter_blocks(file):
+        buf = buf[pos:] + text_decoder.decode(block)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if not started:
+                if pos >= len(buf):
+                    break
+                if buf[pos] != "[":
+                    raise ValueError("Expected a JSON array of records.")
+                started, pos = True, pos + 1
+                continue
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next block
+            yield obj
+            pos = end
+    if buf[pos:].strip():
+        decoder.raw_decode(buf, pos)  # raises with the position of the broken element
+
+def read_json_streaming(file, chunksize=DEFAULT_CHUNKSIZE, progress_callback=None):
+    """
+    Reads NDJSON or an array of records in batches of chunksize records.
+    Nested objects are flattened into dotted columns (json_normalize) and every
+    batch is downcast before being kept. Other JSON documents go to pd.read_json.
+    """
+    layout = detect_json_layout(file)
+    if layout == "document":
+        # Default orient first, then to_json's "split" and "table" layouts
+        errors = []
+        for orient in (None, "split", "table"):
+            file.seek(0)
+            try:
+                return pd.read_json(file, orient=orient)
+            except ValueError as e:
+                errors.append(e)
+        raise errors[0]
+
+    records = _iter_ndjson_records(file) if layout == "ndjson" else _iter_array_records(file)
+    total = _file_size(file)
+    schema = None
+    chunks, batch = [], []
+    rows = 0
+
+    def flush():
+        nonlocal schema
+        chunk = pd.json_normalize(batch)
+        batch.clear()
+        if schema is None:
+            schema = infer_schema(chunk)
+        chunks.append(downcast_chunk(chunk, schema))
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= chunksize:
+            rows += len(batch)
+            flush()
+            if progress_callback is not None and total:
+                progress_callback(min(file.tell() / total, 1.0), rows)
+    if batch or not chunks:
+        flush()
+    return _concat_chunks(chunks)
+
+# --- SQLite source ---
+def _connect_readonly(path):
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+
+def _quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def list_sqlite_tables(path):
+    """
+    Lists the tables of a SQLite file with their row counts.
+    """
+    conn = _connect_readonly(path)
+    try:
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        rows = [conn.execute(f"SELECT COUNT(*) FROM {_quote_identifier(n)}").fetchone()[0] for n in names]
+    finally:
+        conn.close()
+    return pd.DataFrame({"Table": names, "Rows": rows})
+
+def sqlite_columns(path, table):
+    conn = _connect_readonly(path)
+    try:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote_identifier(table)})")]
+    finally:
+        conn.close()
+
+def read_sqlite_table(path, table, columns=None, where=None, chunksize=DEFAULT_CHUNKSIZE, progress_callback=None):
+    """
+    Streams a table from a read-only SQLite connection. Column selection and the
+    WHERE filter run inside SQLite; rows arrive in chunks that are downcast
+    before being kept.
+    """
+    select = ", ".join(_quote_identifier(c) for c in columns) if columns else "*"
+    sql = f"SELECT {select} FROM {_quote_identifier(table)}"
+    if where and where.strip():
+        sql += f" WHERE {where}"
+
+    conn = _connect_readonly(path)
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0] if progress_callback else 0
+        schema = None
+        chunks = []
+        rows = 0
+        for chunk in pd.read_sql_query(sql, conn, chunksize=chunksize):
+            if schema is None:
+                schema = infer_schema(chunk)
+            chunks.append(downcast_chunk(chunk, schema))
+            rows += len(chunk)
+            if progress_callback is not None and total:
+                progress_callback(min(rows / total, 1.0), rows)
+        if not chunks:
+            return pd.read_sql_query(sql, conn)
+    finally:
+        conn.close()
+    return _concat_chunks(chunks)
+
+# --- Memory optimization ---
+def _optimize_column(s, category_ratio, pyarrow_strings):
+    if pd.api.types.is_bool_dtype(s):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        # Signed only: unsigned columns wrap around on subtraction in later feature expressions
+        return pd.to_numeric(s, downcast="integer")
+    if pd.api.types.is_float_dtype(s):
+        return _downcast_float(s)
+    if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) == "string":
+        if len(s) and s.nunique(dropna=True) / len(s) <= category_ratio:
+            return s.astype("category")
+        if pyarrow_strings and not s.isna().any():
+            # Arrow strings are much smaller than Python str objects; columns with
+            # missing values stay object so NaN handling downstream is unchanged
+            return s.astype("string[pyarrow]")
+    return s
+
+def optimize_dtypes(df, category_ratio=CATEGORY_RATIO, pyarrow_strings=True):
+    """
+    Downcasts numeric columns to the smallest safe width (floats only when
+    lossless), converts low-cardinality text columns to category and other
+    text columns to pyarrow-backed strings.
+    Returns the optimized DataFrame and a per-column memory report.
+    """
+    before = df.memory_usage(deep=True, index=False)
+    result = df.copy(deep=False)
+    for col in df.columns:
+        new = _optimize_column(df[col], category_ratio, pyarrow_strings)
+        if new.dtype != df[col].dtype:
+            result[col] = new
+    after = result.memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({
+        "Column": df.columns,
+        "Before dtype": df.dtypes.astype(str).values,
+        "After dtype": result.dtypes.astype(str).values,
+        "Before MB": (before.values / 1024 ** 2).round(3),
+        "After MB": (after.values / 1024 ** 2).round(3),
+    })
+    report["Saved MB"] = (report["Before MB"] - report["After MB"]).round(3)
+    return result, report.sort_values("Saved MB", ascending=False, ignore_index=True)
+
+# --- Parquet / Feather / Arrow IPC source ---
+ARROW_TYPES = ("parquet", "feather", "arrow")
+
+def _arrow_source(file):
+    """
+    Memory-maps files that exist on local disk; uploaded bytes are wrapped in a
+    zero-copy Arrow buffer.
+    """
+    path = getattr(getattr(file, "file", None), "name", None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return pa.memory_map(path)
+    return pa.BufferReader(pa.py_buffer(file.getvalue()))
+
+def _dictionary_columns(pf):
+    """
+    String columns that are dictionary-encoded in the Parquet file; reading them
+    as dictionaries keeps them as pandas categoricals instead of object strings.
+    """
+    if pf.metadata.num_row_groups == 0:
+        return []
+    row_group = pf.metadata.row_group(0)
+    columns = []
+    for i in range(row_group.num_columns):
+        chunk = row_group.column(i)
+        if chunk.physical_type == "BYTE_ARRAY" and any("DICTIONARY" in e for e in chunk.encodings):
+            columns.append(chunk.path_in_schema)
+    return columns
+
+def _open_ipc(source):
+    try:
+        return pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source)
+
+def inspect_arrow_file(file):
+    """
+    Reads only the footer/schema: column names, row count and row groups
+    (record batches for Feather/Arrow IPC).
+    """
+    file_type = file.name.split(".")[-1]
+    source = _arrow_source(file)
+    if file_type == "parquet":
+        pf = pq.ParquetFile(source)
+        return {"columns": pf.schema_arrow.names, "rows": pf.metadata.num_rows,
+                "row_groups": pf.metadata.num_row_groups}
+    reader = _open_ipc(source)
+    if isinstance(reader, pa.ipc.RecordBatchFileReader):
+        rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        return {"columns": reader.schema.names, "rows": rows, "row_groups": reader.num_record_batches}
+    table = reader.read_all()
+    return {"columns": table.schema.names, "rows": table.num_rows, "row_groups": len(table.to_batches())}
+
+def read_arrow_file(file, columns=None, row_groups=None):
+    """
+    Reads a Parquet, Feather or Arrow IPC file, projecting to the given columns
+    and row groups (record batches). Dictionary-encoded columns become categoricals.
+    """
+    file_type = file.name.split(".")[-1]
+    source = _arrow_source(file)
+    if file_type == "parquet":
+        pf = pq.ParquetFile(source)
+        dictionary_columns = _dictionary_columns(pf)
+        if dictionary_columns:
+            pf = pq.ParquetFile(source, read_dictionary=dictionary_columns)
+        if row_groups is not None:
+            table = pf.read_row_groups(row_groups, columns=columns, use_pandas_metadata=True)
+        else:
+            table = pf.read(columns=columns, use_pandas_metadata=True)
+    else:
+        reader = _open_ipc(source)
+        if isinstance(reader, pa.ipc.RecordBatchFileReader):
+            indices = row_groups if row_groups is not None else range(reader.num_record_batches)
+            table = pa.Table.from_batches([reader.get_batch(i) for i in indices], schema=reader.schema)
+        else:
+            table = reader.read_all()
+            if row_groups is not None:
+                batches = table.to_batches()
+                table = pa.Table.from_batches([batches[i] for i in row_groups], schema=table.schema)
+        if columns:
+            table = table.select(columns)
+    return table.to_pandas(split_blocks=True)
+
+def _read_csv(file, read_options, chunksize=None, progress_callback=None):
+    if chunksize:
+        return read_csv_chunked(file, read_options, chunksize, progress_callback)
+    return pd.read_csv(file, **read_options)
+
+def load_file(uploaded_file, chunksize=None, progress_callback=None, content_key=None):
+    """
+    content_key is the file's load_cache.content_hash, if the caller already has it.
+    """
     file_type = uploaded_file.name.split(".")[-1]
+    content_key = content_key or load_cache.content_hash(uploaded_file)
     match file_type:
         case "csv":
-            sample = uploaded_file.read(1024).decode("utf-8")
-            uploaded_file.seek(0)
-            delimiter = detect_delimiter(sample)
-            df = pd.read_csv(uploaded_file, delimiter=delimiter)
+            dialect = sniff_dialect(uploaded_file)
+            read_options = dict(dialect["read_options"])
+            dtypes = remembered_dtypes(content_key)
+            if dtypes:
+                read_options["dtype"] = dtypes
+            try:
+                df = _read_csv(uploaded_file, read_options, chunksize, progress_callback)
+            except UnicodeDecodeError:
+                # Non-UTF-8 bytes outside the sniffed samples: latin-1 decodes any byte
+                if read_options["encoding"] != "utf-8":
+                    raise
+                read_options["encoding"] = dialect["read_options"]["encoding"] = "latin-1"
+                uploaded_file.seek(0)
+                df = _read_csv(uploaded_file, read_options, chunksize, progress_callback)
+            remember_dtypes(content_key, df)
         case "xlsx":
-            df_raw = pd.read_excel(uploaded_file, header=None)
-            df = parse_excel_with_delimiter(df_raw)
+            df = read_excel_sheets(uploaded_file)
         case "json":
-            stringio = io.StringIO(uploaded_file.getvalue().decode("utf-8"))
-            df = pd.read_json(stringio)
+            df = read_json_streaming(uploaded_file, chunksize or DEFAULT_CHUNKSIZE, progress_callback)
         case "db":
-            with open("temp_uploaded.db", "wb") as f:
-                f.write(uploaded_file.read())
-            conn = sqlite3.connect("temp_uploaded.db")
-            tables = pd.read_sql_query("SELECT name FROM sqlite_master WHERE type='table';", conn)
-            if not tables.empty:
-                table_name = tables['name'][0]
-                df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-                conn.close()
-            else:
-                conn.close()
-                raise Exception("No tables found in the database.")
+            # Unique temp file per call, concurrent loads never share a path
+            fd, path = tempfile.mkstemp(suffix=".db")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    uploaded_file.seek(0)
+                    shutil.copyfileobj(uploaded_file, f)
+                tables = list_sqlite_tables(path)
+                if tables.empty:
+                    raise Exception("No tables found in the database.")
+                df = read_sqlite_table(path, tables["Table"][0], chunksize=chunksize or DEFAULT_CHUNKSIZE,
+                                       progress_callback=progress_callback)
+            finally:
+                os.remove(path)
+        case "parquet" | "feather" | "arrow":
+            df = read_arrow_file(uploaded_file)
         case _:
             raise Exception("Unsupported file type.")
-    df = set_datetime_index(df)
+    df = set_datetime_index(df, content_key)
     return df
 
+# --- Multi-file ingestion ---
+SUPPORTED_EXTENSIONS = (".csv", ".xlsx", ".json", ".parquet", ".feather", ".arrow")
+
+class LocalFile:
+    """
+    Wraps a binary file object with the part of Streamlit's UploadedFile
+    interface that load_file uses.
+    """
+    def __init__(self, file, name):
+        self.file = file
+        self.name = name
+    def read(self, n=-1):
+        return self.file.read(n)
+    def seek(self, pos, whence=os.SEEK_SET):
+        return self.file.seek(pos, whence)
+    def tell(self):
+        return self.file.tell()
+    def getvalue(self):
+        self.file.seek(0)
+        return self.file.read()
+    def __getattr__(self, attr):
+        # seekable(), readable() etc. for readers such as zipfile (xlsx)
+        return getattr(self.file, attr)
+
+def load_path(path, chunksize=None, name=None):
+    """
+    Loads a local file with the same detection as an upload (no Streamlit needed).
+    """
+    with open(path, "rb") as f:
+        return load_file(LocalFile(f, name or os.path.basename(path)), chunksize)
+
+def iter_chunks(file, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """
+    Yields the file as DataFrames of about chunksize rows (Arrow files: one
+    record batch / batch of a row group), so a file larger than memory can be
+    processed in one pass. Formats that can't be streamed come as one chunk.
+    """
+    file_type = file.name.split(".")[-1]
+    match file_type:
+        case "csv":
+            read_options = dict(sniff_dialect(file)["read_options"])
+            if columns:
+                read_options["usecols"] = columns
+            file.seek(0)
+            yield from pd.read_csv(file, chunksize=chunksize, low_memory=False, **read_options)
+        case "json" if (layout := detect_json_layout(file)) != "document":
+            records = _iter_ndjson_records(file) if layout == "ndjson" else _iter_array_records(file)
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= chunksize:
+                    chunk, batch = pd.json_normalize(batch), []
+                    yield chunk[columns] if columns else chunk
+            if batch:
+                chunk = pd.json_normalize(batch)
+                yield chunk[columns] if columns else chunk
+        case "parquet":
+            pf = pq.ParquetFile(_arrow_source(file))
+            for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        case "feather" | "arrow":
+            reader = _open_ipc(_arrow_source(file))
+            if isinstance(reader, pa.ipc.RecordBatchFileReader):
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            else:
+                batches = reader
+            for batch in batches:
+                yield (batch.select(columns) if columns else batch).to_pandas()
+        case _:
+            df = load_file(file)
+            yield df[columns] if columns else df
+
+def data_path(path):
+    """
+    Resolves a path typed in the UI against DATA_DIR. Raises ValueError for
+    anything that ends up outside it (absolute paths, "..", symlinks).
+    """
+    root = os.path.realpath(DATA_DIR)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError(f"Only files inside '{DATA_DIR}/' can be read from the server.")
+    return full
+
+def iter_path_chunks(path, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    with open(path, "rb") as f:
+        yield from iter_chunks(LocalFile(f, os.path.basename(path)), chunksize, columns)
+
+def _load_partition(source, chunksize=None):
+    """
+    Worker function: source is (name, path) or (name, raw bytes).
+    Returns the name, the DataFrame and the parse time in seconds.
+    """
+    name, payload = source
+    start = time.perf_counter()
+    if isinstance(payload, bytes):
+        df = load_file(LocalFile(io.BytesIO(payload), name), chunksize)
+    else:
+        df = load_path(payload, chunksize, name)
+    return name, df, time.perf_counter() - start
+
+def check_schemas(frames):
+    """
+    Raises ValueError if a partition's columns or dtype kinds differ from the first one.
+    Integer/float differences are allowed, concat promotes them.
+    frames is a list of (name, DataFrame).
+    """
+    def kind(dtype):
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            return "numeric"
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return "datetime"
+        return str(dtype) if pd.api.types.is_bool_dtype(dtype) else "text"
+
+    (first_name, first), *rest = frames
+    expected = {col: kind(dtype) for col, dtype in first.dtypes.items()}
+    for name, df in rest:
+        if list(df.columns) != list(first.columns):
+            missing = set(first.columns) - set(df.columns)
+            extra = set(df.columns) - set(first.columns)
+            raise ValueError(
+                f"Schema mismatch in '{name}' (vs '{first_name}'): "
+                f"missing {sorted(map(str, missing))}, extra {sorted(map(str, extra))}"
+            )
+        for col, dtype in df.dtypes.items():
+            if expected[col] != kind(dtype) and df[col].notna().any():
+                raise ValueError(
+                    f"Schema mismatch in '{name}': column '{col}' is {dtype}, expected {expected[col]}"
+                )
+
+def load_many(sources, max_workers=None, chunksize=None):
+    """
+    Parses several files across a process pool, checks that their schemas match
+    and concatenates them. sources is a list of (name, path or bytes).
+    Returns the combined DataFrame and a per-file timing report.
+    """
+    # A list, not a dict by name: partitions may share a file name
+    frames, timings = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_load_partition, source, chunksize) for source in sources]
+        for future in futures:
+            name, df, seconds = future.result()
+            frames.append((name, df))
+            timings.append({"File": name, "Rows": len(df), "Columns": df.shape[1], "Seconds": round(seconds, 3)})
+
+    if not frames:
+        raise Exception("No files to load.")
+    check_schemas(frames)
+    ignore_index = all(isinstance(df.index, pd.RangeIndex) for _, df in frames)
+    df = _concat_chunks([df for _, df in frames], ignore_index=ignore_index)
+    frames.clear()
+    report = pd.DataFrame(timings).sort_values("Seconds", ascending=False, ignore_index=True)
+    return df, report
+
+def expand_glob(pattern, root=DATA_DIR):
+    """
+    Files matched by a glob pattern inside root, as (path relative to root,
+    path) so files with the same name in different directories stay apart.
+    Matches that resolve outside root (e.g. through "..") are skipped.
+    """
+    root = os.path.realpath(root)
+    paths = sorted(glob.glob(os.path.join(root, pattern), recursive=True))
+    return [
+        (os.path.relpath(p, root), p) for p in paths
+        if os.path.isfile(p) and p.endswith(SUPPORTED_EXTENSIONS)
+        and os.path.commonpath([root, os.path.realpath(p)]) == root
+    ]
+
 # --- Streamlit Interface ---
+def _upload_hash(uploaded_file):
+    # Hashed once per upload, not on every rerun
+    hashes = st.session_state.setdefault("_upload_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = load_cache.content_hash(uploaded_file)
+    return hashes[uploaded_file.file_id]
+
+def sqlite_picker(uploaded_file, chunksize, make_progress, cached_load):
+    """
+    Table picker for an uploaded SQLite file. The file is kept in the session's
+    temp directory so it survives reruns, named by its content hash (an edited
+    database of the same size is a new copy); returns a DataFrame once loaded.
+    """
+    content_key = _upload_hash(uploaded_file)
+    path = session_store.session_path(f"upload_{content_key}.db")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, f)
+
+    tables = list_sqlite_tables(path)
+    if tables.empty:
+        st.warning("No tables found in the database.")
+        return None
+    st.dataframe(tables)
+
+    table = st.selectbox("Table", tables["Table"])
+    all_columns = sqlite_columns(path, table)
+    columns = st.multiselect("Columns (empty = all)", all_columns)
+    where = st.text_input("WHERE filter (optional)", placeholder="price > 100000 AND bedrooms >= 3")
+
+    if st.button("Load Table"):
+        options = {"source": "sqlite", "table": table, "columns": columns, "where": where}
+        df = cached_load(uploaded_file, options, lambda: set_datetime_index(read_sqlite_table(
+            path, table, columns or None, where, chunksize or DEFAULT_CHUNKSIZE, make_progress())), content_key)
+        st.success(f"✅ Table '{table}' loaded: {len(df):,} rows.")
+        st.dataframe(df)
+        return df
+    return None
+
+def excel_picker(uploaded_file, cached_load):
+    """
+    Engine and sheet selection for an uploaded workbook.
+    """
+    engine = st.selectbox("Excel engine", excel_engines(),
+                          help="calamine is much faster on large workbooks (pip install python-calamine)")
+    sheets = excel_sheet_names(uploaded_file, engine)
+    options = sheets + ["All sheets"] if len(sheets) > 1 else sheets
+    sheet = st.selectbox("Sheet", options)
+
+    if st.button("Load Sheet"):
+        options = {"source": "excel", "sheet": sheet}
+        df = cached_load(uploaded_file, options, lambda: set_datetime_index(
+            read_excel_sheets(uploaded_file, None if sheet == "All sheets" else sheet, engine)))
+        st.success(f"✅ {uploaded_file.name} ({sheet}) loaded: {len(df):,} rows.")
+        st.dataframe(df)
+        return df
+    return None
+
+def arrow_picker(uploaded_file):
+    """
+    Column and row group projection for Parquet/Feather/Arrow files. Only the
+    file footer is read until the user loads a selection.
+    """
+    info = inspect_arrow_file(uploaded_file)
+    st.write(f"**Rows:** {info['rows']:,}  \n**Columns:** {len(info['columns'])}  \n"
+             f"**Row groups:** {info['row_groups']}")
+
+    columns = st.multiselect("Columns (empty = all)", info["columns"])
+    row_groups = None
+    if info["row_groups"] > 1:
+        selected = st.multiselect("Row groups (empty = all)", list(range(info["row_groups"])))
+        row_groups = selected or None
+
+    if st.button("Load Selection"):
+        df = read_arrow_file(uploaded_file, columns or None, row_groups)
+        df = set_datetime_index(df)
+        st.success(f"✅ {uploaded_file.name} loaded: {len(df):,} rows.")
+        st.dataframe(df.head(1000))
+        return df
+    return None
+
 def run():
     st.subheader("📂 Data Loading")
 
     df = None
 
+    # ------------------ Loading Options ------------------
+    streaming = st.checkbox("⚡ Streaming mode (chunked reading for large CSV files)", value=False)
+    chunksize = None
+    if streaming:
+        chunksize = int(st.number_input("Rows per chunk", min_value=10_000, value=DEFAULT_CHUNKSIZE, step=10_000))
+
+    def make_progress():
+        if chunksize is None:
+            return None
+        bar = st.progress(0.0, text="Reading file...")
+        return lambda fraction, rows: bar.progress(fraction, text=f"Read {rows:,} rows")
+
+    optimize = st.checkbox("🧬 Optimize memory after load (downcast numbers, categorical/Arrow strings)", value=True)
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        use_cache = st.checkbox("♻️ Use load cache (re-opening the same file skips parsing)", value=True)
+    with col2:
+        entries, size = load_cache.stats()
+        if st.button(f"🗑️ Clear cache ({entries} files, {size / 1024 ** 2:,.0f} MB)"):
+            load_cache.clear()
+            st.rerun()
+
+    def cached_load(file, options, load_fn, content_key=None):
+        if not use_cache:
+            return load_fn()
+        options = {**options, "name": file.name.split(".")[-1], "streaming": chunksize is not None}
+        df, hit = load_cache.cached_load(file, options, load_fn, content_key)
+        if hit:
+            st.caption("♻️ Loaded from cache.")
+        return df
+
     # ------------------ Upload File ------------------
     with st.expander("📁 Upload External File", expanded=True):
-        uploaded_file = st.file_uploader("Upload data file", type=["csv", "xlsx", "json"])
-        if uploaded_file is not None:
+        uploaded_file = st.file_uploader("Upload data file", type=["csv", "xlsx", "json", "db", *ARROW_TYPES])
+        if uploaded_file is not None and uploaded_file.name.endswith(".db"):
             try:
-                df = load_file(uploaded_file)
+                df = sqlite_picker(uploaded_file, chunksize, make_progress, cached_load)
+            except Exception as e:
+                st.error(f"Error reading database: {e}")
+        elif uploaded_file is not None and uploaded_file.name.endswith(".xlsx"):
+            try:
+                df = excel_picker(uploaded_file, cached_load)
+            except Exception as e:
+                st.error(f"Error reading workbook: {e}")
+        elif uploaded_file is not None and uploaded_file.name.endswith(ARROW_TYPES):
+            try:
+                df = arrow_picker(uploaded_file)
+            except Exception as e:
+                st.error(f"Error reading file: {e}")
+        elif uploaded_file is not None:
+            try:
+                content_key = _upload_hash(uploaded_file)
+                df = cached_load(uploaded_file, {"source": "file"},
+                                 lambda: load_file(uploaded_file, chunksize, make_progress(), content_key), content_key)
                 st.success("✅ File uploaded successfully.")
                 st.dataframe(df)
             except Exception as e:
                 st.error(f"Error loading file: {e}")
 
+    # ------------------ Multiple Files ------------------
+    with st.expander("🗃️ Load Multiple Files (partitions)", expanded=False):
+        st.caption("All files must share the same columns; they are parsed in parallel and concatenated.")
+        uploaded_files = st.file_uploader(
+            "Upload partition files", type=["csv", "xlsx", "json", *ARROW_TYPES], accept_multiple_files=True
+        )
+        pattern = st.text_input(f"...or a glob pattern inside {DATA_DIR}/", placeholder="partitions/**/*.csv")
+        workers = int(st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1,
+                                      value=os.cpu_count() or 1))
+        if st.button("Load Files"):
+            sources = [(f.name, f.getvalue()) for f in uploaded_files or []]
+            if pattern:
+                sources += expand_glob(pattern)
+            if not sources:
+                st.warning("No files selected or matched by the pattern.")
+            else:
+                try:
+                    df, report = load_many(sources, max_workers=workers, chunksize=chunksize)
+                    st.success(f"✅ {len(sources)} files loaded, {len(df):,} rows in total.")
+                    st.write("⏱️ Per-file parse time (slowest first):")
+                    st.dataframe(report)
+                    st.dataframe(df.head(100))
+                except Exception as e:
+                    st.error(f"Error loading files: {e}")
+
     # ------------------ Sample Dataset ------------------
     with st.expander("📊 Use Sample Dataset", expanded=True):
-        datasets_path = "datasets"
+        datasets_path = DATA_DIR
         if not os.path.exists(datasets_path):
             st.error("⚠️ 'datasets' folder not found.")
         else:
-            dataset_files = [f for f in os.listdir(datasets_path) if f.endswith((".csv", ".xlsx", ".json"))]
+            dataset_files = [f for f in os.listdir(datasets_path) if f.endswith(SUPPORTED_EXTENSIONS)]
             if dataset_files:
                 selected_dataset = st.selectbox("Select a sample dataset", dataset_files)
                 if st.button("Load Sample Data"):
                     try:
                         file_path = os.path.join(datasets_path, selected_dataset)
                         with open(file_path, "rb") as f:
-                            class UploadedFileMock:
-                                def __init__(self, file):
-                                    self.file = file
-                                    self.name = selected_dataset
-                                def read(self, n=-1):
-                                    return self.file.read(n)
-                                def seek(self, pos):
-                                    self.file.seek(pos)
-                                def getvalue(self):
-                                    self.file.seek(0)
-                                    return self.file.read()
-                            uploaded_mock = UploadedFileMock(f)
-                            df = load_file(uploaded_mock)
+                            sample_file = LocalFile(f, selected_dataset)
+                            content_key = load_cache.content_hash(sample_file)
+                            df = cached_load(sample_file, {"source": "file"},
+                                             lambda: load_file(sample_file, chunksize, make_progress(), content_key),
+                                             content_key)
                         st.success(f"✅ {selected_dataset} loaded successfully.")
                         st.dataframe(df)
                     except Exception as e:
@@ -130,9 +1192,15 @@ def run():
 
     # ------------------ Session State ------------------
     if df is not None:
-        st.session_state["data"] = df
+        if optimize:
+            df, report = optimize_dtypes(df)
+            saved = report["Saved MB"].sum()
+            with st.expander(f"🧬 Memory optimization: {saved:,.2f} MB saved", expanded=False):
+                st.dataframe(report)
+        session_store.set_data(df)
+        session_store.reset_pipeline()  # recorded steps start from the loaded file
     elif "data" in st.session_state:
         st.info("Displaying previously loaded data:")
-        st.dataframe(st.session_state["data"])
+        st.dataframe(encoding.to_dense(st.session_state["data"]))
     else:
         st.warning("No data loaded yet.")
@@ -2,6 +2,7 @@
 
 import streamlit as st
 import pandas as pd
+from modules import session_store, pipeline, encoding
 
 def run():
     st.subheader("🔗 Data Merging")
@@ -12,13 +13,15 @@ def run():
 
     df1 = st.session_state["data"]
     st.write("📄 Main Data:")
-    st.dataframe(df1.head())
+    st.dataframe(encoding.to_dense(df1.head()))
 
     st.write("### ➕ Upload Second Dataset")
     file = st.file_uploader("Choose a CSV file", type=["csv"])
 
     if file:
         df2 = pd.read_csv(file)
+        # Kept for replaying the recorded merge step in this session
+        pipeline.remember_source(file.name, df2)
         st.write("📄 Second Dataset Loaded:")
         st.dataframe(df2.head())
 
@@ -29,9 +32,11 @@ def run():
 
         if st.button("Merge Data"):
             try:
-                merged_df = pd.merge(df1, df2, how=merge_type, left_on=ortak_sutun1, right_on=ortak_sutun2)
-                st.session_state["data"] = merged_df
+                step = pipeline.make_step("merge", source=file.name, how=merge_type,
+                                          left_on=ortak_sutun1, right_on=ortak_sutun2)
+                merged_df = pipeline.run_pipeline(df1, [step], sources={file.name: df2})
+                session_store.set_data(merged_df, steps=[step])
                 st.success("Data merged successfully!")
-                st.dataframe(merged_df)
+                st.dataframe(encoding.to_dense(merged_df))
             except Exception as e:
                 st.error(f"Error occurred: {e}")
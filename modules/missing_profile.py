@@ -0,0 +1,146 @@
+# modules/missing_profile.py
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from modules import session_store
+from modules.staging import StagedFrame
+
+# --- Missing-value profile ---
+# Null counts and null masks (packed bitmaps, 1 bit per row) of a StagedFrame,
+# cached across Streamlit reruns. The profile is only refreshed when the
+# stage's revision changes, and then only for the columns whose data changed:
+# a replaced column is rescanned, while a row filter reuses the bitmaps of
+# the untouched base columns instead of calling isnull() again.
+# The main DataFrame's profile is keyed by the session's data version.
+
+class MissingProfile:
+    def __init__(self, stage):
+        self.stage = stage
+        self.revision = None
+        self.base = None
+        self.base_bits = {}   # column -> packed null mask of the (unfiltered) base column
+        self.columns = {}     # column -> {"source", "rows", "bits", "count"}
+        self._patterns = None
+        self._co_missing = None
+
+    def _base_mask(self, name):
+        if self.base is not self.stage.base:
+            self.base, self.base_bits = self.stage.base, {}
+        bits = self.base_bits.get(name)
+        if bits is None:
+            bits = np.packbits(self.stage.base[name].isna().to_numpy())
+            self.base_bits[name] = bits
+        return np.unpackbits(bits, count=len(self.stage.base)).view(bool)
+
+    def refresh(self):
+        """
+        Brings the profile up to date with the stage; cheap when nothing changed.
+        """
+        stage = self.stage
+        if self.revision == stage.revision and self.base is stage.base:
+            return self
+        columns = {}
+        for name in stage.columns:
+            source = stage.changed.get(name)
+            rows = None if source is not None else stage.rows
+            entry = self.columns.get(name)
+            if entry is not None and entry["source"] is (source if source is not None else stage.base) \
+                    and entry["rows"] is rows:
+                columns[name] = entry
+                continue
+            if source is not None:
+                mask = source.isna().to_numpy()
+            else:
+                mask = self._base_mask(name)
+                if rows is not None:
+                    mask = mask[rows]
+            columns[name] = {
+                "source": source if source is not None else stage.base,
+                "rows": rows,
+                "bits": np.packbits(mask),
+                "count": int(np.count_nonzero(mask))
+            }
+        self.columns = columns
+        self.revision = stage.revision
+        self.base = stage.base
+        self._patterns = self._co_missing = None
+        return self
+
+    # --- Queries ---
+    def null_counts(self):
+        return pd.Series({name: entry["count"] for name, entry in self.columns.items()}, dtype="int64")
+
+    def count(self, name):
+        return self.columns[name]["count"] if name in self.columns else 0
+
+    def mask(self, name):
+        return np.unpackbits(self.columns[name]["bits"], count=len(self.stage)).view(bool)
+
+    def co_missing(self):
+        """
+        Rows missing in both columns, for every pair of columns with missing values
+        (popcount of the AND of their bitmaps). Cached until the next refresh
+        that finds changes, like patterns().
+        """
+        if self._co_missing is None:
+            names = [name for name, entry in self.columns.items() if entry["count"]]
+            counts = np.zeros((len(names), len(names)), dtype="int64")
+            for i, a in enumerate(names):
+                for j in range(i, len(names)):
+                    both = np.bitwise_and(self.columns[a]["bits"], self.columns[names[j]]["bits"])
+                    counts[i, j] = counts[j, i] = int(np.bitwise_count(both).sum())
+            self._co_missing = pd.DataFrame(counts, index=names, columns=names)
+        return self._co_missing
+
+    def patterns(self, top=10):
+        """
+        Most frequent combinations of missing columns among incomplete rows.
+        """
+        if self._patterns is None:
+            names = [name for name, entry in self.columns.items() if entry["count"]]
+            if not names:
+                self._patterns = pd.DataFrame(columns=["Missing Columns", "Rows"])
+            else:
+                # One packed code per row (its bits across the columns), counted as a 1D key
+                matrix = np.column_stack([self.mask(name) for name in names])
+                packed = np.packbits(matrix[matrix.any(axis=1)], axis=1)
+                width = packed.shape[1]
+                if width <= 8:
+                    codes = np.pad(packed, ((0, 0), (0, 8 - width))).view(np.uint64).ravel()
+                else:
+                    codes = np.ascontiguousarray(packed).view(np.dtype((np.void, width))).ravel()
+                codes, first, counts = np.unique(codes, return_index=True, return_counts=True)
+                order = np.argsort(-counts, kind="stable")
+                combos = np.unpackbits(packed[first[order]], axis=1, count=len(names)).view(bool)
+                self._patterns = pd.DataFrame({
+                    "Missing Columns": [", ".join(np.array(names)[combo]) for combo in combos],
+                    "Rows": counts[order]
+                })
+        return self._patterns.head(top)
+
+# --- Session helpers ---
+def profile_for(key, stage):
+    """
+    Returns the up-to-date profile of a page's stage (see staging.get_stage).
+    """
+    profile_key = f"{key}_missing"
+    profile = st.session_state.get(profile_key)
+    if profile is None or profile.stage is not stage:
+        profile = MissingProfile(stage)
+        if stage.base_version == session_store.data_version() and session_store.has_data():
+            # The stage's base shares its columns with the main DataFrame: reuse its bitmaps
+            profile.base, profile.base_bits = stage.base, dict(for_data().base_bits)
+        st.session_state[profile_key] = profile
+    return profile.refresh()
+
+def for_data():
+    """
+    Profile of the main DataFrame, recomputed only when its data version changes.
+    """
+    cached = st.session_state.get("_missing_profile")
+    version = session_store.data_version()
+    if cached is None or cached[0] != version:
+        cached = (version, MissingProfile(StagedFrame(st.session_state["data"], version)))
+        st.session_state["_missing_profile"] = cached
+    return cached[1].refresh()
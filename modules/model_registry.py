@@ -0,0 +1,100 @@
+# modules/model_registry.py
+
+import os
+import re
+import time
+import joblib
+import streamlit as st
+from modules import pipeline, loader, exporter
+
+# --- Fitted transformer registry ---
+# Every encoder / scaler applied on the transformation page is kept with its
+# fitted state (see pipeline.FITTED_OPS) in a session registry, and can be
+# saved to / loaded from models/ with joblib. A fitted transformer replays as
+# a transform-only pipeline step, so it can:
+# - re-apply to the current data without refitting on the full frame;
+# - encode new files chunk by chunk, exactly like the data it was fitted on.
+
+MODELS_DIR = "models"
+MODEL_EXTENSION = ".joblib"
+
+class FittedTransformer:
+    def __init__(self, op, params, fitted):
+        if op not in pipeline.FITTED_OPS:
+            raise ValueError(f"'{op}' has no fitted state.")
+        self.op = op
+        self.params = {key: value for key, value in params.items() if key != "fitted"}
+        self.fitted = fitted
+        self.created = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    @property
+    def columns(self):
+        return self.params.get("columns") or [self.params["column"]]
+
+    @property
+    def name(self):
+        return f"{self.op}: {', '.join(map(str, self.columns))}"
+
+    def step(self):
+        """
+        Transform-only pipeline step of this transformer.
+        """
+        return {"op": self.op, "params": {**self.params, "fitted": self.fitted}}
+
+    def transform(self, df):
+        return pipeline.run_pipeline(df, [self.step()])
+
+def fit(stage, op, **params):
+    """
+    Applies an encoding / scaling op to the stage (recorded like pipeline.apply)
+    and registers the fitted transformer.
+    """
+    transformer = FittedTransformer(op, params, pipeline.apply(stage, op, **params))
+    register(transformer)
+    return transformer
+
+def transform_chunks(chunks, transformers):
+    """
+    Applies the fitted transformers, in order, to every chunk; no refitting.
+    """
+    return pipeline.run_chunks(chunks, [t.step() for t in transformers])
+
+def transform_file(path, transformers, out_path, fmt="csv", chunksize=loader.DEFAULT_CHUNKSIZE):
+    """
+    Transforms a local file of any supported format into out_path without
+    loading it whole. Returns the output path and the number of rows.
+    """
+    return exporter.export_chunks(transform_chunks(loader.iter_path_chunks(path, chunksize), transformers), out_path, fmt)
+
+# --- Persistence ---
+def _file_name(name):
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") + MODEL_EXTENSION
+
+def save(transformer, directory=MODELS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, _file_name(transformer.name))
+    joblib.dump(transformer, path)
+    return path
+
+def load(path):
+    # joblib files are pickles: only load ones saved from this app
+    transformer = joblib.load(path)
+    if not isinstance(transformer, FittedTransformer):
+        raise ValueError(f"{path} is not a fitted transformer.")
+    return transformer
+
+def saved_files(directory=MODELS_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f for f in os.listdir(directory) if f.endswith(MODEL_EXTENSION))
+
+# --- Session helpers ---
+def registry():
+    """
+    Fitted transformers of this session by name; refitting the same op on the
+    same columns replaces the entry.
+    """
+    return st.session_state.setdefault("model_registry", {})
+
+def register(transformer):
+    registry()[transformer.name] = transformer
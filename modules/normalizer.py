@@ -2,6 +2,7 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from modules import session_store, encoding
 
 def run():
     st.subheader("🔹 Data Filtering and Selection (Temporary or Save to Session)")
@@ -12,10 +13,11 @@ def run():
 
     # Backup main DF on first load
     if "data_original" not in st.session_state:
-        st.session_state["data_original"] = st.session_state["data"].copy()
+        st.session_state["data_original"] = session_store.get_data()
+        st.session_state["pipeline_original"] = session_store.pipeline_steps()
 
     original_df = st.session_state["data_original"]  # Backup DF
-    df = original_df.copy()
+    df = original_df.copy(deep=False)
 
     # Temp storage
     if "num_filters_temp" not in st.session_state:
@@ -38,7 +40,7 @@ def run():
             st.session_state["num_filters_temp"][col] = selected_range
 
     st.write("### ➕ Make Selection for Categorical Columns")
-    cat_cols = [c for c in df.select_dtypes(include="object").columns if df[c].nunique() <= 20]
+    cat_cols = [c for c in df.select_dtypes(include=["object", "category", "string"]).columns if df[c].nunique() <= 20]
     for col in cat_cols:
         options = df[col].unique().tolist()
         default_vals = st.session_state["cat_filters_temp"].get(col, options)
@@ -49,7 +51,7 @@ def run():
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Save to Query Area"):
-            filtered_df = df.copy()
+            filtered_df = df.copy(deep=False)
             # Numerical filter
             for col, (min_val, max_val) in num_filters.items():
                 filtered_df = filtered_df[(filtered_df[col] >= min_val) & (filtered_df[col] <= max_val)]
@@ -58,12 +60,12 @@ def run():
                 filtered_df = filtered_df[filtered_df[col].isin(selected_vals)]
 
             st.success(f"Temporary DF ready. {len(filtered_df)} rows found.")
-            st.dataframe(filtered_df)
+            st.dataframe(encoding.to_dense(filtered_df))
             st.session_state["temp_filtered"] = filtered_df  # Can be used within this function
 
     with col2:
         if st.button("Save to Main Project"):
-            filtered_df = df.copy()
+            filtered_df = df.copy(deep=False)
             for col, (min_val, max_val) in num_filters.items():
                 filtered_df = filtered_df[(filtered_df[col] >= min_val) & (filtered_df[col] <= max_val)]
             for col, selected_vals in cat_filters.items():
@@ -86,8 +88,9 @@ def run():
         if "data_filtered" in st.session_state:
             del st.session_state["data_filtered"]
 
-        # Revert main DF to original backup DF
-        st.session_state["data"] = st.session_state["data_original"].copy()
+        # Revert main DF to original backup DF, and the recorded steps with it
+        session_store.set_data(st.session_state["data_original"])
+        session_store.reset_pipeline(st.session_state.get("pipeline_original", []))
 
         st.success("Selections reset, DF reverted to original state.")
         st.rerun()
@@ -3,9 +3,20 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-from sklearn.impute import KNNImputer
-from sklearn.cluster import DBSCAN
-from scipy import stats
+from modules import staging, history, pipeline, outliers, loader, session_store, encoding
+from modules.outlier_model import OutlierModel, SCORING_METHODS
+
+def _cached(slot, stage, key, compute):
+    """
+    Result of compute(), kept in session state until the stage, its revision
+    or key (columns, method, parameters) changes.
+    """
+    key = (stage.revision, key)
+    cached = st.session_state.get(slot)
+    if cached is None or cached[0] is not stage or cached[1] != key:
+        cached = (stage, key, compute())
+        st.session_state[slot] = cached
+    return cached[2]
 
 def run():
     st.subheader("🚨 Outlier Handling")
@@ -14,17 +25,14 @@ def run():
         st.warning("Please load data first.")
         return
 
-    df = st.session_state["data"]
-
     # --- Temp State for Persistence ---
-    # Create a temporary dataframe in session state to hold changes before saving
-    if "outlier_temp_df" not in st.session_state:
-        st.session_state["outlier_temp_df"] = df.copy()
-    
-    df_temp = st.session_state["outlier_temp_df"]
+    # Pending changes are staged as column/row deltas on top of the main data
+    stage = staging.get_stage("outlier_stage")
+    stage_history = history.get_history("outlier_stage", stage)
+    df_temp = stage.frame()
 
     st.write("📊 Current Data (Temporary View):")
-    st.dataframe(df_temp.head())
+    st.dataframe(encoding.to_dense(df_temp.head()))
 
     # Numeric column selection
     numeric_columns = df_temp.select_dtypes(include=[np.number]).columns.tolist()
@@ -34,80 +42,82 @@ def run():
 
     column = st.selectbox("Select numeric column", numeric_columns)
 
-    # Tabs
-    tab1, tab2, tab3 = st.tabs([
-        "Outlier Analysis with IQR",
-        "Outlier Analysis with Z-Score",
-        "Outlier Analysis with DBSCAN"
-    ])
-
-    # Initialize variables to avoid 'undefined' errors
-    outliers_iqr = pd.DataFrame()
-    outliers_z = pd.DataFrame()
-    outliers_db = pd.DataFrame()
-
-    # -------------------- IQR --------------------
-    with tab1:
-        Q1 = df_temp[column].quantile(0.25)
-        Q3 = df_temp[column].quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-
-        outliers_iqr = df_temp[(df_temp[column] < lower_bound) | (df_temp[column] > upper_bound)]
-        st.write("### Outliers (IQR):")
-        st.dataframe(outliers_iqr)
-
-    # -------------------- Z-SCORE --------------------
-    with tab2:
-        # Handling NaNs for Z-score calculation
-        col_data = df_temp[column].dropna()
-        if not col_data.empty:
-            z_scores = np.abs(stats.zscore(col_data))
-            threshold = 3
-            # Filter based on index
-            outlier_indices = col_data[z_scores > threshold].index
-            outliers_z = df_temp.loc[outlier_indices]
-            st.write("### Outliers (Z-Score):")
-            st.dataframe(outliers_z)
+    # Only the selected detector runs on a rerun (tabs would compute every method)
+    method = st.radio("Detection Method", outliers.METHODS, horizontal=True, key="outlier_method")
+
+    # Detector parameters are recorded with the pipeline step, so replay re-detects on new data
+    features = []
+    if method == "IQR":
+        detector = {}
+    elif method == "Z-Score":
+        detector = {"threshold": 3}
+    else:
+        # Density and model-based methods can also use other numeric columns as features
+        features = st.multiselect(
+            "Additional feature columns", [c for c in numeric_columns if c != column], key="outlier_features"
+        )
+        if method == "DBSCAN":
+            eps_val = st.slider("eps (neighborhood distance)", 0.1, 10.0, 1.5)
+            min_samples_val = st.slider("min_samples", 1, 20, 5)
+            detector = {"eps": eps_val, "min_samples": min_samples_val}
+        elif method == "Isolation Forest":
+            contamination = st.select_slider("Contamination", ["auto", 0.001, 0.01, 0.05, 0.1], value=0.01)
+            detector = {"contamination": contamination}
         else:
-            st.info("Column is empty or contains only NaNs.")
+            n_neighbors = st.slider("n_neighbors", 5, 50, 20)
+            max_samples = st.number_input("Fit on at most N rows (subsample)", 1000, 1000000, 10000, step=1000)
+            detector = {"n_neighbors": n_neighbors, "max_samples": int(max_samples)}
+        if features:
+            detector["features"] = features
+
+    # Masks are positional, so duplicate index labels can't hit the wrong rows
+    target_mask = np.zeros(len(df_temp), dtype=bool)
+
+    if method in outliers.BATCH_METHODS:
+        # All numeric columns in one vectorized pass, cached until the stage changes
+        mask_matrix, counts = _cached(
+            "outlier_batch", stage, (tuple(numeric_columns), method, tuple(detector.items())),
+            lambda: outliers.outlier_matrix(df_temp[numeric_columns], method, **detector)
+        )
+        target_mask = mask_matrix[:, numeric_columns.index(column)]
 
-    # -------------------- DBSCAN --------------------
-    with tab3:
-        eps_val = st.slider("eps (neighborhood distance)", 0.1, 10.0, 1.5)
-        min_samples_val = st.slider("min_samples", 1, 20, 5)
+        with st.expander(f"📋 {method} outliers in all numeric columns"):
+            st.dataframe(pd.DataFrame({
+                "Column": counts.index,
+                "Outliers": counts.values,
+                "Outliers %": (counts.values / max(len(df_temp), 1) * 100).round(2)
+            }))
 
+    else:
+        data_cols = [column, *features]
         # Missing value check
-        if df_temp[column].isnull().any():
-            st.error("⚠️ Missing values found in this column! DBSCAN does not work with NaN values.")
+        if df_temp[data_cols].isnull().any().any():
+            st.error(f"⚠️ Missing values found in the selected columns! {method} does not work with NaN values.")
             if st.button("🧼 Go to Missing Data Handling"):
                 st.session_state.page_selected = "Missing Data Handling"
                 st.rerun()
+        elif method == "DBSCAN":
+            # The neighbour index is built once; moving the sliders only re-thresholds it
+            index = _cached("outlier_density", stage, tuple(data_cols),
+                            lambda: outliers.DensityIndex(df_temp[data_cols], max_samples=20))
+            target_mask = index.noise(eps_val, min_samples_val)
         else:
-            db = DBSCAN(eps=eps_val, min_samples=min_samples_val).fit(df_temp[[column]])
-            labels = pd.Series(db.labels_, index=df_temp.index)
-            outliers_db = df_temp.loc[labels[labels == -1].index]
+            params = {k: v for k, v in detector.items() if k != "features"}
+            target_mask = _cached(
+                "outlier_model", stage, (tuple(data_cols), method, tuple(params.items())),
+                lambda: outliers.outlier_mask(df_temp[data_cols], method, **params)
+            )
 
-            st.write("### Outliers (DBSCAN):")
-            st.dataframe(outliers_db)
+    if method in outliers.BATCH_METHODS or target_mask.any():
+        st.write(f"### Outliers ({method}):")
+        st.dataframe(encoding.to_dense(df_temp[target_mask]))
 
     # -------------------- Operation Options --------------------
     st.markdown("---")
     st.write("### 🔹 Handle Outliers")
-    
-    # User must select which method's outliers to target
-    method = st.selectbox("Select Method to Target Outliers", ["IQR", "Z-Score", "DBSCAN"])
-    
-    if method == "IQR":
-        target_outliers = outliers_iqr
-    elif method == "Z-Score":
-        target_outliers = outliers_z
-    else:
-        target_outliers = outliers_db
 
-    if not target_outliers.empty:
-        st.write(f"**{len(target_outliers)}** outliers detected using **{method}**.")
+    if target_mask.any():
+        st.write(f"**{int(target_mask.sum())}** outliers detected using **{method}**.")
         
         action = st.selectbox(
             "Action Type",
@@ -117,77 +127,116 @@ def run():
         # Drop Action
         if action == "Drop":
             if st.button("Drop Outliers"):
-                st.session_state["outlier_temp_df"] = df_temp.drop(target_outliers.index)
+                with stage_history.step(f"Drop {method} outliers in {column}"):
+                    pipeline.apply(stage, "drop_outliers", column=column, method=method, **detector)
                 st.success("Outliers dropped temporarily ✅")
                 st.rerun()
 
         # Fill Action
         elif action == "Fill (Missing Data Methods)":
-            doldurma_yontemi = st.selectbox("Select Filling Method",
-                ["ffill", "bfill", "Mean", "Median", "Mode", "Constant Value", "AI (KNNImputer)"]
-            )
+            doldurma_yontemi = st.selectbox("Select Filling Method", pipeline.FILL_METHODS)
+
+            # Outliers of the selected column are set to NaN first, then filled;
+            # only that column is written back to the stage
+            fill_step = dict(column=column, method=method, fill_method=doldurma_yontemi, **detector)
+            has_dt_index = isinstance(df_temp.index, pd.DatetimeIndex)
+            if doldurma_yontemi in pipeline.GROUP_METHODS:
+                fill_step["group_by"] = st.multiselect("Group by column(s)", [c for c in df_temp.columns if c != column])
+                if has_dt_index:
+                    donem = st.selectbox("Also group by time period", ["None", *pipeline.PERIODS])
+                    fill_step["period"] = None if donem == "None" else donem
+            elif doldurma_yontemi == "Interpolate":
+                fill_step["interpolation"] = st.selectbox(
+                    "Interpolation", ["linear", "time", "spline"] if has_dt_index else ["linear", "spline"]
+                )
+                if fill_step["interpolation"] == "spline":
+                    fill_step["order"] = st.number_input("Spline order", 1, 5, 3)
 
-            # Different filling methods
-            # We use a nested button structure via session state logic implied above
-            apply_fill = False
-            
             if doldurma_yontemi == "Constant Value":
                 sabit_deger = st.text_input("Enter constant value", key="txt_sabit")
                 if st.button("Fill with Constant Value", key="btn_fill_const"):
-                    df_temp.loc[target_outliers.index, column] = np.nan
-                    st.session_state["outlier_temp_df"] = df_temp.fillna(sabit_deger)
+                    with stage_history.step(f"Fill {column} outliers with constant"):
+                        pipeline.apply(stage, "fill_outliers", value=sabit_deger, **fill_step)
                     st.success("Filled with constant value temporarily ✅")
                     st.rerun()
             
-            elif doldurma_yontemi == "AI (KNNImputer)":
-                 if st.button("Fill with KNN", key="btn_fill_knn"):
-                    if len(numeric_columns) == 0:
-                        st.warning("KNNImputer works only on numeric columns ⚠️")
-                    else:
-                        df_temp.loc[target_outliers.index, column] = np.nan
-                        imputer = KNNImputer(n_neighbors=3)
-                        df_temp[numeric_columns] = imputer.fit_transform(df_temp[numeric_columns])
-                        st.session_state["outlier_temp_df"] = df_temp
-                        st.success("Filled with KNN Imputer temporarily ✅")
-                        st.rerun()
+            elif doldurma_yontemi in pipeline.MODEL_METHODS:
+                 if st.button(f"Fill with {doldurma_yontemi}", key="btn_fill_knn"):
+                    with stage_history.step(f"Fill {column} outliers with {doldurma_yontemi}"):
+                        pipeline.apply(stage, "fill_outliers", **fill_step)
+                    st.success(f"Filled with {doldurma_yontemi} temporarily ✅")
+                    st.rerun()
             
             else:
                 if st.button(f"Fill with {doldurma_yontemi}", key="btn_fill_generic"):
-                    # First set outliers to NaN
-                    df_temp.loc[target_outliers.index, column] = np.nan
-                    
-                    if doldurma_yontemi in ["ffill", "bfill"]:
-                        st.session_state["outlier_temp_df"] = df_temp.fillna(method=doldurma_yontemi)
-                    elif doldurma_yontemi == "Mean":
-                        df_temp[column].fillna(df_temp[column].mean(), inplace=True)
-                        st.session_state["outlier_temp_df"] = df_temp
-                    elif doldurma_yontemi == "Median":
-                        df_temp[column].fillna(df_temp[column].median(), inplace=True)
-                        st.session_state["outlier_temp_df"] = df_temp
-                    elif doldurma_yontemi == "Mode":
-                        mode_val = df_temp[column].mode()[0]
-                        df_temp[column].fillna(mode_val, inplace=True)
-                        st.session_state["outlier_temp_df"] = df_temp
-                    
-                    st.success(f"Filled with {doldurma_yontemi} temporarily ✅")
-                    st.rerun()
+                    try:
+                        with stage_history.step(f"Fill {column} outliers with {doldurma_yontemi}"):
+                            pipeline.apply(stage, "fill_outliers", **fill_step)
+                        st.success(f"Filled with {doldurma_yontemi} temporarily ✅")
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(f"⚠️ {e}")
 
     else:
         st.info(f"No outliers found using {method}.")
 
+    # ------------------- Fitted Bounds -------------------
+    # IQR / z-score bounds fitted once, saved, and applied to new files chunk by chunk
+    with st.expander("💾 Fitted Outlier Bounds (reuse on new data)"):
+        if st.button("Fit on current data", key="btn_fit_bounds"):
+            st.session_state["outlier_bounds_model"] = OutlierModel().fit(df_temp[numeric_columns])
+            st.success("Bounds fitted ✅")
+
+        model_file = st.file_uploader("Or load a saved model", type=["json"], key="outlier_model_file")
+        if model_file is not None and st.button("Load Model", key="btn_load_bounds"):
+            try:
+                st.session_state["outlier_bounds_model"] = OutlierModel.from_json(model_file.getvalue())
+                st.success("Model loaded ✅")
+            except ValueError as e:
+                st.error(f"⚠️ {e}")
+
+        model = st.session_state.get("outlier_bounds_model")
+        if model is not None:
+            bounds_method = method if method in SCORING_METHODS else "IQR"
+            bounds_params = detector if method in SCORING_METHODS else {}
+            st.write(f"**{bounds_method}** bounds:")
+            st.dataframe(model.bounds(bounds_method, **bounds_params))
+            st.download_button("📥 Download Model (.json)", model.to_json(), "outlier_model.json", "application/json")
+
+            st.write("Score new data without loading it (chunk by chunk):")
+            new_file = st.file_uploader(
+                "Upload a file", type=["csv", "xlsx", "json", *loader.ARROW_TYPES], key="outlier_score_file"
+            )
+            new_path = st.text_input(f"…or a file in {loader.DATA_DIR}/ on the server", key="outlier_score_path")
+            if st.button("Score File", key="btn_score_file", disabled=new_file is None and not new_path):
+                flagged_path = session_store.session_path("flagged_outliers.csv")
+                try:
+                    chunks = loader.iter_chunks(new_file) if new_file is not None else loader.iter_path_chunks(loader.data_path(new_path))
+                    counts, rows = model.score_chunks(chunks, bounds_method, flagged_path, **bounds_params)
+                except (OSError, ValueError) as e:
+                    st.error(f"⚠️ {e}")
+                else:
+                    st.success(f"{rows} rows scored ✅")
+                    st.dataframe(pd.DataFrame({"Column": counts.index, "Outliers": counts.values}))
+                    with open(flagged_path, "rb") as f:
+                        st.download_button("📥 Download Rows with Outliers (.csv)", f.read(), "flagged_outliers.csv", "text/csv")
+
     # ------------------- Save Session State -------------------
     st.markdown("---")
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("✅ Save to Session State"):
-            st.session_state["data"] = st.session_state["outlier_temp_df"]
-            # Reset temp to reflect saved state
-            del st.session_state["outlier_temp_df"]
+            # Commits the staged deltas and resets the temp state
+            staging.commit_stage("outlier_stage")
             st.success("Updated data saved to session_state.")
             st.rerun()
             
     with col2:
         if st.button("❌ Reset Changes"):
-            del st.session_state["outlier_temp_df"]
+            staging.reset_stage("outlier_stage")
             st.warning("All temporary changes reset.")
             st.rerun()
+
+    with col3:
+        if history.history_controls("outlier_stage", stage_history):
+            st.rerun()
@@ -0,0 +1,166 @@
+# modules/outlier_model.py
+
+import json
+import numpy as np
+import pandas as pd
+from modules import loader
+
+# --- Fitted outlier bounds ---
+# IQR and z-score bounds fitted once and reused on new data. Statistics are
+# collected in a single streaming pass with constant memory per column:
+# - count, mean and the sum of squared deviations (Welford / Chan's update,
+#   merged chunk by chunk), giving the population std that stats.zscore uses;
+# - a uniform reservoir sample (Algorithm R) of at most reservoir_size values
+#   for the quartiles; exact while a column has no more values than that.
+# The model is saved as JSON and scores any frame or file chunk by chunk.
+
+MODEL_VERSION = 1
+DEFAULT_RESERVOIR = 10_000
+SCORING_METHODS = ["IQR", "Z-Score"]
+
+class OutlierModel:
+    def __init__(self, reservoir_size=DEFAULT_RESERVOIR, random_state=0):
+        self.reservoir_size = reservoir_size
+        self.columns = {}   # column -> {"count", "mean", "m2", "min", "max", "reservoir"}
+        self._rng = np.random.default_rng(random_state)
+
+    # --- Fitting ---
+    def partial_fit(self, frame):
+        """
+        Adds the numeric columns of one chunk to the statistics.
+        """
+        for col in frame.select_dtypes(include="number").columns:
+            values = frame[col].to_numpy(dtype="float64", na_value=np.nan)
+            values = values[~np.isnan(values)]
+            entry = self.columns.setdefault(col, {
+                "count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf,
+                "reservoir": np.empty(0)
+            })
+            if values.size:
+                self._add_reservoir(entry, values)
+                self._add_moments(entry, values)
+        return self
+
+    def fit(self, frame, chunksize=loader.DEFAULT_CHUNKSIZE):
+        for start in range(0, len(frame), chunksize):
+            self.partial_fit(frame.iloc[start:start + chunksize])
+        return self
+
+    def fit_chunks(self, chunks):
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    @staticmethod
+    def _add_moments(entry, values):
+        n_a, n_b = entry["count"], values.size
+        mean_b = values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+        n = n_a + n_b
+        delta = mean_b - entry["mean"]
+        entry["mean"] += delta * n_b / n
+        entry["m2"] += m2_b + delta ** 2 * n_a * n_b / n
+        entry["count"] = n
+        entry["min"] = min(entry["min"], values.min())
+        entry["max"] = max(entry["max"], values.max())
+
+    def _add_reservoir(self, entry, values):
+        reservoir, seen = entry["reservoir"], entry["count"]
+        free = self.reservoir_size - reservoir.size
+        if free > 0:
+            reservoir = np.concatenate([reservoir, values[:free]])
+            seen += min(free, values.size)
+            values = values[free:]
+        if values.size:
+            # Item t (1-based) replaces a random slot with probability size / t
+            slots = self._rng.integers(0, seen + np.arange(1, values.size + 1))
+            keep = slots < self.reservoir_size
+            slots, values = slots[keep], values[keep]
+            # The last item written to a slot wins, as in the sequential algorithm
+            _, last = np.unique(slots[::-1], return_index=True)
+            last = slots.size - 1 - last
+            reservoir[slots[last]] = values[last]
+        entry["reservoir"] = reservoir
+
+    # --- Bounds and scoring ---
+    def bounds(self, method="IQR", k=1.5, threshold=3):
+        """
+        Lower / upper bound of every fitted column; values outside are outliers.
+        """
+        rows = {}
+        for col, entry in self.columns.items():
+            if not entry["count"]:
+                rows[col] = (np.nan, np.nan)
+            elif method == "IQR":
+                q1, q3 = np.quantile(entry["reservoir"], [0.25, 0.75])
+                rows[col] = (q1 - k * (q3 - q1), q3 + k * (q3 - q1))
+            elif method == "Z-Score":
+                mean, std = entry["mean"], np.sqrt(entry["m2"] / entry["count"])
+                rows[col] = (mean - threshold * std, mean + threshold * std)
+            else:
+                raise ValueError(f"Fitted bounds support {', '.join(SCORING_METHODS)}, not {method}.")
+        return pd.DataFrame.from_dict(rows, orient="index", columns=["Low", "High"])
+
+    def score(self, frame, method="IQR", **params):
+        """
+        Positional outlier matrix of the fitted columns present in frame, and
+        the count per column (see outliers.outlier_matrix).
+        """
+        columns = [col for col in self.columns if col in frame.columns]
+        bounds = self.bounds(method, **params).loc[columns]
+        X = frame[columns].to_numpy(dtype="float64", na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            mask = (X < bounds["Low"].to_numpy()) | (X > bounds["High"].to_numpy())
+        return mask, pd.Series(mask.sum(axis=0), index=columns, name="Outliers")
+
+    def score_chunks(self, chunks, method="IQR", flagged_path=None, **params):
+        """
+        Scores chunk by chunk with constant memory. Returns the outlier count per
+        column and the number of rows; rows with any outlier are appended to the
+        CSV at flagged_path, if given.
+        """
+        totals, rows, header = None, 0, True
+        for chunk in chunks:
+            mask, counts = self.score(chunk, method, **params)
+            totals = counts if totals is None else totals.add(counts, fill_value=0)
+            rows += len(chunk)
+            if flagged_path is not None:
+                chunk[mask.any(axis=1)].to_csv(flagged_path, mode="w" if header else "a", header=header, index=False)
+                header = False
+        if totals is None:
+            totals = pd.Series(0, index=list(self.columns), name="Outliers")
+        return totals.astype("int64"), rows
+
+    def summary(self):
+        return pd.DataFrame({
+            col: {"Count": entry["count"], "Mean": entry["mean"],
+                  "Std": np.sqrt(entry["m2"] / entry["count"]) if entry["count"] else np.nan,
+                  "Min": entry["min"], "Max": entry["max"]}
+            for col, entry in self.columns.items()
+        }).T
+
+    # --- Persistence ---
+    def to_json(self):
+        columns = {
+            col: {**{key: float(value) for key, value in entry.items() if key != "reservoir"},
+                  "reservoir": entry["reservoir"].tolist()}
+            for col, entry in self.columns.items()
+        }
+        return json.dumps({"version": MODEL_VERSION, "reservoir_size": self.reservoir_size, "columns": columns})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        if not isinstance(data, dict) or data.get("version") != MODEL_VERSION or "columns" not in data:
+            raise ValueError("Not an outlier model file.")
+        model = cls(reservoir_size=data["reservoir_size"])
+        for col, entry in data["columns"].items():
+            model.columns[col] = {**entry, "count": int(entry["count"]),
+                                  "reservoir": np.asarray(entry["reservoir"], dtype="float64")}
+        return model
+
+def score_file(model, path, method="IQR", chunksize=loader.DEFAULT_CHUNKSIZE, flagged_path=None, **params):
+    """
+    Scores a local file of any supported format without loading it whole.
+    """
+    return model.score_chunks(loader.iter_path_chunks(path, chunksize), method, flagged_path, **params)
@@ -0,0 +1,192 @@
+# modules/outliers.py
+
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.neighbors import NearestNeighbors, LocalOutlierFactor
+from sklearn.ensemble import IsolationForest
+
+# --- Outlier detection ---
+# Each detector returns a positional boolean mask (True = outlier), so duplicate
+# index labels can't hit the wrong rows. Shared by the outlier page and by
+# pipeline replay, which re-detects outliers on the new data.
+
+METHODS = ["IQR", "Z-Score", "DBSCAN", "Isolation Forest", "LOF"]
+BATCH_METHODS = ["IQR", "Z-Score"]   # vectorized over all numeric columns (see outlier_matrix)
+MULTIVARIATE_METHODS = ["DBSCAN", "Isolation Forest", "LOF"]   # accept several feature columns
+
+def iqr_mask(s, k=1.5):
+    Q1 = s.quantile(0.25)
+    Q3 = s.quantile(0.75)
+    IQR = Q3 - Q1
+    return ((s < Q1 - k * IQR) | (s > Q3 + k * IQR)).to_numpy()
+
+def zscore_mask(s, threshold=3):
+    if not s.notna().any():
+        return np.zeros(len(s), dtype=bool)
+    z_scores = np.abs(stats.zscore(s, nan_policy="omit"))
+    return np.asarray(z_scores > threshold, dtype=bool)
+
+def _feature_matrix(data, method):
+    """
+    Float matrix (rows x features) of a Series or DataFrame; NaN is rejected.
+    """
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    if frame.isnull().any().any():
+        raise ValueError(f"{method} does not work with NaN values.")
+    return frame.to_numpy(dtype="float64")
+
+# --- Density-based (DBSCAN noise) ---
+# DBSCAN's outliers are its noise points: points that are neither core points
+# (at least min_samples points, itself included, within eps) nor within eps of
+# a core point. DensityIndex finds them without clustering, and keeps its
+# neighbour structure so that moving the eps / min_samples sliders only
+# re-thresholds cached distances:
+# - one column: the sorted values; neighbour counts are two binary searches
+#   per point and the nearest core point one more, O(n log n);
+# - several columns: the distances and indices of each point's max_samples
+#   nearest neighbours from a KD/ball tree, queried once. A non-core point has
+#   fewer than min_samples neighbours within eps, so all of them are in its
+#   cached list and the border test needs no new query.
+
+class DensityIndex:
+    def __init__(self, data, max_samples=20):
+        X = _feature_matrix(data, "DBSCAN")
+        self.n_rows = len(X)
+        if X.shape[1] == 1:
+            self.order = np.argsort(X[:, 0], kind="stable")
+            self.sorted = X[self.order, 0]
+        else:
+            self.order = None
+            self.max_samples = min(max_samples, self.n_rows)
+            index = NearestNeighbors(n_neighbors=self.max_samples).fit(X)
+            # Querying with X itself counts every point as its own neighbour, as DBSCAN does
+            self.distances, neighbours = index.kneighbors(X)
+            self.neighbours = neighbours.astype(np.int32 if self.n_rows < 2 ** 31 else np.int64)
+
+    def noise(self, eps, min_samples):
+        if self.order is not None:
+            return self._noise_1d(eps, min_samples)
+        if min_samples > self.max_samples and min_samples <= self.n_rows:
+            raise ValueError(f"min_samples is limited to {self.max_samples} for this index.")
+        if min_samples > self.n_rows:
+            return np.ones(self.n_rows, dtype=bool)
+        within = self.distances <= eps
+        core = within[:, min_samples - 1]
+        border = (within[~core] & core[self.neighbours[~core]]).any(axis=1)
+        mask = ~core
+        mask[~core] = ~border
+        return mask
+
+    def _noise_1d(self, eps, min_samples):
+        # Work on the distinct values; neighbour counts come from cumulative counts
+        values, counts = np.unique(self.sorted, return_counts=True)
+        cumulative = np.concatenate([[0], np.cumsum(counts)])
+        hi = _boundary(values, np.searchsorted(values, values + eps, side="right"), eps, upper=True)
+        lo = _boundary(values, np.searchsorted(values, values - eps, side="left"), eps, upper=False)
+        core = cumulative[hi] - cumulative[lo] >= min_samples
+        noise = ~core
+        core_values = values[core]
+        if core_values.size:
+            # Distance to the nearest core value on either side
+            candidates = values[~core]
+            pos = np.searchsorted(core_values, candidates)
+            right = core_values[np.minimum(pos, core_values.size - 1)]
+            left = core_values[np.maximum(pos - 1, 0)]
+            noise[~core] = np.minimum(np.abs(right - candidates), np.abs(candidates - left)) > eps
+        mask = np.empty(self.n_rows, dtype=bool)
+        mask[self.order] = np.repeat(noise, counts)
+        return mask
+
+def _boundary(values, bound, eps, upper):
+    """
+    Corrects searchsorted bounds computed on values ± eps to the exact
+    |a - b| <= eps test DBSCAN uses (the sums are rounded).
+    """
+    n = values.size
+    i = np.arange(n)
+    while True:
+        if upper:
+            grow = (bound < n) & (values[np.minimum(bound, n - 1)] - values <= eps)
+            shrink = (bound > 0) & (values[np.maximum(bound - 1, 0)] - values > eps)
+        else:
+            grow = (bound > 0) & (values - values[np.maximum(bound - 1, 0)] <= eps)
+            shrink = (bound < n) & (values - values[np.minimum(bound, n - 1)] > eps) & (bound < i)
+        if not (grow.any() or shrink.any()):
+            return bound
+        step = grow.astype(np.int64) - shrink
+        bound = bound + (step if upper else -step)
+
+def dbscan_mask(data, eps=1.5, min_samples=5):
+    return DensityIndex(data, max_samples=min_samples).noise(eps, min_samples)
+
+# --- Model-based ---
+def isolation_forest_mask(data, contamination="auto", n_estimators=100, max_samples=256, random_state=0):
+    """
+    Isolation Forest; each tree is grown on a subsample of max_samples rows.
+    """
+    X = _feature_matrix(data, "Isolation Forest")
+    model = IsolationForest(n_estimators=n_estimators, max_samples=min(max_samples, len(X)),
+                            contamination=contamination, random_state=random_state, n_jobs=-1)
+    return model.fit_predict(X) == -1
+
+def lof_mask(data, n_neighbors=20, max_samples=10000, random_state=0):
+    """
+    Local Outlier Factor. Above max_samples rows the model is fitted on a
+    random subsample and the remaining rows are scored against it.
+    """
+    X = _feature_matrix(data, "LOF")
+    if len(X) <= max_samples:
+        lof = LocalOutlierFactor(n_neighbors=min(n_neighbors, max(len(X) - 1, 1)), n_jobs=-1)
+        return lof.fit_predict(X) == -1
+    sample = np.random.default_rng(random_state).choice(len(X), max_samples, replace=False)
+    lof = LocalOutlierFactor(n_neighbors=n_neighbors, novelty=True, n_jobs=-1).fit(X[sample])
+    mask = lof.predict(X) == -1
+    mask[sample] = lof.negative_outlier_factor_ < lof.offset_
+    return mask
+
+def outlier_mask(data, method, **params):
+    """
+    Dispatches to the detector named in METHODS with its parameters. The
+    MULTIVARIATE_METHODS also accept a DataFrame of feature columns.
+    """
+    detectors = {"IQR": iqr_mask, "Z-Score": zscore_mask, "DBSCAN": dbscan_mask,
+                 "Isolation Forest": isolation_forest_mask, "LOF": lof_mask}
+    if method not in detectors:
+        raise ValueError(f"Unknown outlier method: {method}")
+    return detectors[method](data, **params)
+
+# --- Batch detection ---
+# IQR and z-score bounds of every column at once: the frame is converted to a
+# single float matrix with one row per column, so every statistic is a NumPy
+# reduction over contiguous memory. Results match iqr_mask / zscore_mask
+# applied column by column.
+
+def iqr_matrix(Y, k=1.5):
+    Q1, Q3 = np.nanquantile(Y, [0.25, 0.75], axis=1, keepdims=True)
+    IQR = Q3 - Q1
+    return (Y < Q1 - k * IQR) | (Y > Q3 + k * IQR)
+
+def zscore_matrix(Y, threshold=3):
+    if np.isnan(Y).any():
+        mean, std = np.nanmean(Y, axis=1, keepdims=True), np.nanstd(Y, axis=1, keepdims=True)
+    else:
+        mean, std = Y.mean(axis=1, keepdims=True), Y.std(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.abs(Y - mean) / std > threshold
+
+def outlier_matrix(frame, method, **params):
+    """
+    Detects outliers in every column of a numeric frame in one pass.
+    Returns the positional boolean matrix (rows x columns) and the
+    outlier count per column.
+    """
+    detectors = {"IQR": iqr_matrix, "Z-Score": zscore_matrix}
+    if method not in detectors:
+        raise ValueError(f"{method} has no batch mode; use outlier_mask per column.")
+    Y = np.ascontiguousarray(frame.to_numpy(dtype="float64", na_value=np.nan).T)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN columns: no outliers
+        mask = detectors[method](Y, **params)
+    return mask.T, pd.Series(mask.sum(axis=1), index=frame.columns, name="Outliers")
@@ -0,0 +1,377 @@
+# modules/pipeline.py
+
+import json
+import numpy as np
+import pandas as pd
+import streamlit as st
+from modules.staging import StagedFrame
+from modules.outliers import outlier_mask
+from modules import imputer, encoding, scaling, expressions
+
+# --- Recorded pipeline ---
+# Every data operation of the editing pages is a named op below, applied to a
+# StagedFrame and recorded as a JSON-serializable step {"op", "params"}. The
+# steps saved with the session data can be replayed on a new file.
+# Replay is lazy: column ops only add column deltas and row ops only compose
+# row positions on the stage, so a run of consecutive ops is materialized in a
+# single pass (at the end, or before a whole-frame op such as grouping).
+# Encoding and scaling ops return their fitted state (FITTED_OPS); passed back
+# as the fitted parameter, the op only transforms, so a replay or a new file
+# is encoded exactly like the data the state was fitted on.
+
+PIPELINE_VERSION = 1
+OPS = {}
+
+# Filling methods offered by the cleaner and outlier pages
+GROUP_METHODS = {"Group Mean": "mean", "Group Median": "median", "Group Mode": "mode"}
+MODEL_METHODS = ["AI (KNNImputer)", "Iterative (Regression)"]
+FILL_METHODS = ["ffill", "bfill", "Mean", "Median", "Mode", "Constant Value",
+                *MODEL_METHODS, *GROUP_METHODS, "Interpolate"]
+# Time periods of a DatetimeIndex usable as an extra group key
+PERIODS = {"Day": "D", "Week": "W", "Month": "M", "Quarter": "Q", "Year": "Y"}
+# Ops that accept fitted=<the state they returned> to transform without refitting
+FITTED_OPS = ["label_encode", "one_hot", "hash_encode", "target_encode",
+              "standard_scale", "minmax_scale", "robust_scale", "quantile_scale"]
+
+def op(name, uses_sources=False):
+    """
+    Registers fn(stage, **params) as a pipeline op. Ops that read a second
+    dataset (merge) also receive the sources mapping of the run.
+    """
+    def register(fn):
+        OPS[name] = (fn, uses_sources)
+        return fn
+    return register
+
+def _existing(stage, columns):
+    return [c for c in columns if c in stage.columns]
+
+def _fill(values, method, value=None):
+    """
+    Fills a Series or DataFrame with one of the page's filling methods.
+    """
+    if method == "ffill":
+        return values.ffill()
+    if method == "bfill":
+        return values.bfill()
+    if method == "Mean":
+        return values.fillna(values.mean())
+    if method == "Median":
+        return values.fillna(values.median())
+    if method == "Mode":
+        return values.fillna(values.mode().iloc[0])
+    if method == "Constant Value":
+        return values.fillna(value)
+    raise ValueError(f"Unknown filling method: {method}")
+
+def _group_keys(stage, group_by=None, period=None):
+    """
+    Group keys for the group fills: the values of the group_by column(s)
+    and/or the DatetimeIndex truncated to a period (e.g. "Month").
+    """
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    keys = [stage.column(col).to_numpy() for col in group_by or []]
+    if period:
+        if not isinstance(stage.index, pd.DatetimeIndex):
+            raise ValueError("Grouping by time period needs a DatetimeIndex.")
+        keys.append(np.asarray(stage.index.to_period(PERIODS[period])))
+    if not keys:
+        raise ValueError("Group fills need a group column or a time period.")
+    return keys
+
+def _impute(stage, frame, method, value=None, group_by=None, period=None, interpolation="linear", order=3):
+    """
+    Fills a DataFrame with any of FILL_METHODS; the model-based, group and
+    interpolation methods use modules/imputer.py.
+    """
+    if method == "AI (KNNImputer)":
+        return imputer.knn_impute(frame, n_neighbors=3)
+    if method == "Iterative (Regression)":
+        return imputer.iterative_impute(frame)
+    if method in GROUP_METHODS:
+        return imputer.group_fill(frame, _group_keys(stage, group_by, period), GROUP_METHODS[method])
+    if method == "Interpolate":
+        return imputer.interpolate_fill(frame, interpolation, order)
+    return _fill(frame, method, value)
+
+# --- Missing data (cleaner) ---
+@op("drop_missing_rows")
+def drop_missing_rows(stage, columns=None):
+    subset = _existing(stage, columns or []) or stage.columns
+    stage.keep_rows(stage.frame(subset).notna().all(axis=1))
+
+@op("drop_missing_columns")
+def drop_missing_columns(stage, columns=None):
+    if columns:
+        stage.drop_columns(_existing(stage, columns))
+    else:
+        stage.drop_columns([col for col in stage.columns if stage.column(col).isnull().any()])
+
+@op("fill_missing")
+def fill_missing(stage, columns, method, value=None, group_by=None, period=None, interpolation="linear", order=3):
+    columns = _existing(stage, columns)
+    if not columns:
+        return
+    stage.set_columns(_impute(stage, stage.frame(columns), method, value, group_by, period, interpolation, order))
+
+# --- Outliers ---
+def _outliers(stage, column, method, features=None, **detector):
+    """
+    Outlier mask of column; the multivariate methods also use the feature columns.
+    """
+    if features:
+        return outlier_mask(stage.frame(list(dict.fromkeys([column, *features]))), method, **detector)
+    return outlier_mask(stage.column(column), method, **detector)
+
+@op("drop_outliers")
+def drop_outliers(stage, column, method, **detector):
+    stage.keep_rows(~_outliers(stage, column, method, **detector))
+
+@op("fill_outliers")
+def fill_outliers(stage, column, method, fill_method, value=None, group_by=None, period=None,
+                  interpolation="linear", order=3, **detector):
+    """
+    Sets the outliers of column to NaN, then fills them; the model-based
+    methods use every numeric column as features. Only column is changed.
+    """
+    masked = stage.column(column).mask(_outliers(stage, column, method, **detector))
+    if fill_method in MODEL_METHODS:
+        block = stage.frame().select_dtypes(include=[np.number])
+        block[column] = masked
+    else:
+        block = masked.to_frame()
+    filled = _impute(stage, block, fill_method, value, group_by, period, interpolation, order)
+    stage.set_columns({column: filled[column]})
+
+# --- Transformations ---
+@op("label_encode")
+def label_encode(stage, column, fitted=None):
+    """
+    Codes of the sorted string values (as LabelEncoder); with fitted classes,
+    unseen values get -1.
+    """
+    # Convert to string to handle mixed types safely
+    values = stage.column(column).astype(str)
+    classes = fitted["classes"] if fitted is not None else np.unique(values.to_numpy()).tolist()
+    codes = pd.Categorical(values, categories=classes).codes.astype(np.int64)
+    stage.set_columns({column: pd.Series(codes, index=values.index)})
+    return {"classes": classes}
+
+def _replace_encoded(stage, columns, encode):
+    # Remove original columns and add encoded columns
+    encoded = {}
+    for col in columns:
+        encoded.update(encode(stage.column(col)).items())
+    stage.drop_columns(columns)
+    stage.set_columns(encoded)
+
+@op("one_hot")
+def one_hot(stage, columns, drop_first=True, output="uint8", max_categories=None, min_frequency=None, fitted=None):
+    if fitted is not None:
+        levels = fitted["levels"]
+    else:
+        levels = {col: encoding.one_hot_levels(stage.column(col), max_categories, min_frequency) for col in columns}
+    _replace_encoded(stage, columns, lambda s: encoding.one_hot(s, drop_first, output, levels=levels[s.name]))
+    return {"levels": levels}
+
+@op("hash_encode")
+def hash_encode(stage, columns, n_features=32, output="uint8", fitted=None):
+    # Stateless: the same hash columns on any data
+    _replace_encoded(stage, columns, lambda s: encoding.hash_encode(s, n_features, output))
+    return {}
+
+@op("target_encode")
+def target_encode(stage, columns, target, smoothing=10.0, fitted=None):
+    if fitted is None:
+        target_values = stage.column(target)
+        means = {col: encoding.target_means(stage.column(col), target_values, smoothing) for col in columns}
+        fitted = {"means": {col: m for col, (m, _) in means.items()},
+                  "prior": {col: p for col, (_, p) in means.items()}}
+    stage.set_columns({
+        col: encoding.target_encode(stage.column(col), fitted["means"][col], fitted["prior"][col]) for col in columns
+    })
+    return fitted
+
+def _scale(stage, columns, mode, dtype="float64", fitted=None, **options):
+    """
+    Scales columns with modules/scaling.py: fitted chunk by chunk, written
+    column by column into one float64 / float32 block.
+    """
+    values = {col: stage.column(col) for col in columns}
+    if fitted is not None:
+        scaler = scaling.Scaler.from_state(fitted, mode)
+    else:
+        scaler = scaling.Scaler(mode, **options).fit(values)
+    stage.set_columns(scaler.transform(values, dtype))
+    return scaler.state()
+
+@op("standard_scale")
+def standard_scale(stage, columns, dtype="float64", fitted=None):
+    # Zero mean, unit (population) variance
+    return _scale(stage, columns, "standard", dtype, fitted)
+
+@op("minmax_scale")
+def minmax_scale(stage, columns, dtype="float64", fitted=None):
+    # [0, 1] by the fitted min and max
+    return _scale(stage, columns, "minmax", dtype, fitted)
+
+@op("robust_scale")
+def robust_scale(stage, columns, dtype="float64", fitted=None):
+    # Centered on the median, scaled by the interquartile range
+    return _scale(stage, columns, "robust", dtype, fitted)
+
+@op("quantile_scale")
+def quantile_scale(stage, columns, n_quantiles=1000, dtype="float64", fitted=None):
+    # Uniform [0, 1] through n_quantiles fitted quantiles
+    return _scale(stage, columns, "quantile", dtype, fitted, n_quantiles=n_quantiles)
+
+@op("convert_type")
+def convert_type(stage, column, dtype):
+    stage.set_columns({column: stage.column(column).astype(dtype)})
+
+@op("extract_date_fields")
+def extract_date_fields(stage, weekday_column="WeekdayNumber"):
+    index = stage.index
+    if not isinstance(index, pd.DatetimeIndex):
+        raise ValueError("Data has no DatetimeIndex.")
+    date_cols = pd.DataFrame({
+        "Year": index.year,
+        "Month": index.month,
+        "Day": index.day,
+        weekday_column: index.weekday + 1   # Monday=1, Sunday=7
+    }, index=index)
+    days = {1: "Monday", 2: "Tuesday", 3: "Wednesday", 4: "Thursday", 5: "Friday", 6: "Saturday", 7: "Sunday"}
+    date_cols["WeekdayName"] = date_cols[weekday_column].map(days)
+    stage.set_columns(date_cols)
+
+# --- Filtering & sorting ---
+@op("filter_range")
+def filter_range(stage, column, low, high):
+    stage.keep_rows(stage.column(column).between(low, high))
+
+@op("filter_dates")
+def filter_dates(stage, column, start, end):
+    s = stage.column(column)
+    stage.keep_rows((s >= pd.to_datetime(start)) & (s <= pd.to_datetime(end)))
+
+@op("filter_values")
+def filter_values(stage, column, values):
+    stage.keep_rows(stage.column(column).isin(values))
+
+@op("sort")
+def sort(stage, column, ascending=True):
+    order = stage.column(column).reset_index(drop=True).sort_values(ascending=ascending).index
+    stage.take(order.to_numpy())
+
+# --- Whole-frame ops ---
+@op("group_aggregate")
+def group_aggregate(stage, column, func):
+    df = stage.frame()
+    # Numerical columns, excluding the grouping column
+    num_cols = [col for col in df.select_dtypes(include="number").columns if col != column]
+    if not num_cols:
+        raise ValueError("No numerical data found other than the selected column. Grouping requires numerical columns.")
+    grouped_df = df.groupby(column, observed=True)[num_cols].agg(func).reset_index()
+    grouped_df.columns = [column] + [f"{col}_{func}" for col in num_cols]
+    stage.replace(grouped_df)
+
+@op("merge", uses_sources=True)
+def merge(stage, source, how, left_on, right_on, sources=None):
+    if not sources or source not in sources:
+        raise ValueError(f"Merge source '{source}' was not provided.")
+    stage.replace(pd.merge(stage.frame(), sources[source], how=how, left_on=left_on, right_on=right_on))
+
+@op("feature_expressions")
+def feature_expressions(stage, code):
+    """
+    New columns from expression lines such as ratio = a / b (see
+    modules/expressions.py); parsed and validated, never executed as code.
+    """
+    program = expressions.compile(code, stage.columns)
+    stage.set_columns(program.evaluate({col: stage.column(col) for col in program.inputs}, len(stage)))
+
+# --- Recording and replay ---
+def _plain(value):
+    """
+    value with NumPy scalars and arrays converted to Python values. Raises
+    TypeError for anything JSON would not read back as the same value.
+    """
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        for key in value:
+            if not isinstance(key, str):
+                raise TypeError(f"Pipeline parameter keys must be strings, got {key!r}.")
+        return {key: _plain(v) for key, v in value.items()}
+    raise TypeError(f"Pipeline parameter {value!r} ({type(value).__name__}) cannot be saved.")
+
+def make_step(name, **params):
+    """
+    A step {"op", "params"} with its params as plain JSON values (see _plain).
+    """
+    return {"op": name, "params": _plain(params)}
+
+def apply(stage, name, sources=None, **params):
+    """
+    Runs one op on the stage and records it as a step of the stage. Returns
+    what the op returns (the fitted state of FITTED_OPS).
+    """
+    step = make_step(name, **params)
+    fn, uses_sources = OPS[name]
+    if uses_sources:
+        result = fn(stage, sources=sources, **step["params"])
+    else:
+        result = fn(stage, **step["params"])
+    stage.record_step(step)
+    return result
+
+def run_pipeline(df, steps, sources=None):
+    """
+    Replays steps on df and returns the result, materialized once at the end.
+    sources maps merge source names to DataFrames.
+    """
+    stage = StagedFrame(df)
+    for step in steps:
+        apply(stage, step["op"], sources=sources, **step["params"])
+    return stage.frame()
+
+def run_chunks(chunks, steps, sources=None):
+    """
+    Replays steps on every chunk and yields the results. Only meaningful for
+    row-wise steps, e.g. encoders and scalers with their fitted state.
+    """
+    for chunk in chunks:
+        yield run_pipeline(chunk, steps, sources)
+
+def dumps(steps):
+    return json.dumps({"version": PIPELINE_VERSION, "steps": steps}, indent=2)
+
+def loads(text):
+    """
+    Parses a saved pipeline and checks that every step names a known op.
+    """
+    data = json.loads(text)
+    steps = data.get("steps") if isinstance(data, dict) else None
+    if not isinstance(steps, list):
+        raise ValueError("Not a pipeline file.")
+    for step in steps:
+        if not isinstance(step, dict) or step.get("op") not in OPS or not isinstance(step.get("params"), dict):
+            raise ValueError(f"Invalid pipeline step: {step}")
+    return steps
+
+# --- Session helpers ---
+def remember_source(name, df):
+    """
+    Keeps a second dataset (e.g. a merge input) available for replay in this session.
+    """
+    st.session_state.setdefault("pipeline_sources", {})[name] = df
+
+def session_sources():
+    return st.session_state.get("pipeline_sources", {})
@@ -0,0 +1,217 @@
+# modules/scaling.py
+
+import warnings
+from contextlib import contextmanager
+import numpy as np
+
+# --- Native column scaling ---
+# Scalers fitted on blocks of rows (a frame in chunks, or chunks of a file),
+# every statistic computed for all the columns at once by one reduction along
+# axis 0, so only one chunk is ever converted to float64:
+# - standard: mean and population std, merged chunk by chunk (Chan's update);
+# - minmax: min and max;
+# - robust: median and interquartile range;
+# - quantile: n_quantiles quantiles, mapped to a uniform [0, 1] output.
+# robust / quantile use a uniform reservoir sample of rows (exact while the
+# data has no more rows than reservoir_size). The transform writes into one
+# preallocated float32 / float64 output, column by column, in place.
+# NaNs are ignored when fitting and kept. fit / transform take a DataFrame or
+# a dict of column Series, so the selected columns are never copied into one
+# float64 block.
+
+MODES = ["standard", "minmax", "robust", "quantile"]
+DTYPES = ["float64", "float32"]
+DEFAULT_CHUNKSIZE = 200_000
+DEFAULT_RESERVOIR = 100_000
+
+class Scaler:
+    def __init__(self, mode="standard", n_quantiles=1000, reservoir_size=DEFAULT_RESERVOIR, random_state=0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown scaling mode: {mode}")
+        self.mode = mode
+        self.n_quantiles = n_quantiles
+        self.reservoir_size = reservoir_size
+        self.columns = None
+        self.count = None       # non-missing values per column
+        self.stats = {}         # mode statistics, one array over the columns each
+        self.reservoir = None   # sampled rows (robust / quantile)
+        self._seen = 0
+        self._params = None     # fitted parameters, when loaded with from_state
+        self._rng = np.random.default_rng(random_state)
+
+    # --- Fitting ---
+    def partial_fit(self, frame):
+        """
+        Adds a chunk of rows (a DataFrame or {name: Series} of the fitted
+        columns) to the statistics.
+        """
+        columns = dict(frame.items())
+        if self.columns is None:
+            self.columns = list(columns)
+            self.count = np.zeros(len(self.columns), dtype=np.int64)
+        self._add_block(_block([columns[name] for name in self.columns]))
+        return self
+
+    def fit(self, columns, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Fits on a DataFrame or {name: Series}, chunksize rows at a time.
+        """
+        columns = dict(columns.items())
+        self.columns = list(columns)
+        self.count = np.zeros(len(self.columns), dtype=np.int64)
+        for start in range(0, _length(columns), chunksize):
+            self._add_block(_block([s.iloc[start:start + chunksize] for s in columns.values()]))
+        return self
+
+    def fit_chunks(self, chunks):
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def _add_block(self, X):
+        """
+        Adds a private (rows x columns) float64 block; it may be overwritten.
+        """
+        if not len(X):
+            return
+        missing = np.isnan(X)
+        count = len(X) - missing.sum(axis=0)
+        with _quiet():
+            if self.mode == "standard":
+                self._add_moments(X, missing, count)
+            elif self.mode == "minmax":
+                # fmin / fmax skip NaNs without the copy nanmin makes
+                low, high = np.fmin.reduce(X, axis=0), np.fmax.reduce(X, axis=0)
+                self.stats["min"] = np.fmin(self.stats.get("min", low), low)
+                self.stats["max"] = np.fmax(self.stats.get("max", high), high)
+            else:
+                self._add_reservoir(X)
+        self.count += count
+
+    def _add_moments(self, X, missing, count):
+        # Chunk mean and squared deviations computed in place in X
+        has_missing = missing.any()
+        if has_missing:
+            X[missing] = 0
+        mean_b = X.sum(axis=0) / count
+        X -= mean_b
+        if has_missing:
+            X[missing] = 0
+        np.square(X, out=X)
+        m2_b = X.sum(axis=0)
+        # Merged with the previous chunks (Chan's update); columns without values in this chunk are kept
+        mean, m2 = self.stats.get("mean", np.zeros(len(count))), self.stats.get("m2", np.zeros(len(count)))
+        n = self.count + count
+        delta = mean_b - mean
+        has = count > 0
+        self.stats["mean"] = np.where(has, mean + delta * count / n, mean)
+        self.stats["m2"] = np.where(has, m2 + m2_b + delta ** 2 * self.count * count / n, m2)
+
+    def _add_reservoir(self, X):
+        # Algorithm R over rows, as in outlier_model (the last write to a slot wins)
+        reservoir = self.reservoir if self.reservoir is not None else np.empty((0, X.shape[1]))
+        free = self.reservoir_size - len(reservoir)
+        if free > 0:
+            reservoir = np.concatenate([reservoir, X[:free]])
+            self._seen += min(free, len(X))
+            X = X[free:]
+        if len(X):
+            slots = self._rng.integers(0, self._seen + np.arange(1, len(X) + 1))
+            self._seen += len(X)
+            keep = np.flatnonzero(slots < self.reservoir_size)
+            slots = slots[keep]
+            _, last = np.unique(slots[::-1], return_index=True)
+            last = slots.size - 1 - last
+            reservoir[slots[last]] = X[keep[last]]
+        self.reservoir = reservoir
+
+    # --- Fitted state ---
+    def params(self):
+        """
+        Fitted parameters by name, one array over the columns each.
+        """
+        if self._params is not None:
+            return self._params
+        with _quiet():
+            if self.mode == "standard":
+                return {"mean": self.stats["mean"], "scale": _nonzero(np.sqrt(self.stats["m2"] / self.count))}
+            if self.mode == "minmax":
+                return {"min": self.stats["min"], "scale": _nonzero(self.stats["max"] - self.stats["min"])}
+            if self.mode == "robust":
+                q1, median, q3 = np.nanquantile(self.reservoir, [0.25, 0.5, 0.75], axis=0)
+                return {"center": median, "scale": _nonzero(q3 - q1)}
+            levels = np.linspace(0, 1, min(self.n_quantiles, max(len(self.reservoir), 1)))
+            return {"quantiles": np.nanquantile(self.reservoir, levels, axis=0).T}
+
+    def state(self):
+        """
+        Fitted parameters as plain lists (JSON-serializable, see pipeline.FITTED_OPS).
+        """
+        return {"mode": self.mode, **{key: np.asarray(value).tolist() for key, value in self.params().items()}}
+
+    @classmethod
+    def from_state(cls, state, mode=None):
+        scaler = cls(state.get("mode", mode))
+        scaler._params = {key: np.asarray(value, dtype="float64") for key, value in state.items() if key != "mode"}
+        return scaler
+
+    # --- Transform ---
+    def transform(self, columns, dtype="float64"):
+        """
+        Scaled columns (a DataFrame or {name: Series}, in the fitted order) as
+        {name: array}, filled column by column into one (rows x columns)
+        Fortran-ordered output of dtype.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown output dtype: {dtype}")
+        params = self.params()
+        shift = params.get("mean", params.get("min", params.get("center")))
+        columns = dict(columns.items())
+        out = np.empty((_length(columns), len(columns)), dtype=dtype, order="F")
+        for j, s in enumerate(columns.values()):
+            x = s.to_numpy(dtype="float64", na_value=np.nan)
+            target = out[:, j]
+            if self.mode == "quantile":
+                target[:] = _uniform(x, params["quantiles"][j])
+            else:
+                np.subtract(x, shift[j], out=target, casting="same_kind")
+                target /= target.dtype.type(params["scale"][j])
+        return {col: out[:, j] for j, col in enumerate(columns)}
+
+def _block(series):
+    """
+    Copies column Series into one Fortran-ordered float64 block (NaN for missing).
+    """
+    X = np.empty((len(series[0]) if series else 0, len(series)), dtype="float64", order="F")
+    for j, s in enumerate(series):
+        X[:, j] = s.to_numpy(dtype="float64", na_value=np.nan)
+    return X
+
+def _length(columns):
+    return len(next(iter(columns.values()))) if columns else 0
+
+def _nonzero(scale):
+    # Constant columns keep their (shifted) values, as in sklearn's scalers
+    return np.where((scale == 0) | np.isnan(scale), 1.0, scale)
+
+def _uniform(x, quantiles):
+    """
+    Maps x to [0, 1] through the fitted quantiles; the interpolation is run
+    both ways and averaged so repeated quantiles map to their middle, and the
+    lowest / highest quantile map to 0 / 1 (as in QuantileTransformer).
+    """
+    references = np.linspace(0, 1, len(quantiles))
+    if np.isnan(quantiles).all():
+        return np.full(len(x), np.nan)
+    y = 0.5 * (np.interp(x, quantiles, references)
+               - np.interp(-x, -quantiles[::-1], -references[::-1]))
+    y[x == quantiles[-1]] = 1
+    y[x == quantiles[0]] = 0
+    return y
+
+@contextmanager
+def _quiet():
+    # All-NaN columns give NaN statistics without RuntimeWarnings
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        yield
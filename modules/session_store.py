@@ -0,0 +1,197 @@
+# modules/session_store.py
+
+import os
+import json
+import time
+import shutil
+import weakref
+import tempfile
+import streamlit as st
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# --- Session data store ---
+# The active dataset lives in an uncompressed Arrow IPC (Feather v2) file in a
+# per-session temp directory and is read back memory-mapped, so numeric columns
+# are zero-copy views on the page cache instead of private heap memory.
+# Pages get shallow copies; with pandas copy-on-write enabled (see main.py) only
+# the columns an operation actually modifies are ever copied.
+# The directory is removed when the session's state is discarded; directories
+# left behind by a killed server are swept once they are STALE_SESSION_SECONDS old.
+
+SESSION_PREFIX = "dm_session_"
+STALE_SESSION_SECONDS = 24 * 3600
+
+class _SessionDir:
+    """
+    A per-session temp directory, deleted with its files once Streamlit drops
+    the session state (or at interpreter exit).
+    """
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix=SESSION_PREFIX)
+        weakref.finalize(self, shutil.rmtree, self.path, True)
+
+def _sweep_stale_dirs():
+    cutoff = time.time() - STALE_SESSION_SECONDS
+    root = tempfile.gettempdir()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if name.startswith(SESSION_PREFIX) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+def _session_dir():
+    if "_store_dir" not in st.session_state:
+        _sweep_stale_dirs()
+        st.session_state["_store_dir"] = _SessionDir()
+    path = st.session_state["_store_dir"].path
+    # Recreated if a sweep removed it during a long idle period; touched so it stays fresh
+    os.makedirs(path, exist_ok=True)
+    os.utime(path)
+    return path
+
+def session_path(filename):
+    """
+    Returns a path inside this session's private temp directory.
+    """
+    return os.path.join(_session_dir(), filename)
+
+def _to_table(df):
+    table = pa.Table.from_pandas(df, preserve_index=None)
+    for i, dtype in enumerate(df.dtypes):
+        # NumPy float NaNs are kept as values, not nulls, so they read back without a fill copy
+        if isinstance(dtype, np.dtype) and dtype.kind == "f" and table.column(i).null_count:
+            table = table.set_column(i, table.field(i), pa.array(df.iloc[:, i].to_numpy(), from_pandas=False))
+    return table
+
+def _write_table(table, path):
+    """
+    Writes an Arrow table to an IPC file and returns it read back memory-mapped.
+    The file holds a single record batch: with feather's default 64K-row batches,
+    to_pandas would have to concatenate the chunks of every column into new memory.
+    """
+    feather.write_feather(table, path, compression="uncompressed", chunksize=max(len(table), 1))
+    return feather.read_table(path, memory_map=True)
+
+def to_frame(table):
+    """
+    DataFrame view of a stored table. pandas' Arrow-backed strings
+    (string[pyarrow]) are stored as large_string and object strings as string,
+    so mapping large_string back keeps both dtypes (and the string columns
+    stay mapped instead of becoming Python objects).
+    """
+    return table.to_pandas(split_blocks=True, types_mapper={pa.large_string(): pd.StringDtype("pyarrow")}.get)
+
+def write_mapped(df, path):
+    """
+    Writes the DataFrame to an Arrow IPC file and returns a memory-mapped view of it.
+    """
+    return to_frame(_write_table(_to_table(df), path))
+
+def _reuse_table(df, previous, unchanged, rows):
+    """
+    Arrow table of df where the unchanged columns are taken from the previous
+    stored table (at positions rows, None = all) instead of being converted
+    from pandas again; only the other columns and the index are converted.
+    """
+    metadata = json.loads(previous.schema.metadata[b"pandas"])
+    previous_entries = {entry["name"]: entry for entry in metadata["columns"]}
+    reused = {c for c in unchanged
+              if isinstance(c, str) and c in previous_entries and len(previous.schema.get_all_field_indices(c)) == 1}
+    converted = _to_table(df.drop(columns=list(reused)))
+    metadata = json.loads(converted.schema.metadata[b"pandas"])
+    entries = {entry["field_name"]: entry for entry in metadata["columns"]}
+
+    fields, arrays, columns = [], [], []
+    for name in df.columns:
+        if name in reused:
+            values = previous.column(name)
+            fields.append(previous.schema.field(name))
+            arrays.append(values if rows is None else values.take(rows))
+            columns.append(previous_entries[name])
+        else:
+            fields.append(converted.schema.field(str(name)))
+            arrays.append(converted.column(str(name)))
+            columns.append(entries[str(name)])
+    for name in metadata["index_columns"]:
+        if isinstance(name, str):  # RangeIndex is stored as metadata only
+            fields.append(converted.schema.field(name))
+            arrays.append(converted.column(name))
+            columns.append(entries[name])
+    metadata["columns"] = columns
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata={b"pandas": json.dumps(metadata).encode()}))
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # Still mapped by a live frame (e.g. on Windows); the temp dir holds it until cleanup
+        pass
+
+def has_data():
+    return "data" in st.session_state
+
+def data_version():
+    """
+    Increases every time the main DataFrame is replaced; usable as a cache key.
+    """
+    return st.session_state.get("data_version", 0)
+
+def get_data():
+    """
+    Returns a shallow (copy-on-write) copy of the main DataFrame.
+    """
+    return st.session_state["data"].copy(deep=False)
+
+def pipeline_steps():
+    """
+    Recorded steps (see pipeline.py) that produced the main DataFrame from the loaded file.
+    """
+    return list(st.session_state.get("pipeline_steps", []))
+
+def reset_pipeline(steps=()):
+    """
+    Replaces the recorded steps, e.g. when the main DataFrame is reverted to a backup.
+    """
+    st.session_state["pipeline_steps"] = list(steps)
+
+def set_data(df, steps=None, unchanged=(), rows=None):
+    """
+    Stores the DataFrame as the main dataset, memory-mapped from local disk.
+    Falls back to keeping it in memory if Arrow cannot represent it
+    (e.g. object columns with mixed Python types, sparse columns).
+    steps are the pipeline steps that produced df from the current data.
+    unchanged names columns of df that hold the current data's values at the
+    row positions rows (None = all rows): they are copied over from the stored
+    Arrow table without a pandas conversion (the new file is still written whole).
+    """
+    version = data_version() + 1
+    path = os.path.join(_session_dir(), f"data_{version}.arrow")
+    previous_table = st.session_state.get("data_table")
+    try:
+        if unchanged and previous_table is not None:
+            table = _reuse_table(df, previous_table, unchanged, rows)
+        else:
+            table = _to_table(df)
+        table = _write_table(table, path)
+        stored = to_frame(table)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, ValueError, TypeError) as e:
+        print(f"Session store falling back to memory: {e}")
+        _remove_file(path)
+        stored, path, table = df, None, None
+
+    previous = st.session_state.get("data_path")
+    if previous:
+        _remove_file(previous)
+
+    st.session_state["data"] = stored
+    st.session_state["data_table"] = table
+    st.session_state["data_path"] = path
+    st.session_state["data_version"] = version
+    if steps:
+        st.session_state["pipeline_steps"] = pipeline_steps() + list(steps)
+    return stored
@@ -0,0 +1,253 @@
+# modules/staging.py
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from modules import session_store
+
+# --- Staging layer ---
+# A page's pending edits are kept as deltas on top of the main DataFrame
+# (copy-on-write at column level): the positions of the rows still kept, the
+# columns that were replaced or added, and the base columns that were dropped.
+# Untouched columns are never copied; "Save to Main DF" merges the deltas.
+
+class StagedFrame:
+    def __init__(self, base, base_version=None):
+        self.base = base
+        self.base_version = base_version
+        self.origin = base    # the main DataFrame the stage was created from
+        self.rows = None      # positions (into base) of the kept rows, None = all rows
+        self.changed = {}     # column -> Series aligned to the current view
+        self.dropped = []     # base columns removed by the user
+        self.steps = []       # pipeline steps recorded for these edits (see pipeline.apply)
+        self.revision = 0
+        self.journal = None   # list collecting reversible deltas while a history step is open
+        self._frame = None
+
+    # --- Read access ---
+    @property
+    def columns(self):
+        dropped = set(self.dropped)
+        kept = [c for c in self.base.columns if c not in dropped]
+        kept_set = set(kept)
+        return kept + [c for c in self.changed if c not in kept_set]
+
+    @property
+    def index(self):
+        return self.base.index if self.rows is None else self.base.index[self.rows]
+
+    def __len__(self):
+        return len(self.base) if self.rows is None else len(self.rows)
+
+    @property
+    def has_changes(self):
+        return self.rows is not None or bool(self.changed) or bool(self.dropped)
+
+    def column(self, name):
+        """
+        Current values of one column, without materializing the frame.
+        """
+        if name in self.changed:
+            return self.changed[name]
+        if name in self.dropped:
+            raise KeyError(name)
+        s = self.base[name]
+        return s if self.rows is None else s.iloc[self.rows]
+
+    def frame(self, columns=None):
+        """
+        Materializes the current view (or only the given columns). The full view
+        is cached until the next edit.
+        """
+        if columns is not None:
+            return pd.DataFrame({c: self.column(c) for c in columns}, index=self.index)
+        if self._frame is None:
+            dropped = set(self.dropped)
+            untouched = [c for c in self.base.columns if c not in dropped and c not in self.changed]
+            df = self.base[untouched]
+            if self.rows is not None:
+                df = df.iloc[self.rows]
+            if self.changed:
+                # One concat: inserting column by column is quadratic for thousands of columns (one-hot)
+                df = pd.concat([df, *(pd.Series(values.array, index=df.index, name=name).to_frame()
+                                      for name, values in self.changed.items())], axis=1)
+            self._frame = df[self.columns]
+        return self._frame
+
+    def head(self, n=5):
+        """
+        Preview of the first rows without materializing the whole view.
+        """
+        preview = StagedFrame(self.base)
+        preview.rows = np.arange(min(n, len(self.base))) if self.rows is None else self.rows[:n]
+        preview.changed = {c: s.iloc[:n] for c, s in self.changed.items()}
+        preview.dropped = self.dropped
+        return preview.frame()
+
+    # --- Edits ---
+    # Every edit logs a reversible delta (see apply_delta) to the open journal:
+    # the column Series it replaced, or the positions and values of the rows it
+    # removed. Deltas reference existing Series instead of copying frames.
+    def _touch(self):
+        self.revision += 1
+        self._frame = None
+
+    def _log(self, delta):
+        if self.journal is not None:
+            self.journal.append(delta)
+
+    def set_columns(self, values):
+        """
+        Replaces or adds columns; values is a dict or DataFrame of columns
+        with one value per row of the current view.
+        """
+        before, after = {}, {}
+        order, dropped = list(self.changed), self.dropped
+        changed = dict(self.changed)
+        for name, column in values.items():
+            data = column.array if isinstance(column, pd.Series) else column
+            before[name] = self.changed.get(name)
+            changed[name] = after[name] = pd.Series(data, index=self.index, name=name)
+        self.changed = changed
+        self.dropped = [c for c in self.dropped if c not in after]
+        self._log({"kind": "columns", "before": before, "after": after,
+                   "order": (order, list(changed)), "dropped": (dropped, self.dropped)})
+        self._touch()
+
+    def drop_columns(self, names):
+        before = {name: self.changed.get(name) for name in names}
+        order, dropped = list(self.changed), self.dropped
+        self.changed = {c: s for c, s in self.changed.items() if c not in before}
+        dropped_set = set(self.dropped)
+        self.dropped = self.dropped + [c for c in names if c in self.base.columns and c not in dropped_set]
+        self._log({"kind": "columns", "before": before, "after": dict.fromkeys(before),
+                   "order": (order, list(self.changed)), "dropped": (dropped, self.dropped)})
+        self._touch()
+
+    def keep_rows(self, mask):
+        """
+        Keeps the rows of the current view where mask is True.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        if self.journal is not None:
+            removed = np.flatnonzero(~mask)
+            self._log({
+                "kind": "rows",
+                "all_rows": self.rows is None,
+                "removed": removed,
+                "removed_rows": removed if self.rows is None else self.rows[removed],
+                "slices": {c: s.iloc[removed] for c, s in self.changed.items()}
+            })
+        self._keep_positions(np.flatnonzero(mask))
+
+    def _keep_positions(self, positions):
+        self.rows = positions if self.rows is None else self.rows[positions]
+        self.changed = {c: s.iloc[positions] for c, s in self.changed.items()}
+        self._touch()
+
+    def take(self, positions):
+        """
+        Selects and reorders rows by position in the current view (e.g. sorting).
+        """
+        before = self.snapshot()
+        self._keep_positions(np.asarray(positions))
+        self._log({"kind": "replace", "before": before, "after": self.snapshot()})
+
+    def record_step(self, step):
+        before = self.steps
+        self.steps = before + [step]
+        self._log({"kind": "steps", "before": before, "after": self.steps})
+
+    def replace(self, df):
+        """
+        For whole-frame operations (grouping, merging): the result becomes the new base.
+        """
+        before = self.snapshot()
+        self.base = df
+        self.rows, self.changed, self.dropped = None, {}, []
+        self._log({"kind": "replace", "before": before, "after": self.snapshot()})
+        self._touch()
+
+    def apply_delta(self, delta, undo=True):
+        """
+        Reverts (undo=True) or re-applies a delta logged by one of the edits
+        above. Deltas must be applied in stack order.
+        """
+        side = 0 if undo else 1
+        if delta["kind"] == "columns":
+            changed = dict(self.changed)
+            for name, column in delta["before" if undo else "after"].items():
+                if column is None:
+                    changed.pop(name, None)
+                else:
+                    changed[name] = column
+            self.changed = {name: changed[name] for name in delta["order"][side]}
+            self.dropped = list(delta["dropped"][side])
+            self._touch()
+        elif delta["kind"] == "rows":
+            removed = delta["removed"]
+            kept = np.ones(len(self) + len(removed) if undo else len(self), dtype=bool)
+            kept[removed] = False
+            kept_positions = np.flatnonzero(kept)
+            if not undo:
+                self._keep_positions(kept_positions)
+                return
+            if delta["all_rows"]:
+                rows = None
+            else:
+                rows = np.empty(len(kept), dtype=self.rows.dtype)
+                rows[kept_positions] = self.rows
+                rows[removed] = delta["removed_rows"]
+            # Interleave the removed values back into the changed columns
+            order = np.argsort(np.concatenate([kept_positions, removed]), kind="stable")
+            self.changed = {c: pd.concat([s, delta["slices"][c]]).iloc[order] for c, s in self.changed.items()}
+            self.rows = rows
+            self._touch()
+        elif delta["kind"] == "steps":
+            self.steps = delta["before" if undo else "after"]
+        else:
+            self.restore(delta["before" if undo else "after"])
+
+    # --- Snapshots (cheap: deltas are replaced, never mutated) ---
+    def snapshot(self):
+        return self.base, self.rows, dict(self.changed), list(self.dropped)
+
+    def restore(self, snapshot):
+        self.base, self.rows, changed, dropped = snapshot
+        self.changed, self.dropped = dict(changed), list(dropped)
+        self._touch()
+
+# --- Session helpers ---
+def get_stage(key):
+    """
+    Returns the page's staged frame. A stage without pending edits follows the
+    main DataFrame when another page replaces it.
+    """
+    stage = st.session_state.get(key)
+    version = session_store.data_version()
+    if stage is None or (stage.base_version != version and not stage.has_changes):
+        stage = StagedFrame(session_store.get_data(), version)
+        st.session_state[key] = stage
+    return stage
+
+def reset_stage(key):
+    st.session_state.pop(key, None)
+    st.session_state.pop(f"{key}_history", None)  # see history.get_history
+    st.session_state.pop(f"{key}_missing", None)  # see missing_profile.profile_for
+
+def commit_stage(key):
+    """
+    Merges the stage's deltas into the main DataFrame. While the stage still
+    sits on the current main DataFrame, its untouched columns are taken over
+    from the stored Arrow file and only the changed columns are converted
+    (see session_store.set_data). The stage's pipeline steps are appended to
+    the session pipeline.
+    """
+    stage = st.session_state.pop(key)
+    st.session_state.pop(f"{key}_history", None)
+    st.session_state.pop(f"{key}_missing", None)
+    unchanged = ()
+    if stage.base is stage.origin and stage.base_version == session_store.data_version():
+        dropped = set(stage.dropped)
+        unchanged = [c for c in stage.base.columns if c not in dropped and c not in stage.changed]
+    return session_store.set_data(stage.frame(), steps=stage.steps, unchanged=unchanged, rows=stage.rows)
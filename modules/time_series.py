@@ -14,7 +14,7 @@ from keras.layers import GRU, Dense, LSTM
 # ====================================
 
 def preprocess_data(df):
-    df = df.copy()
+    df = df.copy(deep=False)
     if not isinstance(df.index, pd.DatetimeIndex):
         df.iloc[:, 0] = pd.to_datetime(df.iloc[:, 0])
         df.set_index(df.columns[0], inplace=True)
@@ -1,9 +1,17 @@
 # modules/transformer.py
 
+import os
 import streamlit as st
-from sklearn.preprocessing import LabelEncoder, StandardScaler, MinMaxScaler
 import pandas as pd
-from sklearn.preprocessing import OneHotEncoder
+from modules import staging, history, pipeline, encoding, scaling, model_registry, loader, exporter, session_store
+
+# Scaling operations: pipeline op and button label
+SCALING_OPS = {
+    "Standard Scaling": ("standard_scale", "Apply Standard Scaler"),
+    "Min-Max Scaling": ("minmax_scale", "Apply Min-Max Scaler"),
+    "Robust Scaling": ("robust_scale", "Apply Robust Scaler"),
+    "Quantile Scaling": ("quantile_scale", "Apply Quantile Scaler"),
+}
 
 def run():
     st.subheader("🔧 Data Transformation")
@@ -13,34 +21,35 @@ def run():
         return
 
     # --- Temp State for Persistence ---
-    # Create a temporary dataframe in session state to hold changes before saving
-    if "transformer_temp_df" not in st.session_state:
-        st.session_state["transformer_temp_df"] = st.session_state["data"].copy()
-
-    df_temp = st.session_state["transformer_temp_df"]
+    # Pending changes are staged as column deltas on top of the main data
+    stage = staging.get_stage("transformer_stage")
+    stage_history = history.get_history("transformer_stage", stage)
+    df_temp = stage.frame()
 
     st.write("### 📊 Data Transformation View")
-    st.dataframe(df_temp.head())
+    st.dataframe(encoding.to_dense(df_temp.head()))
 
     st.write("### Select Transformation Operation")
     islem = st.selectbox("Operation", [
         "Label Encoding",
         "One-Hot Encoding",
+        "Hashing Encoding",
+        "Target Encoding",
         "Standard Scaling",
         "Min-Max Scaling",
+        "Robust Scaling",
+        "Quantile Scaling",
         "Data Type Conversion",
         "Extract Date Columns"
     ])
 
     match islem:
         case "Label Encoding":
-            kat_sutun = st.selectbox("Select Categorical Column", df_temp.select_dtypes(include='object').columns)
+            kat_sutun = st.selectbox("Select Categorical Column", df_temp.select_dtypes(include=["object", "category", "string"]).columns)
             if st.button("Apply Label Encoding"):
                 try:
-                    encoder = LabelEncoder()
-                    # Convert to string to handle mixed types safely
-                    df_temp[kat_sutun] = encoder.fit_transform(df_temp[kat_sutun].astype(str))
-                    st.session_state["transformer_temp_df"] = df_temp
+                    with stage_history.step(f"Label encode {kat_sutun}"):
+                        model_registry.fit(stage, "label_encode", column=kat_sutun)
                     st.success("Label encoding applied temporarily.")
                     st.rerun()
                 except Exception as e:
@@ -49,47 +58,82 @@ def run():
         case "One-Hot Encoding":
             kat_sutun = st.multiselect(
                 "Select column(s) for One-Hot Encoding",
-                df_temp.select_dtypes(include='object').columns
+                df_temp.select_dtypes(include=["object", "category", "string"]).columns
             )
+            # uint8 indicators (1 byte per cell) or sparse columns (only the ones are stored);
+            # rare levels can be merged into an "other" column
+            cikti = st.radio("Output", encoding.OUTPUTS, horizontal=True, key="onehot_output",
+                             help="sparse: for columns with many levels, e.g. product codes")
+            max_kategori = st.number_input("Max categories (0 = no limit)", 0, 100000, 0, key="onehot_max")
+            min_frekans = st.number_input("Min frequency: count, or share if < 1 (0 = none)", 0.0, value=0.0, key="onehot_min")
+            drop_first = st.checkbox("Drop first level", value=True, key="onehot_drop")
+
+            if kat_sutun:
+                st.dataframe(pd.DataFrame({
+                    "Column": kat_sutun,
+                    "Levels": [df_temp[col].nunique(dropna=False) for col in kat_sutun],
+                    "uint8 size (MB)": [
+                        encoding.dense_size(df_temp[col], max_kategori or None, min_frekans or None) / 1024 ** 2
+                        for col in kat_sutun
+                    ]
+                }))
 
             if kat_sutun and st.button("Apply One-Hot Encoding"):
                 try:
-                    encoder = OneHotEncoder(sparse_output=False, drop='first')
-                    encoded_array = encoder.fit_transform(df_temp[kat_sutun])
-                    encoded_df = pd.DataFrame(
-                        encoded_array,
-                        columns=encoder.get_feature_names_out(kat_sutun),
-                        index=df_temp.index
-                    )
                     # Remove original columns and add encoded columns
-                    df_temp = pd.concat([df_temp.drop(columns=kat_sutun), encoded_df], axis=1)
-                    
-                    st.session_state["transformer_temp_df"] = df_temp
+                    with stage_history.step("One-hot encode " + ", ".join(kat_sutun)):
+                        model_registry.fit(stage, "one_hot", columns=kat_sutun, drop_first=drop_first, output=cikti,
+                                             max_categories=max_kategori or None, min_frequency=min_frekans or None)
                     st.success("One-hot encoding applied temporarily.")
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error applying One-Hot Encoding: {e}")
 
-        case "Standard Scaling":
-            sayisal_sutun = st.multiselect("Select column(s) for Standard Scaling", df_temp.select_dtypes(include='number').columns)
-            if st.button("Apply Standard Scaler"):
+        case "Hashing Encoding":
+            kat_sutun = st.multiselect(
+                "Select column(s) for Hashing Encoding",
+                df_temp.select_dtypes(include=["object", "category", "string"]).columns
+            )
+            n_features = st.number_input("Number of hash columns per column", 2, 4096, 32, key="hash_n")
+            cikti = st.radio("Output", encoding.OUTPUTS, horizontal=True, key="hash_output")
+            if kat_sutun and st.button("Apply Hashing Encoding"):
                 try:
-                    scaler = StandardScaler()
-                    df_temp[sayisal_sutun] = scaler.fit_transform(df_temp[sayisal_sutun])
-                    st.session_state["transformer_temp_df"] = df_temp
-                    st.success("Standard scaling applied temporarily.")
+                    with stage_history.step("Hash encode " + ", ".join(kat_sutun)):
+                        model_registry.fit(stage, "hash_encode", columns=kat_sutun, n_features=int(n_features), output=cikti)
+                    st.success("Hashing encoding applied temporarily.")
                     st.rerun()
                 except Exception as e:
-                     st.error(f"Error: {e}")
+                    st.error(f"Error: {e}")
 
-        case "Min-Max Scaling":
-            sayisal_sutun = st.multiselect("Select column(s) for Min-Max Scaling", df_temp.select_dtypes(include='number').columns)
-            if st.button("Apply Min-Max Scaler"):
+        case "Target Encoding":
+            kat_sutun = st.multiselect(
+                "Select column(s) for Target Encoding",
+                df_temp.select_dtypes(include=["object", "category", "string"]).columns
+            )
+            hedef = st.selectbox("Target column (numeric)", df_temp.select_dtypes(include="number").columns)
+            smoothing = st.number_input("Smoothing (weight of the global mean)", 0.0, value=10.0, key="target_smoothing")
+            if kat_sutun and hedef is not None and st.button("Apply Target Encoding"):
                 try:
-                    scaler = MinMaxScaler()
-                    df_temp[sayisal_sutun] = scaler.fit_transform(df_temp[sayisal_sutun])
-                    st.session_state["transformer_temp_df"] = df_temp
-                    st.success("Min-Max scaling applied temporarily.")
+                    with stage_history.step("Target encode " + ", ".join(kat_sutun)):
+                        model_registry.fit(stage, "target_encode", columns=kat_sutun, target=hedef, smoothing=smoothing)
+                    st.success("Target encoding applied temporarily.")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+        case "Standard Scaling" | "Min-Max Scaling" | "Robust Scaling" | "Quantile Scaling":
+            islem_op, buton = SCALING_OPS[islem]
+            sayisal_sutun = st.multiselect(f"Select column(s) for {islem}", df_temp.select_dtypes(include='number').columns)
+            secenekler = {}
+            if islem == "Quantile Scaling":
+                secenekler["n_quantiles"] = int(st.number_input("Number of quantiles", 10, 10000, 1000, key="scale_quantiles"))
+            # float32 halves the memory of the scaled columns
+            cikti_tipi = st.radio("Output dtype", scaling.DTYPES, horizontal=True, key="scale_dtype")
+            if st.button(buton):
+                try:
+                    with stage_history.step(f"{islem} " + ", ".join(sayisal_sutun)):
+                        model_registry.fit(stage, islem_op, columns=sayisal_sutun, dtype=cikti_tipi, **secenekler)
+                    st.success(f"{islem} applied temporarily.")
                     st.rerun()
                 except Exception as e:
                      st.error(f"Error: {e}")
@@ -99,8 +143,8 @@ def run():
             yeni_tip = st.selectbox("New Data Type", ["int", "float", "str"])
             if st.button("Convert Type"):
                 try:
-                    df_temp[secilen_sutun] = df_temp[secilen_sutun].astype(yeni_tip)
-                    st.session_state["transformer_temp_df"] = df_temp
+                    with stage_history.step(f"Convert {secilen_sutun} to {yeni_tip}"):
+                        pipeline.apply(stage, "convert_type", column=secilen_sutun, dtype=yeni_tip)
                     st.success(f"Column '{secilen_sutun}' converted to {yeni_tip} temporarily.")
                     st.rerun()
                 except Exception as e:
@@ -113,42 +157,90 @@ def run():
             else:
                 if st.button("Extract Date Fields"):
                     try:
-                        df_temp["Year"] = df_temp.index.year
-                        df_temp["Month"] = df_temp.index.month
-                        df_temp["Day"] = df_temp.index.day
-                        df_temp["WeekdayNumber"] = df_temp.index.weekday + 1
-                        
-                        # Add day name
-                        days = {
-                            1: "Monday",
-                            2: "Tuesday",
-                            3: "Wednesday",
-                            4: "Thursday",
-                            5: "Friday",
-                            6: "Saturday",
-                            7: "Sunday"
-                        }
-                        df_temp["WeekdayName"] = df_temp["WeekdayNumber"].map(days)
-                        
-                        st.session_state["transformer_temp_df"] = df_temp
+                        with stage_history.step("Extract date fields"):
+                            pipeline.apply(stage, "extract_date_fields")
                         st.success("Date components extracted temporarily.")
                         st.rerun()
                     except Exception as e:
                         st.error(f"Error: {e}")
 
+    # ------------------- Fitted Transformers -------------------
+    # Encoders / scalers keep their fitted state; re-apply them or transform new files without refitting
+    with st.expander("🗃️ Fitted Transformers (reuse on new data)"):
+        kayitli = model_registry.registry()
+        if kayitli:
+            st.dataframe(pd.DataFrame([
+                {"Name": name, "Operation": t.op, "Columns": ", ".join(map(str, t.columns)), "Fitted": t.created}
+                for name, t in kayitli.items()
+            ]))
+        else:
+            st.info("No fitted transformers yet: apply an encoding or scaling operation.")
+
+        kayitli_dosyalar = model_registry.saved_files()
+        yuklenecek = st.selectbox(f"Saved in {model_registry.MODELS_DIR}/", kayitli_dosyalar, key="registry_saved")
+        if yuklenecek and st.button("📂 Load Transformer", key="btn_load_transformer"):
+            try:
+                model_registry.register(model_registry.load(os.path.join(model_registry.MODELS_DIR, yuklenecek)))
+                st.rerun()
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+        secilenler = st.multiselect("Transformers (applied in this order)", list(kayitli), key="registry_selected")
+        secilen_modeller = [kayitli[name] for name in secilenler]
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("▶️ Apply to Current Data", key="btn_apply_fitted", disabled=not secilen_modeller):
+                try:
+                    with stage_history.step("Apply fitted " + ", ".join(secilenler)):
+                        for t in secilen_modeller:
+                            step = t.step()
+                            pipeline.apply(stage, step["op"], **step["params"])
+                    st.success("Fitted transformers applied temporarily (no refit).")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {e}")
+        with col2:
+            if st.button(f"💾 Save to {model_registry.MODELS_DIR}/", key="btn_save_transformers", disabled=not secilen_modeller):
+                paths = [model_registry.save(t) for t in secilen_modeller]
+                st.success("Saved: " + ", ".join(paths))
+
+        st.write("Transform a new file chunk by chunk (without loading it whole):")
+        yeni_dosya = st.file_uploader(
+            "Upload a file", type=["csv", "xlsx", "json", *loader.ARROW_TYPES], key="registry_file"
+        )
+        yeni_yol = st.text_input(f"…or a file in {loader.DATA_DIR}/ on the server", key="registry_path")
+        cikti_format = st.selectbox("Output format", exporter.CHUNK_FORMATS, key="registry_format")
+        if st.button("🔁 Transform File", key="btn_transform_file",
+                     disabled=not secilen_modeller or (yeni_dosya is None and not yeni_yol)):
+            out_name = f"transformed.{exporter.FILE_FORMATS[cikti_format]}"
+            out_path = session_store.session_path(out_name)
+            try:
+                chunks = loader.iter_chunks(yeni_dosya) if yeni_dosya is not None else loader.iter_path_chunks(loader.data_path(yeni_yol))
+                _, rows = exporter.export_chunks(model_registry.transform_chunks(chunks, secilen_modeller), out_path, cikti_format)
+            except Exception as e:
+                st.error(f"Error: {e}")
+            else:
+                st.success(f"{rows} rows transformed ✅")
+                with open(out_path, "rb") as f:
+                    st.download_button("📥 Download Transformed File", f.read(), out_name)
+
     # ------------------- Save Session State -------------------
     st.markdown("---")
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("✅ Save to Session State"):
-            st.session_state["data"] = st.session_state["transformer_temp_df"]
-            # Clean up temp
-            del st.session_state["transformer_temp_df"]
+            # Commit the column deltas and clean up temp
+            staging.commit_stage("transformer_stage")
             st.success("Updated data saved to session_state.")
             st.rerun()
 
     with col2:
         if st.button("❌ Reset Changes"):
-            del st.session_state["transformer_temp_df"]
+            staging.reset_stage("transformer_stage")
             st.warning("All temporary changes reset.")
             st.rerun()
+
+    with col3:
+        if history.history_controls("transformer_stage", stage_history):
+            st.rerun()